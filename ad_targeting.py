@@ -0,0 +1,160 @@
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from datetime import date
+
+# Segment-targeted ad serving.
+# The active ads are grouped by target_segment once, so a page view is a single
+# dict lookup on the visitor's cluster plus a frequency-cap check.
+
+ADS_PER_PAGE = int(os.environ.get('ADS_PER_PAGE', 3))
+# How many times one visitor sees the same ad within the capping window
+AD_FREQUENCY_CAP = int(os.environ.get('AD_FREQUENCY_CAP', 5))
+AD_FREQUENCY_WINDOW = float(os.environ.get('AD_FREQUENCY_WINDOW', 3600))
+# Other workers pick up admin changes after at most this many seconds
+AD_INDEX_TTL = float(os.environ.get('AD_INDEX_TTL', 60))
+MAX_TRACKED_VIEWERS = int(os.environ.get('AD_MAX_TRACKED_VIEWERS', 50000))
+
+UNTARGETED = None
+
+
+def _parse_date(value):
+    if not value:
+        return None
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+class AdIndex:
+    def __init__(self, ttl=AD_INDEX_TTL):
+        self.ttl = ttl
+        self._by_segment = {}
+        self._untargeted = ()
+        self._built_at = 0.0
+        self._built_for = None    # date the validity windows were evaluated for
+        self._next_change = None  # first date on which an ad enters or leaves its window
+        # Bumped by invalidate(); the index is stale until a rebuild started after the bump publishes
+        self._generation = 1
+        self._built_generation = 0
+        self._lock = threading.Lock()
+
+    def invalidate(self):
+        """Mark the index for rebuild (call after an ad is created, toggled or deleted)."""
+        with self._lock:
+            self._generation += 1
+
+    def ads_for(self, cluster, get_connection):
+        """Active, in-window ads for a cluster, targeted ads first."""
+        if self._needs_rebuild():
+            self.rebuild(get_connection)
+        return self._by_segment.get(cluster, self._untargeted)
+
+    def _needs_rebuild(self):
+        if self._built_generation != self._generation or time.time() - self._built_at > self.ttl:
+            return True
+        today = date.today()
+        return today != self._built_for and self._next_change is not None and today >= self._next_change
+
+    def rebuild(self, get_connection):
+        # Read before the query: an invalidate() during the rebuild leaves the result stale
+        generation = self._generation
+        conn = get_connection()
+        try:
+            rows = conn.execute('SELECT * FROM ads WHERE is_active = 1 ORDER BY id').fetchall()
+        finally:
+            conn.close()
+
+        today = date.today()
+        targeted = {}
+        untargeted = []
+        next_change = None
+        for row in rows:
+            ad = dict(row)
+            start = _parse_date(ad.get('start_date'))
+            end = _parse_date(ad.get('end_date'))
+            if start and start > today:
+                next_change = start if next_change is None else min(next_change, start)
+                continue
+            if end and end < today:
+                continue
+            if end:
+                expiry = date.fromordinal(end.toordinal() + 1)
+                next_change = expiry if next_change is None else min(next_change, expiry)
+            segment = ad.get('target_segment')
+            if segment is None or segment == '':
+                untargeted.append(ad)
+                continue
+            try:
+                segment = int(segment)
+            except (TypeError, ValueError):
+                print('ad index: skipping ad %s with invalid target_segment %r' % (ad.get('id'), segment),
+                      file=sys.stderr)
+                continue
+            targeted.setdefault(segment, []).append(ad)
+
+        untargeted = tuple(untargeted)
+        by_segment = {cluster: tuple(ads) + untargeted for cluster, ads in targeted.items()}
+        with self._lock:
+            self._by_segment = by_segment
+            self._untargeted = untargeted
+            self._built_at = time.time()
+            self._built_for = today
+            self._next_change = next_change
+            self._built_generation = generation
+
+
+class FrequencyCap:
+    """Per-visitor impression counts, kept in memory for the most recent visitors."""
+
+    def __init__(self, cap=AD_FREQUENCY_CAP, window=AD_FREQUENCY_WINDOW, max_viewers=MAX_TRACKED_VIEWERS):
+        self.cap = cap
+        self.window = window
+        self.max_viewers = max_viewers
+        self._viewers = OrderedDict()  # viewer -> {ad_id: (window_start, count)}
+        self._lock = threading.Lock()
+
+    def pick(self, viewer, ads, limit):
+        """Choose up to `limit` ads the viewer has not hit the cap on, and count the impressions."""
+        now = time.time()
+        chosen = []
+        with self._lock:
+            seen = self._viewers.get(viewer)
+            if seen is None:
+                seen = self._viewers[viewer] = {}
+                if len(self._viewers) > self.max_viewers:
+                    self._viewers.popitem(last=False)
+            else:
+                self._viewers.move_to_end(viewer)
+            for ad in ads:
+                start, count = seen.get(ad['id'], (now, 0))
+                if now - start > self.window:
+                    start, count = now, 0
+                if count >= self.cap:
+                    continue
+                seen[ad['id']] = (start, count + 1)
+                chosen.append(ad)
+                if len(chosen) >= limit:
+                    break
+        return chosen
+
+    def reset(self):
+        with self._lock:
+            self._viewers.clear()
+
+
+ad_index = AdIndex()
+frequency_cap = FrequencyCap()
+
+
+def serve_ads(cluster, viewer, get_connection, limit=ADS_PER_PAGE):
+    """Ads for one page view: an O(1) segment lookup followed by frequency capping."""
+    ads = ad_index.ads_for(cluster, get_connection)
+    if viewer is None:
+        return list(ads[:limit])
+    return frequency_cap.pick(viewer, ads, limit)
@@ -1,6 +1,8 @@
 import pandas as pd
 import numpy as np
 from datetime import datetime
+import schema
+from user_history import UserHistory
 
 # Color palette for reference (for frontend):
 # --chocolate-cosmos: #412220
@@ -10,8 +12,10 @@ from datetime import datetime
 # --light-coral: #D77A7D
 
 # --- Data Loading ---
+# Frames are loaded with the compact, validated dtypes from schema.py; a file that
+# does not match its schema raises schema.SchemaError rather than loading as empty.
 def load_products():
-    return pd.read_csv('data.csv')
+    return schema.read_csv('data.csv', 'products')
 
 def load_user_events():
     """
@@ -19,16 +23,16 @@ def load_user_events():
     user_id, product_id, event_type (view, add_to_cart, purchase), timestamp, duration (for view)
     """
     try:
-        return pd.read_csv('user_events.csv')
-    except Exception:
+        return schema.read_csv('user_events.csv', 'events')
+    except (OSError, pd.errors.EmptyDataError):
         # Return empty DataFrame if not found
-        return pd.DataFrame(columns=['user_id','product_id','event_type','timestamp','duration'])
+        return schema.empty('events', ['user_id','product_id','event_type','timestamp','duration'])
 
 def load_users():
     try:
-        return pd.read_csv('users.csv')
-    except Exception:
-        return pd.DataFrame(columns=['id','username','email','role','cluster'])
+        return schema.read_csv('users.csv', 'users')
+    except (OSError, pd.errors.EmptyDataError):
+        return schema.empty('users', ['id','username','email','role','cluster'])
 
 # --- 1. Product Engagement ---
 def get_product_engagement():
@@ -53,20 +57,35 @@ def get_product_engagement():
     return engagement.reset_index()
 
 # --- 2. User Behavior ---
+def get_user_histories(events=None):
+    """Browsing and purchase histories as compact CSR UserHistory objects (see user_history.py)."""
+    if events is None:
+        events = load_user_events()
+    return {
+        'browsing_history': UserHistory.from_events(events[events['event_type']=='view']),
+        'purchase_history': UserHistory.from_events(events[events['event_type']=='purchase']),
+    }
+
 def get_user_behavior():
+    """Per-user activity summary. browsing_history / purchase_history are lists built from
+    the CSR histories for existing consumers; get_user_histories() returns the histories themselves."""
     events = load_user_events()
     users = load_users()
     # Most active users
     active = events.groupby('user_id').size().rename('activity_count')
-    # Browsing history
-    history = events[events['event_type']=='view'].groupby('user_id')['product_id'].apply(list).rename('browsing_history')
-    # Purchase history
-    purchases = events[events['event_type']=='purchase'].groupby('user_id')['product_id'].apply(list).rename('purchase_history')
+    # Browsing / purchase history, one array per kind instead of a list per user
+    histories = get_user_histories(events)
+    browsing, purchases = histories['browsing_history'], histories['purchase_history']
     # Merge
     behavior = pd.DataFrame(index=users['id'])
-    behavior = behavior.join([active, history, purchases])
+    behavior = behavior.join(active)
+    behavior['activity_count'] = behavior['activity_count'].fillna(0).astype(int)
+    behavior['views'] = browsing.counts(behavior.index)
+    behavior['purchases'] = purchases.counts(behavior.index)
+    behavior['last_viewed'] = browsing.last(behavior.index)
+    behavior['browsing_history'] = browsing.lists(behavior.index)
+    behavior['purchase_history'] = purchases.lists(behavior.index)
     behavior = behavior.join(users.set_index('id')[['username','role','cluster']], how='left')
-    behavior = behavior.fillna({'activity_count':0, 'browsing_history':[], 'purchase_history':[]})
     return behavior.reset_index()
 
 # --- 3. Sales & Trends ---
@@ -1,22 +1,52 @@
-from flask import Flask, render_template, redirect, url_for, session, request, flash, jsonify, send_from_directory
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Flask, render_template, redirect, url_for, session, request, flash, jsonify, Response
+import page_cache
+import profiling
+from static_assets import asset_url, asset_srcset, serve_asset
+import db_instrumentation
+from password_policy import hash_password, needs_rehash, verify_password, VerifierBusy
 import sqlite3
 from datetime import datetime
 import os
+import uuid
 from dotenv import load_dotenv
+from ad_targeting import ad_index, serve_ads
+from bulk_loader import seed_catalog, PROMO_ADS
+import cart_store
+import customer_segments
+import jobs
+import live_metrics
+import segment_summary
+from recommendation_cache import recommendation_cache
+from recommendation_simple import create_catalog_version, get_recommendations_simple
+import model_registry
+
+try:
+    from recommendation import has_product_catalog, recommend_for_user
+    from schema import SchemaError
+except ImportError:
+    # Lightweight deployments run without pandas/scikit-learn
+    recommend_for_user = None
 
 load_dotenv()
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'fallback_secret_key_for_development')
+# Opt-in per-route timing and /metrics (PROFILING_ENABLED=1)
+profiling.install(app)
+# Opt-in per-request query counting, slow-query log and scan detection (DB_INSTRUMENTATION=1)
+db_instrumentation.install(app)
+jobs.install(app)
 
-# Add static file serving route for production
-@app.route('/static/<path:filename>')
+# Static file serving for production: fingerprinted builds from static_assets.py
+# get long-lived immutable caching and precompressed bodies
 def serve_static(filename):
-    return send_from_directory('static', filename)
+    return serve_asset(filename)
+
+app.view_functions['static'] = serve_static
+app.jinja_env.globals.update(asset_url=asset_url, asset_srcset=asset_srcset)
 
 def get_db_connection():
-    conn = sqlite3.connect('users.db')
+    conn = sqlite3.connect('users.db', factory=db_instrumentation.connection_factory())
     conn.row_factory = sqlite3.Row
     return conn
 
@@ -34,6 +64,11 @@ def init_db():
         created_at DATETIME DEFAULT CURRENT_TIMESTAMP
     )''')
     
+    # Customer segment predicted at registration (added to older databases in place)
+    cursor.execute('PRAGMA table_info(dressly_users)')
+    if 'segment' not in {row['name'] for row in cursor.fetchall()}:
+        cursor.execute('ALTER TABLE dressly_users ADD COLUMN segment INTEGER')
+    
     # Create products table
     cursor.execute('''CREATE TABLE IF NOT EXISTS products (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -42,6 +77,10 @@ def init_db():
         image_url TEXT,
         category TEXT DEFAULT 'dress'
     )''')
+    # Tracking beacons resolve products by name
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_products_name ON products (name)')
+    # Version counter bumped by triggers on every product write (recommendation_simple's catalog cache)
+    create_catalog_version(cursor)
     
     # Create ads table  
     cursor.execute('''CREATE TABLE IF NOT EXISTS ads (
@@ -52,9 +91,49 @@ def init_db():
         is_active INTEGER DEFAULT 1
     )''')
     
+    # Targeting columns used by the admin ads page (added to older databases in place)
+    cursor.execute('PRAGMA table_info(ads)')
+    ad_columns = {row['name'] for row in cursor.fetchall()}
+    for column, column_type in [('product_id', 'INTEGER'), ('target_segment', 'INTEGER'),
+                                ('start_date', 'DATE'), ('end_date', 'DATE')]:
+        if column not in ad_columns:
+            cursor.execute(f'ALTER TABLE ads ADD COLUMN {column} {column_type}')
+    
+    # Create user events table (tracking beacons from index.html)
+    cursor.execute('''CREATE TABLE IF NOT EXISTS user_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        product_id INTEGER,
+        product_title TEXT,
+        event_type TEXT NOT NULL,
+        duration REAL,
+        rating INTEGER,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_events_user ON user_events (user_id, event_type)')
+    
+    # Create user preferences table (style quiz answers)
+    cursor.execute('''CREATE TABLE IF NOT EXISTS user_preferences (
+        user_id INTEGER PRIMARY KEY,
+        favorite_color TEXT,
+        preferred_style TEXT,
+        budget REAL,
+        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )''')
+    
+    # Create carts / cart_items tables
+    cart_store.create_cart_tables(cursor)
+    
+    # Create customer segmentation table (loaded from clustered_customers.csv)
+    customer_segments.create_segment_tables(cursor)
+    
     conn.commit()
     cursor.close()
+    # Picks up a clustered_customers.csv written while the app was down (model.py syncs on retrain)
+    customer_segments.sync(conn)
     conn.close()
+    # Segment summary + CustomerID index are build output; rebuild them if this checkout has none
+    segment_summary.ensure_summary()
 
 @app.route('/')
 def index():
@@ -64,42 +143,9 @@ def index():
     # Check if we have products, if not, populate ALL products
     cursor.execute("SELECT COUNT(*) FROM products")
     if cursor.fetchone()[0] == 0:
-        # Add ALL sample products from your static folder
-        sample_products = [
-            ('Summer Beige Dress', 45.99, 'beige.jpg'),
-            ('Beige Midi Dress', 52.99, 'beigemidi.jpg'),
-            ('Black Evening Dress', 89.99, 'black.jpg'),
-            ('Blue Casual Dress', 42.99, 'blue.jpg'),
-            ('Blue Party Dress', 65.99, 'blueparty.jpg'),
-            ('Floral Summer Dress', 39.99, 'floral.jpg'),
-            ('Formal Black Dress', 95.99, 'formal.jpg'),
-            ('Formal Event Dress', 105.99, 'formalevent.jpg'),
-            ('Green Casual Dress', 48.99, 'green.jpg'),
-            ('Green Summer Dress', 44.99, 'greensummer.jpg'),
-            ('Latest Collection Dress', 67.99, 'latest.jpg'),
-            ('Pink Maxi Dress', 55.99, 'pinkmaxi.jpg'),
-            ('Pink Mini Dress', 35.99, 'pinkmini.jpg'),
-            ('Pink Work Dress', 58.99, 'pinkwork.jpg'),
-            ('Red Evening Dress', 78.99, 'red.jpg'),
-            ('White Casual Dress', 42.99, 'white.jpg'),
-            ('White Casual Day Dress', 41.99, 'whitecasual.jpg'),
-            ('Yellow Casual Dress', 46.99, 'yellow.jpg'),
-            ('Yellow Maxi Dress', 54.99, 'yellowmaxi.jpg')
-        ]
-        cursor.executemany('INSERT INTO products (name, price, image_url) VALUES (?, ?, ?)', sample_products)
-        
-        # Add sample ads
-        sample_ads = [
-            ('New Collection', 'Latest styles available!', 'latest.jpg'),
-            ('Style Analytics', 'Find your perfect style', 'styleanalytics.jpg'),
-            ('Analytics Dashboard', 'View your preferences', 'analytics2.jpg')
-        ]
-        cursor.executemany('INSERT INTO ads (title, content, image_url) VALUES (?, ?, ?)', sample_ads)
-        conn.commit()
-    
-    # Fetch active ads
-    cursor.execute("SELECT * FROM ads WHERE is_active = 1")
-    ads = cursor.fetchall()
+        # Add ALL sample products from your static folder, plus the sample ads
+        seed_catalog(conn)
+        ad_index.invalidate()
     
     # Fetch ALL products (not just 12)
     cursor.execute("SELECT * FROM products")
@@ -108,6 +154,13 @@ def index():
     cursor.close()
     conn.close()
     
+    # Active ads for the visitor's segment, frequency-capped per visitor
+    if 'user_id' in session:
+        viewer = 'user:%s' % session['user_id']
+    else:
+        viewer = 'anon:%s' % session.setdefault('viewer_id', uuid.uuid4().hex)
+    ads = serve_ads(session.get('segment'), viewer, get_db_connection)
+    
     return render_template('index.html', ads=ads, products=products)
 
 @app.route('/register', methods=['GET', 'POST'])
@@ -122,14 +175,27 @@ def register():
         cursor = conn.cursor()
         
         try:
-            cursor.execute('SELECT * FROM dressly_users WHERE username = ? OR email = ?', (username, email))
+            cursor.execute('SELECT id FROM dressly_users WHERE username = ? OR email = ?', (username, email))
             if cursor.fetchone():
                 flash('Username or email already exists!', 'error')
                 return render_template('register.html')
             
-            password_hash = generate_password_hash(password)
-            cursor.execute('''INSERT INTO dressly_users (username, email, password_hash, role) 
-                             VALUES (?, ?, ?, ?)''', (username, email, password_hash, role))
+            password_hash = hash_password(password)
+            # Predict under the write lock: model.promote() renumbers stored segments and moves
+            # CURRENT while holding it, so the segment stored here always uses CURRENT's numbering
+            cursor.execute('BEGIN IMMEDIATE')
+            # Assign the customer segment inline from the live model's scaler+centroid predictor
+            # (a sample is also scored by the shadow candidate, if one is registered)
+            try:
+                segment = model_registry.predict_profile({
+                    'Age': request.form.get('age'),
+                    'Annual Income (k$)': request.form.get('annual_income'),
+                })
+            except ValueError:
+                segment = None
+            
+            cursor.execute('''INSERT INTO dressly_users (username, email, password_hash, role, segment) 
+                             VALUES (?, ?, ?, ?, ?)''', (username, email, password_hash, role, segment))
             conn.commit()
             flash('Registration successful!', 'success')
             return redirect(url_for('login'))
@@ -152,13 +218,20 @@ def login():
         cursor = conn.cursor()
         
         try:
-            cursor.execute('SELECT * FROM dressly_users WHERE username = ? AND role = ?', (username, role))
+            cursor.execute('''SELECT id, username, role, password_hash, segment FROM dressly_users
+                              WHERE username = ? AND role = ?''', (username, role))
             user = cursor.fetchone()
             
-            if user and check_password_hash(user['password_hash'], password):
+            if user and verify_password(user['password_hash'], password):
+                # Transparently move the stored hash to the current policy
+                if needs_rehash(user['password_hash']):
+                    cursor.execute('UPDATE dressly_users SET password_hash = ? WHERE id = ?',
+                                   (hash_password(password), user['id']))
+                    conn.commit()
                 session['user_id'] = user['id']
                 session['username'] = user['username']
                 session['role'] = user['role']
+                session['segment'] = user['segment']
                 flash('Login successful!', 'success')
                 
                 if role == 'admin':
@@ -167,6 +240,10 @@ def login():
                     return redirect(url_for('user_dashboard'))
             else:
                 flash('Invalid credentials!', 'error')
+        except VerifierBusy:
+            # Pool saturated or the check timed out: a retry, not a failed login
+            flash('Too many sign-ins right now. Please try again in a moment.', 'error')
+            return render_template('login.html'), 503
         except Exception as e:
             flash('Login failed. Please try again.', 'error')
         finally:
@@ -193,21 +270,432 @@ def admin_dashboard():
         return redirect(url_for('login'))
     return render_template('admin_dashboard.html')
 
+@app.route('/admin_dashboard_data')
+def admin_dashboard_data():
+    if session.get('role') != 'admin':
+        return jsonify({'success': False, 'error': 'Admin only'}), 403
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        # Product metrics come from the analytics_rollup job; computed inline until it has run
+        metrics = jobs.load_artifact(jobs.ROLLUP_PATH) or jobs.product_metrics(conn)
+        cursor.execute('SELECT id, username, email, role FROM dressly_users ORDER BY id')
+        users = [dict(row) for row in cursor.fetchall()]
+        cursor.execute('''SELECT id, product_id, title, content AS description, image_url AS image,
+                                 target_segment, start_date, end_date, is_active FROM ads ORDER BY id''')
+        ads = [dict(row) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+        conn.close()
+    # Customer segmentation rows are paged separately from /admin/customers
+    return jsonify({
+        'most_viewed_product': metrics['most_viewed_product'],
+        'most_added_product': metrics['most_added_product'],
+        'highest_conversion_product': metrics['highest_conversion_product'],
+        'metrics_generated_at': metrics.get('generated_at'),
+        'registered_users': users,
+        'ads': ads,
+    })
+
+@app.route('/admin/stream')
+def admin_stream():
+    """Live event counters for the dashboard as Server-Sent Events (see live_metrics.py)."""
+    if session.get('role') != 'admin':
+        return jsonify({'success': False, 'error': 'Admin only'}), 403
+    return Response(live_metrics.stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/admin/customers')
+def admin_customers():
+    """One page of customer segmentation rows, filtered and sorted in SQLite and streamed as chunked JSON."""
+    if session.get('role') != 'admin':
+        return jsonify({'success': False, 'error': 'Admin only'}), 403
+    try:
+        filters, sort, order, page, limit = customer_segments.parse_query(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    rows = customer_segments.stream_page(get_db_connection, filters, sort, order, page, limit)
+    return Response(rows, mimetype='application/json')
+
+@app.route('/admin/segments')
+def admin_segments():
+    """Per-segment profile summary written by model.py."""
+    if session.get('role') != 'admin':
+        return jsonify({'success': False, 'error': 'Admin only'}), 403
+    summary = segment_summary.load_summary()
+    if summary is None:
+        return jsonify({'success': False, 'error': 'No segment summary; run model.py'}), 404
+    return jsonify(summary)
+
+@app.route('/admin/segments/<int:cluster>/customers')
+def admin_segment_customers(cluster):
+    """Drill-down: one page of a segment's customers, located through the CustomerID index."""
+    if session.get('role') != 'admin':
+        return jsonify({'success': False, 'error': 'Admin only'}), 403
+    try:
+        _, _, _, page, limit = customer_segments.parse_query(request.args)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    result = segment_summary.cluster_customer_ids(cluster, (page - 1) * limit, limit)
+    if result is None:
+        return jsonify({'success': False, 'error': 'Unknown segment'}), 404
+    ids, total = result
+    conn = get_db_connection()
+    try:
+        rows = customer_segments.rows_by_id(conn, ids)
+    finally:
+        conn.close()
+    return jsonify({'cluster': cluster, 'page': page, 'limit': limit, 'total': total,
+                    'has_more': page * limit < total, 'rows': rows})
+
+@app.route('/admin/models')
+def admin_models():
+    """Registered model versions, the live/candidate pointers and shadow-scoring results."""
+    if session.get('role') != 'admin':
+        return jsonify({'success': False, 'error': 'Admin only'}), 403
+    return jsonify({'versions': [model_registry.manifest(v) for v in model_registry.versions()],
+                    'shadow': model_registry.shadow_stats()})
+
+@app.route('/admin/models/<version>/promote', methods=['POST'])
+def promote_model(version):
+    if session.get('role') != 'admin':
+        return jsonify({'success': False, 'error': 'Admin only'}), 403
+    if version not in model_registry.versions():
+        return jsonify({'success': False, 'error': 'Unknown version'}), 404
+    import model  # scikit-learn: only loaded when an admin promotes
+    try:
+        mapping = model.promote(version)
+    except (model_registry.ChecksumError, model_registry.LabelMismatchError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 409
+    # Ads are indexed by target_segment, which the promote may have renumbered
+    ad_index.invalidate()
+    return jsonify({'success': True, 'current': version,
+                    'segment_mapping': {str(k): v for k, v in (mapping or {}).items()}})
+
+@app.route('/admin/jobs')
+def admin_jobs():
+    """Background job schedules and recent run history."""
+    if session.get('role') != 'admin':
+        return jsonify({'success': False, 'error': 'Admin only'}), 403
+    limit = min(max(request.args.get('limit', jobs.HISTORY_LIMIT, type=int), 1), jobs.HISTORY_MAX)
+    return jsonify({'jobs': jobs.status(), 'history': jobs.history(limit=limit, job=request.args.get('job'))})
+
+@app.route('/admin/jobs/<name>/run', methods=['POST'])
+def run_job_now(name):
+    if session.get('role') != 'admin':
+        return jsonify({'success': False, 'error': 'Admin only'}), 403
+    if name not in jobs.JOBS:
+        return jsonify({'success': False, 'error': 'Unknown job'}), 404
+    jobs.trigger(name)
+    return jsonify({'success': True, 'job': name}), 202
+
+@app.route('/admin/ads', methods=['GET', 'POST'])
+def admin_ads():
+    if 'username' not in session or session.get('role') != 'admin':
+        return redirect(url_for('login'))
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        if request.method == 'POST':
+            form = request.form
+            cursor.execute('''INSERT INTO ads (product_id, title, content, image_url, target_segment,
+                                               start_date, end_date, is_active)
+                              VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                           (form.get('product_id') or None, form['title'], form.get('description'),
+                            form.get('image'), form.get('target_segment') or None,
+                            form.get('start_date') or None, form.get('end_date') or None,
+                            1 if form.get('is_active') else 0))
+            conn.commit()
+            ad_index.invalidate()
+            flash('Ad created!', 'success')
+            return redirect(url_for('admin_ads'))
+        cursor.execute('SELECT * FROM ads ORDER BY id')
+        ads = cursor.fetchall()
+    finally:
+        cursor.close()
+        conn.close()
+    
+    return render_template('admin_ads.html', ads=ads)
+
+@app.route('/admin/ads/<int:ad_id>/toggle', methods=['POST'])
+def toggle_ad(ad_id):
+    if 'username' not in session or session.get('role') != 'admin':
+        return redirect(url_for('login'))
+    conn = get_db_connection()
+    conn.execute('UPDATE ads SET is_active = 1 - is_active WHERE id = ?', (ad_id,))
+    conn.commit()
+    conn.close()
+    ad_index.invalidate()
+    return redirect(url_for('admin_ads'))
+
+@app.route('/admin/ads/<int:ad_id>/delete', methods=['POST'])
+def delete_ad(ad_id):
+    if 'username' not in session or session.get('role') != 'admin':
+        return redirect(url_for('login'))
+    conn = get_db_connection()
+    conn.execute('DELETE FROM ads WHERE id = ?', (ad_id,))
+    conn.commit()
+    conn.close()
+    ad_index.invalidate()
+    return redirect(url_for('admin_ads'))
+
 @app.route('/about')
 def about():
-    return render_template('about.html')
+    return page_cache.render_page('about.html')
 
 @app.route('/contact')
 def contact():
-    return render_template('contact.html')
+    return page_cache.render_page('contact.html')
 
 @app.route('/service')
 def service():
-    return render_template('service.html')
+    return page_cache.render_page('service.html')
 
 @app.route('/cart')
 def cart():
-    return render_template('cart.html')
+    return page_cache.render_page('cart.html')
+
+# --- Tracking & Recommendations ---
+def record_event(event_type, duration=None, rating=None):
+    """Store a tracking event for the logged-in user and drop their cached recommendations."""
+    user_id = session.get('user_id')
+    if user_id is None:
+        return jsonify({'success': False, 'error': 'Not logged in'}), 401
+    data = request.get_json(silent=True) or {}
+    title = data.get('title')
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('SELECT id FROM products WHERE name = ?', (title,))
+        product = cursor.fetchone()
+        cursor.execute('''INSERT INTO user_events (user_id, product_id, product_title, event_type, duration, rating)
+                          VALUES (?, ?, ?, ?, ?, ?)''',
+                       (user_id, product['id'] if product else None, title, event_type, duration, rating))
+        conn.commit()
+    finally:
+        cursor.close()
+        conn.close()
+    
+    recommendation_cache.invalidate_user(user_id)
+    live_metrics.notify()
+    return jsonify({'success': True})
+
+@app.route('/track_view', methods=['POST'])
+def track_view():
+    return record_event('view')
+
+@app.route('/track_time', methods=['POST'])
+def track_time():
+    data = request.get_json(silent=True) or {}
+    return record_event('view_time', duration=data.get('time_spent'))
+
+@app.route('/track_rating', methods=['POST'])
+def track_rating():
+    data = request.get_json(silent=True) or {}
+    return record_event('rating', rating=data.get('rating'))
+
+@app.route('/track_add_to_cart', methods=['POST'])
+def track_add_to_cart():
+    return record_event('add_to_cart')
+
+@app.route('/track_purchase', methods=['POST'])
+def track_purchase():
+    return record_event('purchase')
+
+@app.route('/update_preferences', methods=['GET', 'POST'])
+def update_preferences():
+    user_id = session.get('user_id')
+    if user_id is None:
+        return jsonify({'success': False, 'error': 'Not logged in'}), 401
+    
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or request.form
+            cursor.execute('''INSERT OR REPLACE INTO user_preferences
+                              (user_id, favorite_color, preferred_style, budget, updated_at)
+                              VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)''',
+                           (user_id, data.get('favColor'), data.get('favStyle'), data.get('budget') or None))
+            conn.commit()
+            recommendation_cache.invalidate_user(user_id)
+        cursor.execute('SELECT favorite_color, preferred_style, budget FROM user_preferences WHERE user_id = ?',
+                       (user_id,))
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+    
+    return jsonify({'success': True, 'preferences': dict(row) if row else {}})
+
+def compute_recommendations(user_id, segment=None):
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    try:
+        cursor.execute('''SELECT DISTINCT product_id FROM user_events
+                          WHERE user_id = ? AND product_id IS NOT NULL''', (user_id,))
+        history = [row['product_id'] for row in cursor.fetchall()]
+        cursor.execute('SELECT favorite_color, preferred_style, budget FROM user_preferences WHERE user_id = ?',
+                       (user_id,))
+        prefs = cursor.fetchone()
+    finally:
+        cursor.close()
+        conn.close()
+    
+    quiz_answers = {}
+    if prefs:
+        if prefs['favorite_color']:
+            quiz_answers['favColor'] = prefs['favorite_color']
+        if prefs['preferred_style']:
+            quiz_answers['favStyle'] = prefs['preferred_style']
+        if prefs['budget'] is not None:
+            quiz_answers['budget'] = prefs['budget']
+    
+    with profiling.timed('recommender'):
+        # App users are not rows of clustered_customers.csv: pass the segment stored at registration
+        if recommend_for_user is not None and has_product_catalog():
+            try:
+                return recommend_for_user(segment=segment, history=history, quiz_answers=quiz_answers)
+            except SchemaError as e:
+                # A bad data file fails the same way on every request: one line, no traceback
+                app.logger.warning('recommend_for_user: %s; using the fallback recommender', e)
+            except Exception:
+                app.logger.exception('recommend_for_user failed; using the fallback recommender')
+        # Precomputed popular products for the user's segment (recommendation_candidates job)
+        candidates = jobs.load_artifact(jobs.CANDIDATES_PATH)
+        if candidates:
+            segments = candidates['segments']
+            pool = segments.get(str(segment), segments.get('all', []))
+            seen = set(history)
+            products = [p for p in pool if p['id'] not in seen][:6]
+            if products:
+                return products
+        return get_recommendations_simple(user_id=user_id, history=history)
+
+@app.route('/get_recommendations')
+def get_recommendations():
+    user_id = session.get('user_id')
+    if user_id is None:
+        return jsonify({'success': False, 'error': 'Not logged in'}), 401
+    segment = session.get('segment')
+    products = recommendation_cache.get_or_compute(user_id, lambda: compute_recommendations(user_id, segment))
+    return jsonify({'success': True, 'products': products})
+
+@app.route('/recommendation_cache_stats')
+def recommendation_cache_stats():
+    if session.get('role') != 'admin':
+        return jsonify({'success': False, 'error': 'Admin only'}), 403
+    return jsonify(recommendation_cache.stats())
+
+# --- Cart ---
+def cart_response(items):
+    return jsonify(dict(success=True, **cart_store.cart_summary(items)))
+
+def int_field(data, name, default=None, minimum=None):
+    """Integer field of a JSON body (None if absent); ValueError if it is not an integer >= minimum."""
+    value = data.get(name, default)
+    if value is None:
+        return None
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError('%s must be an integer' % name)
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        raise ValueError('%s must be an integer' % name)
+    if minimum is not None and value < minimum:
+        raise ValueError('%s must be at least %d' % (name, minimum))
+    return value
+
+@app.route('/get_cart')
+def get_cart():
+    if 'user_id' not in session:
+        return jsonify([])
+    conn = get_db_connection()
+    try:
+        return jsonify(cart_store.get_cart(conn, session['user_id']))
+    finally:
+        conn.close()
+
+@app.route('/add_to_cart', methods=['POST'])
+def add_to_cart():
+    user_id = session.get('user_id')
+    if user_id is None:
+        return jsonify({'success': False, 'error': 'Not logged in'}), 401
+    data = request.get_json(silent=True) or {}
+    try:
+        product_id = int_field(data, 'product_id')
+        quantity = int_field(data, 'quantity', default=1, minimum=1)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    conn = get_db_connection()
+    try:
+        items = cart_store.add_item(conn, user_id, product_id, quantity)
+    except LookupError:
+        return jsonify({'success': False, 'error': 'Unknown product'}), 400
+    finally:
+        conn.close()
+    # The add_to_cart event was recorded in the same transaction
+    recommendation_cache.invalidate_user(user_id)
+    live_metrics.notify()
+    return cart_response(items)
+
+@app.route('/update_cart', methods=['POST'])
+def update_cart():
+    user_id = session.get('user_id')
+    if user_id is None:
+        return jsonify({'success': False, 'error': 'Not logged in'}), 401
+    data = request.get_json(silent=True) or {}
+    delta = -1 if data.get('action') == 'decrement' else 1
+    try:
+        idx, product_id = int_field(data, 'idx', minimum=0), int_field(data, 'product_id')
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    conn = get_db_connection()
+    try:
+        items = cart_store.update_item(conn, user_id, delta, idx=idx, product_id=product_id)
+    finally:
+        conn.close()
+    return cart_response(items)
+
+@app.route('/remove_from_cart', methods=['POST'])
+def remove_from_cart():
+    user_id = session.get('user_id')
+    if user_id is None:
+        return jsonify({'success': False, 'error': 'Not logged in'}), 401
+    data = request.get_json(silent=True) or {}
+    try:
+        idx, product_id = int_field(data, 'idx', minimum=0), int_field(data, 'product_id')
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    conn = get_db_connection()
+    try:
+        items = cart_store.remove_item(conn, user_id, idx=idx, product_id=product_id)
+    finally:
+        conn.close()
+    return cart_response(items)
+
+@app.route('/checkout', methods=['POST'])
+def checkout():
+    user_id = session.get('user_id')
+    if user_id is None:
+        return jsonify({'success': False, 'error': 'Please log in to check out.'}), 401
+    conn = get_db_connection()
+    try:
+        ordered = cart_store.checkout(conn, user_id)
+    finally:
+        conn.close()
+    if not ordered:
+        return jsonify({'success': False, 'error': 'Your cart is empty!'})
+    # The purchase events were recorded in the checkout transaction
+    recommendation_cache.invalidate_user(user_id)
+    live_metrics.notify()
+    return jsonify({'success': True, 'items': ordered})
+
+@app.route('/checkout_success')
+def checkout_success():
+    return render_template('checkout_success.html')
 
 @app.route('/test-images')
 def test_images():
@@ -225,83 +713,30 @@ def test_images():
 def reset_data():
     """Reset and populate with ALL products"""
     conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Clear existing products
-    cursor.execute("DELETE FROM products")
-    cursor.execute("DELETE FROM ads")
-    
-    # Add ALL products from your static folder
-    sample_products = [
-        ('Summer Beige Dress', 45.99, 'beige.jpg'),
-        ('Beige Midi Dress', 52.99, 'beigemidi.jpg'),
-        ('Black Evening Dress', 89.99, 'black.jpg'),
-        ('Blue Casual Dress', 42.99, 'blue.jpg'),
-        ('Blue Party Dress', 65.99, 'blueparty.jpg'),
-        ('Floral Summer Dress', 39.99, 'floral.jpg'),
-        ('Formal Black Dress', 95.99, 'formal.jpg'),
-        ('Formal Event Dress', 105.99, 'formalevent.jpg'),
-        ('Green Casual Dress', 48.99, 'green.jpg'),
-        ('Green Summer Dress', 44.99, 'greensummer.jpg'),
-        ('Latest Collection Dress', 67.99, 'latest.jpg'),
-        ('Pink Maxi Dress', 55.99, 'pinkmaxi.jpg'),
-        ('Pink Mini Dress', 35.99, 'pinkmini.jpg'),
-        ('Pink Work Dress', 58.99, 'pinkwork.jpg'),
-        ('Red Evening Dress', 78.99, 'red.jpg'),
-        ('White Casual Dress', 42.99, 'white.jpg'),
-        ('White Casual Day Dress', 41.99, 'whitecasual.jpg'),
-        ('Yellow Casual Dress', 46.99, 'yellow.jpg'),
-        ('Yellow Maxi Dress', 54.99, 'yellowmaxi.jpg')
-    ]
-    cursor.executemany('INSERT INTO products (name, price, image_url) VALUES (?, ?, ?)', sample_products)
     
-    # Add sample ads - featuring selected dresses with unique promotions
-    sample_ads = [
-        ('Pink Maxi Special', '25% OFF Weekend Sale - Limited Stock!', 'pinkmaxi.jpg'),
-        ('Formal Event Collection', 'Buy 2 Get 1 FREE on Formal Dresses', 'formalevent.jpg'),
-        ('Yellow Summer Sale', 'Flash Sale: 40% OFF All Yellow Dresses Today', 'yellowmaxi.jpg')
-    ]
-    cursor.executemany('INSERT INTO ads (title, content, image_url) VALUES (?, ?, ?)', sample_ads)
+    # Clear existing products and ads, then add ALL products plus the promotion ads
+    # featuring selected dresses, in one transaction
+    product_count, ad_count = seed_catalog(conn, ads=PROMO_ADS, reset=True)
     
-    conn.commit()
-    cursor.close()
     conn.close()
+    ad_index.invalidate()
     
-    return f"Database reset! Added {len(sample_products)} products and {len(sample_ads)} ads. <a href='/'>Go to Homepage</a>"
+    return f"Database reset! Added {product_count} products and {ad_count} ads. <a href='/'>Go to Homepage</a>"
 
 @app.route('/populate')
 def populate_sample_data():
     """Populate sample data - call this once after deployment"""
     conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # Add sample products
-    sample_products = [
-        ('Summer Beige Dress', 45.99, '/static/beige.jpg'),
-        ('Black Evening Dress', 89.99, '/static/black.jpg'),
-        ('Blue Party Dress', 65.99, '/static/blueparty.jpg'),
-        ('Floral Summer Dress', 39.99, '/static/floral.jpg'),
-        ('Pink Maxi Dress', 55.99, '/static/pinkmaxi.jpg'),
-        ('White Casual Dress', 42.99, '/static/whitecasual.jpg')
-    ]
     
     try:
-        cursor.executemany('INSERT OR IGNORE INTO products (name, price, image_url) VALUES (?, ?, ?)', sample_products)
-        
-        # Add sample ads
-        sample_ads = [
-            ('New Collection', 'Latest styles available!', 'latest.jpg'),
-            ('Style Analytics', 'Find your perfect style', 'styleanalytics.jpg'),
-            ('Analytics Dashboard', 'View your preferences', 'analytics2.jpg')
-        ]
-        cursor.executemany('INSERT OR IGNORE INTO ads (title, content, image_url) VALUES (?, ?, ?)', sample_ads)
-        
-        conn.commit()
+        if conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]:
+            return "Sample data already present."
+        seed_catalog(conn)
+        ad_index.invalidate()
         return "Sample data populated successfully!"
     except Exception as e:
         return f"Error: {str(e)}"
     finally:
-        cursor.close()
         conn.close()
 
 # Initialize database when app starts
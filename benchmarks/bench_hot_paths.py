@@ -0,0 +1,230 @@
+"""Micro-benchmarks for the recommendation and analytics hot paths.
+
+Each function in recommendation.py and analytics.py is timed against synthetic
+catalogs and event logs of increasing size, recording the best wall time over a
+few repeats and the peak traced memory (tracemalloc sees NumPy/pandas buffers).
+Results can be saved as a baseline and later runs compared against it, so a
+scaling regression shows up before deploy.
+
+    python benchmarks/bench_hot_paths.py                          # 1k/100k products, 1M events
+    python benchmarks/bench_hot_paths.py --products 1k,100k,1M --events 1M,100M
+    python benchmarks/bench_hot_paths.py --save-baseline
+    python benchmarks/bench_hot_paths.py --compare --threshold 1.25   # exit 1 on regression
+    python benchmarks/bench_hot_paths.py --dtypes default         # pandas' default dtypes, for comparison
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import analytics  # noqa: E402
+import recommendation  # noqa: E402
+import schema  # noqa: E402
+
+BASELINE_PATH = os.path.join(ROOT, 'benchmarks', 'baselines', 'hot_paths.json')
+
+COLORS = ['Red', 'Blue', 'Black', 'White', 'Yellow', 'Green', 'Pink', 'Beige']
+CATEGORIES = ['Party', 'Casual', 'Formal', 'Work', 'Summer', 'Maxi', 'Midi', 'Mini']
+EVENT_TYPES = ['view', 'view', 'view', 'view', 'add_to_cart', 'purchase', 'ad_click', 'rec_click', 'coupon_used']
+
+
+def parse_size(text):
+    text = text.strip().upper()
+    scale = {'K': 1000, 'M': 1000000}.get(text[-1], 1)
+    return int(float(text.rstrip('KM')) * scale)
+
+
+# --- Synthetic data ---
+def make_products(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'id': np.arange(1, n + 1),
+        'title': ['Dress %d' % i for i in range(1, n + 1)],
+        'category': rng.choice(CATEGORIES, n),
+        'color': rng.choice(COLORS, n),
+        'price': rng.uniform(20, 300, n).round(2),
+        'Cluster': rng.integers(0, 4, n),
+        'popularity': rng.random(n),
+    })
+
+
+def make_users(n, seed=0):
+    rng = np.random.default_rng(seed)
+    ids = np.arange(1, n + 1)
+    return pd.DataFrame({
+        'id': ids,
+        'username': ['user%d' % i for i in ids],
+        'email': ['user%d@dressly.com' % i for i in ids],
+        'role': 'user',
+        'cluster': rng.integers(0, 4, n),
+    })
+
+
+def make_events(n, n_products, n_users, seed=0):
+    rng = np.random.default_rng(seed)
+    start = np.datetime64('2025-01-01T00:00:00')
+    return pd.DataFrame({
+        'user_id': rng.integers(1, n_users + 1, n),
+        'product_id': rng.integers(1, n_products + 1, n),
+        'event_type': rng.choice(EVENT_TYPES, n),
+        'timestamp': (start + rng.integers(0, 180 * 86400, n).astype('timedelta64[s]')).astype(str),
+        'duration': rng.exponential(30, n).round(1),
+    })
+
+
+# --- Cases ---
+def recommendation_cases(products):
+    history = products['id'].sample(5, random_state=1).tolist()
+    return {
+        'recommend_for_user[popular]': lambda: recommendation.recommend_for_user(user_profile={'Age': 30}),
+        'recommend_for_user[quiz]': lambda: recommendation.recommend_for_user(
+            quiz_answers={'favColor': 'Red', 'favStyle': 'Party', 'budget': 150}),
+        'recommend_for_user[history]': lambda: recommendation.recommend_for_user(history=history),
+        'recommend_for_ad_segment': lambda: recommendation.recommend_for_ad_segment(
+            cluster=2, style='Party', price_range=(50, 150)),
+    }
+
+
+ANALYTICS_CASES = {
+    'get_product_engagement': analytics.get_product_engagement,
+    'get_user_behavior': analytics.get_user_behavior,
+    'get_user_histories': analytics.get_user_histories,
+    'get_sales_trends': analytics.get_sales_trends,
+    'get_marketing_stats': analytics.get_marketing_stats,
+}
+
+
+def measure(func, repeats):
+    best = None
+    peak = 0
+    error = None
+    for _ in range(repeats):
+        gc.collect()
+        tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            func()
+        except Exception as e:
+            error = '%s: %s' % (type(e).__name__, e)
+        elapsed = time.perf_counter() - start
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        best = elapsed if best is None else min(best, elapsed)
+        if error:
+            break
+    return {'seconds': best, 'peak_mb': peak / 1e6, 'error': error}
+
+
+def typed(df, dataset, dtypes):
+    """Give a synthetic frame the dtypes the real loaders produce, and print its size."""
+    if dtypes == 'compact':
+        df = schema.compact(df, dataset)
+    usage = schema.memory_usage(df)
+    print('%-70s %9d rows %10.1f MB' % ('frame %s (%s dtypes)' % (dataset, dtypes), usage['rows'],
+                                         usage['bytes'] / 1e6))
+    return df
+
+
+def run(product_sizes, event_sizes, n_users, repeats, dtypes='compact'):
+    results = {}
+    for n_products in product_sizes:
+        products = typed(make_products(n_products), 'products', dtypes)
+        # Serve the synthetic frames through the modules' own loaders
+        recommendation.load_products = lambda products=products: products
+        recommendation.load_clustered_customers = lambda: None
+        analytics.load_products = lambda products=products: products
+        for name, func in recommendation_cases(products).items():
+            key = '%s/products=%d' % (name, n_products)
+            results[key] = measure(func, repeats)
+            report(key, results[key])
+
+        users = typed(make_users(n_users), 'users', dtypes)
+        analytics.load_users = lambda users=users: users
+        for n_events in event_sizes:
+            events = typed(make_events(n_events, n_products, n_users), 'events', dtypes)
+            analytics.load_user_events = lambda events=events: events.copy()
+            for name, func in ANALYTICS_CASES.items():
+                key = '%s/products=%d/events=%d' % (name, n_products, n_events)
+                results[key] = measure(func, repeats)
+                report(key, results[key])
+            del events
+    return results
+
+
+def report(key, r):
+    if r['error']:
+        print('%-70s ERROR %s' % (key, r['error']))
+    else:
+        print('%-70s %9.4fs %10.1f MB' % (key, r['seconds'], r['peak_mb']))
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for key, r in results.items():
+        base = baseline.get(key)
+        if r['error']:
+            # A case that now raises is a regression unless it already failed in the baseline
+            if not (base and base.get('error')):
+                regressions.append('%s error: %s' % (key, r['error']))
+            continue
+        if not base or base.get('error'):
+            continue
+        for metric in ('seconds', 'peak_mb'):
+            if base[metric] and r[metric] > base[metric] * threshold:
+                regressions.append('%s %s: %.4g -> %.4g (x%.2f)' % (key, metric, base[metric], r[metric],
+                                                                     r[metric] / base[metric]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark recommendation and analytics hot paths.')
+    parser.add_argument('--products', default='1k,100k', help='comma-separated catalog sizes (1k,100k,1M)')
+    parser.add_argument('--events', default='1M', help='comma-separated event log sizes (1M,100M)')
+    parser.add_argument('--users', type=int, default=10000)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='write results to the baseline file')
+    parser.add_argument('--compare', action='store_true', help='compare against the baseline file')
+    parser.add_argument('--threshold', type=float, default=1.25, help='allowed slowdown/memory growth ratio')
+    parser.add_argument('--output', help='also write results JSON here')
+    parser.add_argument('--dtypes', choices=['compact', 'default'], default='compact',
+                        help='frame dtypes: schema.py (as loaded in production) or pandas defaults')
+    args = parser.parse_args()
+
+    results = run([parse_size(s) for s in args.products.split(',')],
+                  [parse_size(s) for s in args.events.split(',')], args.users, args.repeats, args.dtypes)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print('baseline saved to', args.baseline)
+    if args.compare:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for line in regressions:
+            print('REGRESSION', line)
+        if regressions:
+            sys.exit(1)
+        print('no regressions against', args.baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,309 @@
+"""End-to-end load test for the Flask app.
+
+Starts `gunicorn app:app` in a scratch directory, seeds its SQLite database with
+bulk_loader, then replays a weighted traffic mix (home page, login, the tracking
+beacons from index.html, cart operations and the admin dashboard data) from a pool
+of concurrent virtual users. Per-route p50/p95/p99 latency and requests/second are
+printed and saved as JSON under benchmarks/results/, tagged with the git commit.
+
+    python benchmarks/load_test.py --duration 30 --concurrency 16 --workers 4
+    python benchmarks/load_test.py --compare benchmarks/results/<previous>.json
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import shutil
+import signal
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+# Files app.py reads relative to its working directory
+RUNTIME_FILES = ['data.csv', 'clustered_customers.csv', 'kmeans_model.pkl', 'scaler.pkl',
+                 'segment_predictor.json', 'segment_summary.json']
+
+USER_PASSWORD = 'Dressly@2025'
+ADMIN_USERNAME = 'bench_admin'
+
+# (route name, weight) -- roughly a storefront session
+TRAFFIC_MIX = [
+    ('GET /', 30),
+    ('POST /track_view', 20),
+    ('POST /track_time', 10),
+    ('GET /get_cart', 10),
+    ('POST /add_to_cart', 10),
+    ('POST /update_cart', 5),
+    ('POST /remove_from_cart', 3),
+    ('POST /login', 4),
+    ('GET /get_recommendations', 5),
+    ('GET /admin_dashboard_data', 3),
+]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+    except Exception:
+        return 'unknown'
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+# --- Server ---
+def prepare_workdir(args):
+    workdir = tempfile.mkdtemp(prefix='dressly_load_')
+    for name in RUNTIME_FILES + [n for n in os.listdir(ROOT) if n.startswith('segment_index.')]:
+        if os.path.exists(os.path.join(ROOT, name)):
+            shutil.copy(os.path.join(ROOT, name), workdir)
+
+    sys.path.insert(0, ROOT)
+    import bulk_loader
+    from werkzeug.security import generate_password_hash
+    target = bulk_loader.SQLiteTarget(os.path.join(workdir, 'users.db'))
+    try:
+        counts = bulk_loader.load(target, products=args.products, users=args.users, orders=args.orders, ads=20)
+        target.conn.execute('INSERT INTO dressly_users (username, email, password_hash, role) VALUES (?, ?, ?, ?)',
+                            (ADMIN_USERNAME, 'bench_admin@dressly.com',
+                             generate_password_hash(USER_PASSWORD), 'admin'))
+    finally:
+        target.close()
+    print('Seeded', counts)
+    return workdir
+
+
+def start_server(workdir, port, workers):
+    cmd = [sys.executable, '-m', 'gunicorn', 'app:app', '--chdir', workdir, '--pythonpath', ROOT,
+           '--bind', '127.0.0.1:%d' % port, '--workers', str(workers), '--log-level', 'warning']
+    proc = subprocess.Popen(cmd, cwd=workdir)
+    deadline = time.time() + 60
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit('gunicorn exited with code %s' % proc.returncode)
+        try:
+            urllib.request.urlopen('http://127.0.0.1:%d/about' % port, timeout=2).read()
+            return proc
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            time.sleep(0.3)
+    proc.terminate()
+    raise SystemExit('gunicorn did not come up within 60s')
+
+
+# --- Virtual users ---
+class VirtualUser:
+    def __init__(self, base_url, username, role, product_ids, rng):
+        self.base_url = base_url
+        self.username = username
+        self.role = role
+        self.product_ids = product_ids
+        self.rng = rng
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()),
+            NoRedirect())
+
+    def request(self, method, path, json_body=None, form=None):
+        data = None
+        headers = {}
+        if json_body is not None:
+            data = json.dumps(json_body).encode()
+            headers['Content-Type'] = 'application/json'
+        elif form is not None:
+            data = urllib.parse.urlencode(form).encode()
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        req = urllib.request.Request(self.base_url + path, data=data, headers=headers, method=method)
+        try:
+            with self.opener.open(req, timeout=30) as resp:
+                resp.read()
+                return resp.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+    def login(self):
+        return self.request('POST', '/login', form={'username': self.username, 'password': USER_PASSWORD,
+                                                    'role': self.role})
+
+    def perform(self, route):
+        title = 'Pink Maxi Dress'
+        if route == 'GET /':
+            return self.request('GET', '/')
+        if route == 'POST /login':
+            return self.login()
+        if route == 'POST /track_view':
+            return self.request('POST', '/track_view', {'title': title})
+        if route == 'POST /track_time':
+            return self.request('POST', '/track_time', {'title': title, 'time_spent': self.rng.randint(2, 90)})
+        if route == 'GET /get_cart':
+            return self.request('GET', '/get_cart')
+        if route == 'POST /add_to_cart':
+            return self.request('POST', '/add_to_cart', {'product_id': self.rng.choice(self.product_ids)})
+        if route == 'POST /update_cart':
+            return self.request('POST', '/update_cart', {'idx': 0, 'action': self.rng.choice(['increment',
+                                                                                            'decrement'])})
+        if route == 'POST /remove_from_cart':
+            return self.request('POST', '/remove_from_cart', {'idx': 0})
+        if route == 'GET /get_recommendations':
+            return self.request('GET', '/get_recommendations')
+        if route == 'GET /admin_dashboard_data':
+            return self.request('GET', '/admin_dashboard_data')
+        raise ValueError(route)
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Count a login's 302 as the response instead of following it to the dashboard."""
+
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+def worker(user, deadline, routes, weights, samples, lock):
+    local = {}
+    while time.time() < deadline:
+        route = user.rng.choices(routes, weights)[0]
+        if route == 'GET /admin_dashboard_data' and user.role != 'admin':
+            continue
+        start = time.perf_counter()
+        try:
+            status = user.perform(route)
+        except Exception:
+            status = 0
+        elapsed = time.perf_counter() - start
+        local.setdefault(route, []).append((elapsed, status))
+    with lock:
+        for route, values in local.items():
+            samples.setdefault(route, []).extend(values)
+
+
+def summarize(samples, duration):
+    report = {}
+    for route, values in sorted(samples.items()):
+        latencies = sorted(v[0] * 1000.0 for v in values)
+        errors = sum(1 for v in values if v[1] == 0 or v[1] >= 400)
+        report[route] = {
+            'requests': len(values),
+            'errors': errors,
+            'rps': len(values) / duration,
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'p99_ms': percentile(latencies, 99),
+        }
+    return report
+
+
+def print_report(report, baseline=None):
+    print('%-28s %8s %7s %8s %9s %9s %9s' % ('route', 'requests', 'errors', 'rps', 'p50 ms', 'p95 ms', 'p99 ms'))
+    for route, r in report.items():
+        line = '%-28s %8d %7d %8.1f %9.2f %9.2f %9.2f' % (route, r['requests'], r['errors'], r['rps'],
+                                                          r['p50_ms'], r['p95_ms'], r['p99_ms'])
+        if baseline and route in baseline:
+            base = baseline[route]['p95_ms']
+            if base:
+                line += '   p95 %+.0f%%' % ((r['p95_ms'] - base) / base * 100)
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end load test against gunicorn.')
+    parser.add_argument('--duration', type=float, default=30, help='seconds of traffic')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent virtual users')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--products', type=int, default=19)
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--orders', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='result JSON path (default benchmarks/results/<time>-<commit>.json)')
+    parser.add_argument('--compare', help='previous result JSON to compare p95 latency against')
+    args = parser.parse_args()
+
+    workdir = prepare_workdir(args)
+    port = free_port()
+    server = start_server(workdir, port, args.workers)
+    base_url = 'http://127.0.0.1:%d' % port
+    try:
+        # The first home page visit fills the catalog if the loader did not
+        urllib.request.urlopen(base_url + '/').read()
+        conn = sqlite3.connect(os.path.join(workdir, 'users.db'))
+        product_ids = [row[0] for row in conn.execute('SELECT id FROM products')]
+        usernames = [row[0] for row in conn.execute(
+            "SELECT username FROM dressly_users WHERE role = 'user' LIMIT ?", (args.concurrency,))]
+        conn.close()
+
+        users = []
+        for i in range(args.concurrency):
+            rng = random.Random(args.seed + i)
+            if i == 0:
+                user = VirtualUser(base_url, ADMIN_USERNAME, 'admin', product_ids, rng)
+            else:
+                user = VirtualUser(base_url, usernames[i % len(usernames)], 'user', product_ids, rng)
+            user.login()
+            users.append(user)
+
+        routes = [r for r, _ in TRAFFIC_MIX]
+        weights = [w for _, w in TRAFFIC_MIX]
+        samples = {}
+        lock = threading.Lock()
+        deadline = time.time() + args.duration
+        threads = [threading.Thread(target=worker, args=(u, deadline, routes, weights, samples, lock))
+                   for u in users]
+        started = time.time()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.time() - started
+    finally:
+        server.send_signal(signal.SIGTERM)
+        server.wait(timeout=30)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = summarize(samples, elapsed)
+    total = sum(r['requests'] for r in report.values())
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['routes']
+    print_report(report, baseline)
+    print('total: %d requests, %.1f req/s' % (total, total / elapsed))
+
+    result = {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'config': {'duration': args.duration, 'concurrency': args.concurrency, 'workers': args.workers,
+                   'products': args.products, 'users': args.users, 'orders': args.orders},
+        'total_rps': total / elapsed,
+        'routes': report,
+    }
+    output = args.output
+    if not output:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        output = os.path.join(RESULTS_DIR, '%s-%s.json' % (time.strftime('%Y%m%d-%H%M%S'), result['commit']))
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print('saved', output)
+
+
+if __name__ == '__main__':
+    main()
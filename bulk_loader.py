@@ -0,0 +1,453 @@
+"""Bulk data loader for products, users, orders and ads.
+
+Replaces the row-by-row populate scripts: rows are generated (or read from CSV)
+lazily and written with executemany (SQLite) or COPY (PostgreSQL) in large
+batches inside a single transaction, with secondary indexes dropped during the
+load and rebuilt once at the end.
+
+    python bulk_loader.py --users 100000 --orders 10000000
+    python bulk_loader.py --target postgres --orders 1000000
+    python bulk_loader.py --products-csv products.csv --ads 50
+"""
+import argparse
+import csv
+import io
+import random
+import sqlite3
+import time
+from datetime import date, datetime, timedelta
+from itertools import islice
+
+from dotenv import load_dotenv
+
+from recommendation_simple import create_catalog_version, resume_catalog_triggers, suspend_catalog_triggers
+
+load_dotenv()
+
+SQLITE_PATH = 'users.db'
+DEFAULT_PASSWORD = 'Dressly@2025'
+BATCH_SIZE = 50000
+
+# --- Sample catalog (shared with app.py's seeding routes) ---
+SAMPLE_PRODUCTS = [
+    ('Summer Beige Dress', 45.99, 'beige.jpg'),
+    ('Beige Midi Dress', 52.99, 'beigemidi.jpg'),
+    ('Black Evening Dress', 89.99, 'black.jpg'),
+    ('Blue Casual Dress', 42.99, 'blue.jpg'),
+    ('Blue Party Dress', 65.99, 'blueparty.jpg'),
+    ('Floral Summer Dress', 39.99, 'floral.jpg'),
+    ('Formal Black Dress', 95.99, 'formal.jpg'),
+    ('Formal Event Dress', 105.99, 'formalevent.jpg'),
+    ('Green Casual Dress', 48.99, 'green.jpg'),
+    ('Green Summer Dress', 44.99, 'greensummer.jpg'),
+    ('Latest Collection Dress', 67.99, 'latest.jpg'),
+    ('Pink Maxi Dress', 55.99, 'pinkmaxi.jpg'),
+    ('Pink Mini Dress', 35.99, 'pinkmini.jpg'),
+    ('Pink Work Dress', 58.99, 'pinkwork.jpg'),
+    ('Red Evening Dress', 78.99, 'red.jpg'),
+    ('White Casual Dress', 42.99, 'white.jpg'),
+    ('White Casual Day Dress', 41.99, 'whitecasual.jpg'),
+    ('Yellow Casual Dress', 46.99, 'yellow.jpg'),
+    ('Yellow Maxi Dress', 54.99, 'yellowmaxi.jpg')
+]
+
+SAMPLE_ADS = [
+    ('New Collection', 'Latest styles available!', 'latest.jpg'),
+    ('Style Analytics', 'Find your perfect style', 'styleanalytics.jpg'),
+    ('Analytics Dashboard', 'View your preferences', 'analytics2.jpg')
+]
+
+PROMO_ADS = [
+    ('Pink Maxi Special', '25% OFF Weekend Sale - Limited Stock!', 'pinkmaxi.jpg'),
+    ('Formal Event Collection', 'Buy 2 Get 1 FREE on Formal Dresses', 'formalevent.jpg'),
+    ('Yellow Summer Sale', 'Flash Sale: 40% OFF All Yellow Dresses Today', 'yellowmaxi.jpg')
+]
+
+CATEGORIES = ['Party', 'Casual', 'Formal', 'Work', 'Summer', 'Maxi', 'Midi', 'Mini']
+
+
+def seed_catalog(conn, products=SAMPLE_PRODUCTS, ads=SAMPLE_ADS, reset=False):
+    """Insert the sample products and ads on an app (SQLite) connection in one transaction
+    (one catalog_version bump for the whole seed)."""
+    with conn:
+        if not conn.in_transaction:
+            conn.execute('BEGIN')
+        suspended = suspend_catalog_triggers(conn)
+        if reset:
+            conn.execute('DELETE FROM products')
+            conn.execute('DELETE FROM ads')
+        conn.executemany('INSERT INTO products (name, price, image_url) VALUES (?, ?, ?)', products)
+        conn.executemany('INSERT INTO ads (title, content, image_url) VALUES (?, ?, ?)', ads)
+        resume_catalog_triggers(conn, suspended)
+    return len(products), len(ads)
+
+
+# --- Row generators ---
+def generate_products(count, rng):
+    for i in range(count):
+        name, price, image = SAMPLE_PRODUCTS[i % len(SAMPLE_PRODUCTS)]
+        if i >= len(SAMPLE_PRODUCTS):
+            name = '%s #%d' % (name, i // len(SAMPLE_PRODUCTS))
+            price = round(price * rng.uniform(0.8, 1.3), 2)
+        yield {'name': name, 'description': 'Elegant dress for any occasion', 'price': price,
+               'category': rng.choice(CATEGORIES), 'image_url': image}
+
+
+def read_products_csv(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            yield {'name': row.get('name') or row.get('title'), 'description': row.get('description'),
+                   'price': float(row['price']), 'category': row.get('category'),
+                   'image_url': row.get('image_url') or row.get('image')}
+
+
+def generate_users(count, start_id, password_hash, clusters, rng, taken=()):
+    """Yield user rows; ids whose generated username or email is in `taken` are skipped."""
+    for user_id in range(start_id, start_id + count):
+        if 'user%d' % user_id in taken or 'user%d@dressly.com' % user_id in taken:
+            continue
+        yield {'id': user_id, 'username': 'user%d' % user_id, 'email': 'user%d@dressly.com' % user_id,
+               'password_hash': password_hash, 'role': 'user', 'segment': rng.randrange(clusters)}
+
+
+def generate_orders(count, start_id, user_ids, products, rng, items_out):
+    """Yield order rows; the matching order_items rows are appended to items_out as we go."""
+    now = datetime.now()
+    for order_id in range(start_id, start_id + count):
+        lines = rng.sample(products, min(len(products), rng.randint(1, 3)))
+        items_out.extend((order_id, product_id, 1, price) for product_id, price in lines)
+        yield {'id': order_id, 'user_id': rng.choice(user_ids),
+               'total_amount': round(sum(price for _, price in lines), 2),
+               'shipping_address': '123 Main St, City, Country', 'status': 'Delivered',
+               'created_at': (now - timedelta(days=rng.randint(1, 365))).strftime('%Y-%m-%d %H:%M:%S')}
+
+
+def generate_ads(count, product_ids, clusters, rng):
+    today = date.today()
+    for i in range(count):
+        title, content, image = (SAMPLE_ADS + PROMO_ADS)[i % 6]
+        start = today - timedelta(days=rng.randint(0, 30))
+        yield {'product_id': rng.choice(product_ids) if product_ids else None, 'title': title,
+               'content': content, 'image_url': image,
+               'target_segment': rng.choice([None] + list(range(clusters))),
+               'start_date': start.isoformat(), 'end_date': (start + timedelta(days=rng.randint(7, 90))).isoformat(),
+               'is_active': 1}
+
+
+# --- Targets ---
+class SQLiteTarget:
+    placeholder = '?'
+    columns = {
+        'products': ['name', 'price', 'image_url', 'category'],
+        'dressly_users': ['id', 'username', 'email', 'password_hash', 'role', 'segment'],
+        'orders': ['id', 'user_id', 'total_amount', 'shipping_address', 'status', 'created_at'],
+        'order_items': ['order_id', 'product_id', 'quantity', 'price'],
+        'ads': ['product_id', 'title', 'content', 'image_url', 'target_segment', 'start_date', 'end_date',
+                'is_active'],
+    }
+    # Columns newer than the first schema; older databases get them added (as app.init_db does)
+    added_columns = {
+        'dressly_users': [('segment', 'INTEGER')],
+        'ads': [('product_id', 'INTEGER'), ('target_segment', 'INTEGER'), ('start_date', 'DATE'),
+                ('end_date', 'DATE')],
+    }
+
+    def __init__(self, path=SQLITE_PATH):
+        self.conn = sqlite3.connect(path, isolation_level=None)
+        self._dropped = []
+
+    def create_schema(self):
+        # Mirrors app.init_db plus the orders tables the populate scripts write to
+        self.conn.executescript('''
+        CREATE TABLE IF NOT EXISTS dressly_users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            role TEXT NOT NULL DEFAULT 'user',
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            segment INTEGER
+        );
+        CREATE TABLE IF NOT EXISTS products (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            price REAL NOT NULL,
+            image_url TEXT,
+            category TEXT DEFAULT 'dress'
+        );
+        CREATE TABLE IF NOT EXISTS ads (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            content TEXT,
+            image_url TEXT,
+            is_active INTEGER DEFAULT 1,
+            product_id INTEGER,
+            target_segment INTEGER,
+            start_date DATE,
+            end_date DATE
+        );
+        CREATE TABLE IF NOT EXISTS orders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            total_amount REAL NOT NULL,
+            shipping_address TEXT,
+            status TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE IF NOT EXISTS order_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            order_id INTEGER NOT NULL,
+            product_id INTEGER NOT NULL,
+            quantity INTEGER NOT NULL DEFAULT 1,
+            price REAL NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_orders_user ON orders (user_id);
+        CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items (order_id);
+        ''')
+        create_catalog_version(self.conn)
+        for table, columns in self.added_columns.items():
+            existing = {row[1] for row in self.conn.execute('PRAGMA table_info(%s)' % table)}
+            for column, column_type in columns:
+                if column not in existing:
+                    self.conn.execute('ALTER TABLE %s ADD COLUMN %s %s' % (table, column, column_type))
+
+    def begin(self, tables):
+        self.conn.execute('PRAGMA synchronous = OFF')
+        self.conn.execute('PRAGMA journal_mode = MEMORY')
+        self.conn.execute('BEGIN')
+        # Defer secondary index maintenance on the tables being loaded until after the load
+        self._dropped = self.conn.execute(
+            "SELECT name, sql FROM sqlite_master WHERE type = 'index' AND sql IS NOT NULL "
+            "AND tbl_name IN (%s)" % ', '.join('?' * len(tables)), list(tables)).fetchall()
+        for name, _ in self._dropped:
+            self.conn.execute('DROP INDEX %s' % name)
+        # Same for the per-row catalog_version triggers: one version bump for the whole load
+        self._catalog_triggers = 'products' in tables and suspend_catalog_triggers(self.conn)
+
+    def commit(self):
+        for _, sql in self._dropped:
+            self.conn.execute(sql)
+        resume_catalog_triggers(self.conn, self._catalog_triggers)
+        self.conn.execute('COMMIT')
+        self.conn.execute('PRAGMA synchronous = FULL')
+
+    def rollback(self):
+        self.conn.execute('ROLLBACK')
+
+    def scalar(self, sql):
+        return self.conn.execute(sql).fetchone()[0]
+
+    def fetchall(self, sql):
+        return self.conn.execute(sql).fetchall()
+
+    def write(self, table, rows, batch_size):
+        columns = self.columns[table]
+        sql = 'INSERT INTO %s (%s) VALUES (%s)' % (table, ', '.join(columns), ', '.join('?' * len(columns)))
+        tuples = (tuple(row.get(c) for c in columns) if isinstance(row, dict) else row for row in rows)
+        total = 0
+        while True:
+            batch = list(islice(tuples, batch_size))
+            if not batch:
+                return total
+            self.conn.executemany(sql, batch)
+            total += len(batch)
+
+    def close(self):
+        self.conn.close()
+
+
+class PostgresTarget:
+    columns = {
+        'products': ['name', 'description', 'price', 'category', 'image_url'],
+        'dressly_users': ['id', 'username', 'email', 'password_hash', 'role'],
+        'orders': ['id', 'user_id', 'total_amount', 'shipping_address', 'status', 'created_at'],
+        'order_items': ['order_id', 'product_id', 'quantity', 'price'],
+        'ads': ['title', 'content', 'image_url', 'target_audience', 'is_active', 'valid_from', 'valid_until'],
+    }
+    # Index definitions dropped while copying into their table and rebuilt after the load
+    indexes = {
+        'idx_orders_user': ('orders', 'CREATE INDEX idx_orders_user ON orders (user_id)'),
+        'idx_order_items_order': ('order_items', 'CREATE INDEX idx_order_items_order ON order_items (order_id)'),
+    }
+    # Columns the loader writes that older migrate_db schemas may lack
+    added_columns = {
+        'products': [('description', 'TEXT')],
+        'ads': [('target_audience', 'VARCHAR(100)'), ('valid_from', 'TIMESTAMP'), ('valid_until', 'TIMESTAMP')],
+    }
+
+    def __init__(self):
+        import migrate_db
+        self.migrate_db = migrate_db
+        self.conn = migrate_db.get_db_connection()
+        self.cursor = self.conn.cursor()
+        self._dropped = []
+
+    def create_schema(self):
+        self.cursor.execute('''CREATE TABLE IF NOT EXISTS dressly_users (
+            id SERIAL PRIMARY KEY,
+            username VARCHAR(150) UNIQUE NOT NULL,
+            email VARCHAR(255) UNIQUE NOT NULL,
+            password_hash VARCHAR(255) NOT NULL,
+            role VARCHAR(20) NOT NULL DEFAULT 'user',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )''')
+        self.conn.commit()
+        self.migrate_db.create_tables()
+        self.cursor.execute('''CREATE TABLE IF NOT EXISTS orders (
+            id SERIAL PRIMARY KEY,
+            user_id INTEGER NOT NULL REFERENCES dressly_users(id),
+            total_amount DECIMAL(10,2) NOT NULL,
+            shipping_address TEXT,
+            status VARCHAR(50),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )''')
+        self.cursor.execute('''CREATE TABLE IF NOT EXISTS order_items (
+            id SERIAL PRIMARY KEY,
+            order_id INTEGER NOT NULL REFERENCES orders(id),
+            product_id INTEGER NOT NULL REFERENCES products(id),
+            quantity INTEGER NOT NULL DEFAULT 1,
+            price DECIMAL(10,2) NOT NULL
+        )''')
+        for table, columns in self.added_columns.items():
+            for column, column_type in columns:
+                self.cursor.execute('ALTER TABLE %s ADD COLUMN IF NOT EXISTS %s %s' % (table, column, column_type))
+        self.conn.commit()
+
+    def begin(self, tables):
+        self._dropped = [sql for name, (table, sql) in self.indexes.items() if table in tables]
+        for name, (table, _) in self.indexes.items():
+            if table in tables:
+                self.cursor.execute('DROP INDEX IF EXISTS %s' % name)
+
+    def commit(self):
+        for sql in self._dropped:
+            self.cursor.execute(sql)
+        # Explicit ids were copied in, so move the sequences past them
+        for table in ('dressly_users', 'orders'):
+            self.cursor.execute("SELECT setval(pg_get_serial_sequence('%s', 'id'), "
+                                "COALESCE((SELECT MAX(id) FROM %s), 1))" % (table, table))
+        self.conn.commit()
+
+    def rollback(self):
+        self.conn.rollback()
+
+    def scalar(self, sql):
+        self.cursor.execute(sql)
+        return self.cursor.fetchone()[0]
+
+    def fetchall(self, sql):
+        self.cursor.execute(sql)
+        return self.cursor.fetchall()
+
+    def write(self, table, rows, batch_size):
+        columns = self.columns[table]
+        if table == 'ads':
+            rows = ({'title': r['title'], 'content': r['content'], 'image_url': r['image_url'],
+                     'target_audience': None if r['target_segment'] is None else str(r['target_segment']),
+                     'is_active': bool(r['is_active']), 'valid_from': r['start_date'],
+                     'valid_until': r['end_date']} for r in rows)
+        tuples = (tuple(row.get(c) for c in columns) if isinstance(row, dict) else row for row in rows)
+        sql = 'COPY %s (%s) FROM STDIN WITH (FORMAT csv)' % (table, ', '.join(columns))
+        total = 0
+        while True:
+            batch = list(islice(tuples, batch_size))
+            if not batch:
+                return total
+            buf = io.StringIO()
+            csv.writer(buf).writerows(batch)
+            buf.seek(0)
+            self.cursor.copy_expert(sql, buf)
+            total += len(batch)
+
+    def close(self):
+        self.cursor.close()
+        self.conn.close()
+
+
+# --- Loader ---
+def load(target, products=0, products_csv=None, users=0, orders=0, ads=0, clusters=4,
+         batch_size=BATCH_SIZE, seed=42):
+    from werkzeug.security import generate_password_hash
+
+    rng = random.Random(seed)
+    counts = {}
+    target.create_schema()
+    loaded = [table for table, n in (('products', products or products_csv), ('dressly_users', users),
+                                     ('orders', orders), ('order_items', orders), ('ads', ads)) if n]
+    target.begin(loaded)
+    try:
+        if products_csv:
+            counts['products'] = target.write('products', read_products_csv(products_csv), batch_size)
+        elif products:
+            counts['products'] = target.write('products', generate_products(products, rng), batch_size)
+
+        if users:
+            # One hash for every generated account (they all share DEFAULT_PASSWORD)
+            password_hash = generate_password_hash(DEFAULT_PASSWORD)
+            start_id = target.scalar('SELECT COALESCE(MAX(id), 0) FROM dressly_users') + 1
+            # Accounts registered by hand can already use a generated name; a UNIQUE violation
+            # would roll back the whole load, so those users are skipped
+            taken = {value for row in target.fetchall('SELECT username, email FROM dressly_users') for value in row}
+            counts['users'] = target.write('dressly_users',
+                                           generate_users(users, start_id, password_hash, clusters, rng, taken),
+                                           batch_size)
+
+        if orders:
+            catalog = [(row[0], float(row[1])) for row in target.fetchall('SELECT id, price FROM products')]
+            user_ids = [row[0] for row in target.fetchall('SELECT id FROM dressly_users')]
+            if not catalog or not user_ids:
+                raise SystemExit('Orders need products and users; load them first or in the same run.')
+            start_id = target.scalar('SELECT COALESCE(MAX(id), 0) FROM orders') + 1
+            counts['orders'] = counts['order_items'] = 0
+            # Orders are generated in slices so their items can be flushed batch by batch
+            remaining = orders
+            while remaining:
+                chunk = min(remaining, batch_size)
+                items = []
+                counts['orders'] += target.write(
+                    'orders', list(generate_orders(chunk, start_id, user_ids, catalog, rng, items)), batch_size)
+                counts['order_items'] += target.write('order_items', items, batch_size)
+                start_id += chunk
+                remaining -= chunk
+
+        if ads:
+            product_ids = [row[0] for row in target.fetchall('SELECT id FROM products')]
+            counts['ads'] = target.write('ads', generate_ads(ads, product_ids, clusters, rng), batch_size)
+
+        target.commit()
+    except BaseException:
+        target.rollback()
+        raise
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Bulk-load products, users, orders and ads.')
+    parser.add_argument('--target', choices=['sqlite', 'postgres'], default='sqlite')
+    parser.add_argument('--sqlite-path', default=SQLITE_PATH)
+    parser.add_argument('--products', type=int, default=0, help='number of products to generate')
+    parser.add_argument('--products-csv', help='import products from a CSV (name/title, price, category, image)')
+    parser.add_argument('--users', type=int, default=0)
+    parser.add_argument('--orders', type=int, default=0)
+    parser.add_argument('--ads', type=int, default=0)
+    parser.add_argument('--clusters', type=int, default=4, help='segments to spread users and ads across')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    target = SQLiteTarget(args.sqlite_path) if args.target == 'sqlite' else PostgresTarget()
+    start = time.perf_counter()
+    try:
+        counts = load(target, products=args.products, products_csv=args.products_csv, users=args.users,
+                      orders=args.orders, ads=args.ads, clusters=args.clusters,
+                      batch_size=args.batch_size, seed=args.seed)
+    finally:
+        target.close()
+    elapsed = time.perf_counter() - start
+    for table, count in counts.items():
+        print('%-12s %d rows' % (table, count))
+    print('Loaded in %.1fs' % elapsed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+# Server-side shopping cart backed by the carts/cart_items tables (see migrate_db.py).
+# Every mutation runs in one transaction and returns the updated cart, so the
+# browser never needs a follow-up /get_cart round trip.
+
+
+def create_cart_tables(cursor):
+    cursor.execute('''CREATE TABLE IF NOT EXISTS carts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER NOT NULL,
+        is_ordered INTEGER DEFAULT 0,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES dressly_users(id)
+    )''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS cart_items (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        cart_id INTEGER NOT NULL,
+        product_id INTEGER NOT NULL,
+        quantity INTEGER NOT NULL DEFAULT 1,
+        FOREIGN KEY (cart_id) REFERENCES carts(id),
+        FOREIGN KEY (product_id) REFERENCES products(id)
+    )''')
+    # One open cart per user, one row per product in a cart
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_carts_open_user ON carts (user_id) WHERE is_ordered = 0')
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_cart_items_cart_product ON cart_items (cart_id, product_id)')
+
+
+def _image_url(image_url):
+    if not image_url:
+        return '/static/default.jpg'
+    return image_url if image_url.startswith('/') else '/static/' + image_url
+
+
+def _open_cart_id(conn, user_id, create=False):
+    row = conn.execute('SELECT id FROM carts WHERE user_id = ? AND is_ordered = 0', (user_id,)).fetchone()
+    if row is not None:
+        return row[0]
+    if not create:
+        return None
+    return conn.execute('INSERT INTO carts (user_id) VALUES (?)', (user_id,)).lastrowid
+
+
+def _items(conn, cart_id):
+    if cart_id is None:
+        return []
+    rows = conn.execute('''SELECT ci.product_id, ci.quantity, p.name, p.price, p.image_url
+                           FROM cart_items ci JOIN products p ON p.id = ci.product_id
+                           WHERE ci.cart_id = ? ORDER BY ci.id''', (cart_id,)).fetchall()
+    return [{'product_id': row[0], 'quantity': row[1], 'title': row[2], 'price': row[3],
+             'image': _image_url(row[4])} for row in rows]
+
+
+def _product_at(conn, cart_id, idx=None, product_id=None):
+    """Resolve a cart line from either its position in the cart (what the pages send) or a product id.
+    Positions count the lines _items() returns, so lines whose product no longer exists are skipped."""
+    if product_id is not None:
+        return int(product_id)
+    if idx is None or cart_id is None:
+        return None
+    row = conn.execute('''SELECT ci.product_id FROM cart_items ci JOIN products p ON p.id = ci.product_id
+                          WHERE ci.cart_id = ? ORDER BY ci.id LIMIT 1 OFFSET ?''', (cart_id, int(idx))).fetchone()
+    return row[0] if row else None
+
+
+def cart_summary(items):
+    return {'cart': items, 'cart_count': sum(item['quantity'] for item in items)}
+
+
+def get_cart(conn, user_id):
+    return _items(conn, _open_cart_id(conn, user_id))
+
+
+def _transaction(conn, func):
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        result = func()
+        conn.commit()
+        return result
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def add_item(conn, user_id, product_id, quantity=1):
+    """Add a product and record the add_to_cart tracking event in the same transaction."""
+    if quantity < 1:
+        raise ValueError('quantity must be at least 1')
+    def run():
+        product = conn.execute('SELECT id, name FROM products WHERE id = ?', (product_id,)).fetchone()
+        if product is None:
+            raise LookupError('Unknown product')
+        cart_id = _open_cart_id(conn, user_id, create=True)
+        conn.execute('''INSERT INTO cart_items (cart_id, product_id, quantity) VALUES (?, ?, ?)
+                        ON CONFLICT (cart_id, product_id) DO UPDATE SET quantity = quantity + excluded.quantity''',
+                     (cart_id, product[0], quantity))
+        conn.execute('''INSERT INTO user_events (user_id, product_id, product_title, event_type)
+                        VALUES (?, ?, ?, 'add_to_cart')''', (user_id, product[0], product[1]))
+        return _items(conn, cart_id)
+    return _transaction(conn, run)
+
+
+def update_item(conn, user_id, delta, idx=None, product_id=None):
+    """Change a line's quantity by delta; lines that reach zero are removed."""
+    def run():
+        cart_id = _open_cart_id(conn, user_id)
+        pid = _product_at(conn, cart_id, idx, product_id)
+        if pid is not None:
+            conn.execute('UPDATE cart_items SET quantity = quantity + ? WHERE cart_id = ? AND product_id = ?',
+                         (delta, cart_id, pid))
+            conn.execute('DELETE FROM cart_items WHERE cart_id = ? AND product_id = ? AND quantity <= 0',
+                         (cart_id, pid))
+        return _items(conn, cart_id)
+    return _transaction(conn, run)
+
+
+def remove_item(conn, user_id, idx=None, product_id=None):
+    def run():
+        cart_id = _open_cart_id(conn, user_id)
+        pid = _product_at(conn, cart_id, idx, product_id)
+        if pid is not None:
+            conn.execute('DELETE FROM cart_items WHERE cart_id = ? AND product_id = ?', (cart_id, pid))
+        return _items(conn, cart_id)
+    return _transaction(conn, run)
+
+
+def checkout(conn, user_id):
+    """Close the open cart and record one purchase event per unit bought (analytics count event
+    rows, so a line with quantity 3 is three purchases). Returns the ordered items."""
+    def run():
+        cart_id = _open_cart_id(conn, user_id)
+        items = _items(conn, cart_id)
+        if not items:
+            return []
+        conn.executemany('''INSERT INTO user_events (user_id, product_id, product_title, event_type)
+                            VALUES (?, ?, ?, 'purchase')''',
+                         [(user_id, item['product_id'], item['title'])
+                          for item in items for _ in range(item['quantity'])])
+        conn.execute('UPDATE carts SET is_ordered = 1 WHERE id = ?', (cart_id,))
+        return items
+    return _transaction(conn, run)
@@ -0,0 +1,5 @@
+# Values shared by modules that should not import each other: recommendation_simple.py
+# must stay free of the job scheduler (jobs.py) and of pandas / scikit-learn.
+
+# Event weights for product popularity (recommendation candidates, simple trending)
+EVENT_WEIGHTS = {'view': 1, 'rating': 2, 'add_to_cart': 3, 'purchase': 5}
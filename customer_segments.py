@@ -0,0 +1,185 @@
+# Customer segmentation rows for the admin dashboard.
+# model.py writes clustered_customers.csv and then calls sync_database(), which copies
+# it into the customer_segments table (app startup does the same for a CSV written
+# while the app was down), so filtering, sorting and paging happen in SQLite without
+# any reload work on the request path.
+# stream_page() yields the JSON response in chunks straight off the cursor, keeping
+# memory flat however many customers the model was trained on.
+import csv
+import json
+import os
+import sqlite3
+
+DB_PATH = 'users.db'
+CLUSTERED_CUSTOMERS_CSV = 'clustered_customers.csv'
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+# Keeps OFFSET far inside SQLite's integer range; larger pages are rejected before streaming starts
+MAX_PAGE = 1000000
+FETCH_SIZE = 200
+
+# API/CSV column name -> table column
+COLUMNS = [
+    ('CustomerID', 'customer_id'),
+    ('Gender', 'gender'),
+    ('Age', 'age'),
+    ('Annual Income (k$)', 'annual_income'),
+    ('Spending Score (1-100)', 'spending_score'),
+    ('Cluster', 'cluster'),
+]
+FIELD_NAMES = [name for name, _ in COLUMNS]
+SORTABLE = {name: column for name, column in COLUMNS}
+SORTABLE.update({column: column for _, column in COLUMNS})
+
+
+def create_segment_tables(cursor):
+    cursor.execute('''CREATE TABLE IF NOT EXISTS customer_segments (
+        customer_id INTEGER PRIMARY KEY,
+        gender TEXT,
+        age INTEGER,
+        annual_income NUMERIC,
+        spending_score NUMERIC,
+        cluster INTEGER
+    )''')
+    cursor.execute('''CREATE TABLE IF NOT EXISTS customer_segments_source (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        signature TEXT
+    )''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_customer_segments_cluster '
+                   'ON customer_segments (cluster, customer_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_customer_segments_age ON customer_segments (age)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_customer_segments_income '
+                   'ON customer_segments (annual_income)')
+
+
+def _signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return '%d:%d' % (st.st_mtime_ns, st.st_size)
+
+
+def _csv_rows(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            yield tuple(row.get(name) or None for name in FIELD_NAMES)
+
+
+def sync(conn, path=CLUSTERED_CUSTOMERS_CSV):
+    """Reload customer_segments from the CSV if it changed since the last load; returns True if reloaded."""
+    signature = _signature(path)
+    if signature is None:
+        return False
+    row = conn.execute('SELECT signature FROM customer_segments_source WHERE id = 1').fetchone()
+    if row is not None and row[0] == signature:
+        return False
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        conn.execute('DELETE FROM customer_segments')
+        conn.executemany('INSERT OR REPLACE INTO customer_segments VALUES (?, ?, ?, ?, ?, ?)', _csv_rows(path))
+        conn.execute('INSERT OR REPLACE INTO customer_segments_source (id, signature) VALUES (1, ?)', (signature,))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return True
+
+
+def sync_database(db_path=DB_PATH, path=CLUSTERED_CUSTOMERS_CSV):
+    """sync() on its own connection (retrain path; creates the tables on a fresh database)."""
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        cursor = conn.cursor()
+        create_segment_tables(cursor)
+        conn.commit()
+        cursor.close()
+        return sync(conn, path)
+    finally:
+        conn.close()
+
+
+# --- Queries ---
+def _number(value, cast=float):
+    if value in (None, ''):
+        return None
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def parse_query(args):
+    """Filters, sort and page from request args (unknown or malformed values are ignored).
+    Raises ValueError for a page above MAX_PAGE."""
+    sort = SORTABLE.get(args.get('sort', ''), 'customer_id')
+    order = 'DESC' if args.get('order', '').lower() == 'desc' else 'ASC'
+    page = max(_number(args.get('page'), int) or 1, 1)
+    if page > MAX_PAGE:
+        raise ValueError('page must be at most %d' % MAX_PAGE)
+    limit = min(max(_number(args.get('limit'), int) or DEFAULT_PAGE_SIZE, 1), MAX_PAGE_SIZE)
+    filters = {
+        'cluster': _number(args.get('cluster'), int),
+        'gender': args.get('gender') or None,
+        'min_age': _number(args.get('min_age')),
+        'max_age': _number(args.get('max_age')),
+        'min_income': _number(args.get('min_income')),
+        'max_income': _number(args.get('max_income')),
+    }
+    return filters, sort, order, page, limit
+
+
+def _where(filters):
+    clauses, params = [], []
+    for key, clause in (('cluster', 'cluster = ?'), ('gender', 'gender = ?'),
+                        ('min_age', 'age >= ?'), ('max_age', 'age <= ?'),
+                        ('min_income', 'annual_income >= ?'), ('max_income', 'annual_income <= ?')):
+        if filters.get(key) is not None:
+            clauses.append(clause)
+            params.append(filters[key])
+    return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+
+def rows_by_id(conn, customer_ids):
+    """Segment rows for the given CustomerIDs, in the order given (primary-key lookups only)."""
+    found = {}
+    for start in range(0, len(customer_ids), 500):
+        batch = customer_ids[start:start + 500]
+        for row in conn.execute('SELECT customer_id, gender, age, annual_income, spending_score, cluster '
+                                'FROM customer_segments WHERE customer_id IN (%s)' % ','.join('?' * len(batch)),
+                                batch):
+            found[row[0]] = dict(zip(FIELD_NAMES, row))
+    return [found[i] for i in customer_ids if i in found]
+
+
+def page_query(filters, sort='customer_id', order='ASC'):
+    """SQL and params for one page of rows (LIMIT/OFFSET params appended by the caller)."""
+    where, params = _where(filters)
+    # Tie-break on the primary key so pages never overlap
+    order_by = '%s %s' % (sort, order) if sort == 'customer_id' else '%s %s, customer_id' % (sort, order)
+    sql = ('SELECT customer_id, gender, age, annual_income, spending_score, cluster '
+           'FROM customer_segments%s ORDER BY %s LIMIT ? OFFSET ?' % (where, order_by))
+    return sql, params
+
+
+def stream_page(get_connection, filters, sort='customer_id', order='ASC', page=1, limit=DEFAULT_PAGE_SIZE):
+    """Yield one page of segment rows as a JSON document, FETCH_SIZE rows per chunk."""
+    conn = get_connection()
+    try:
+        where, params = _where(filters)
+        total = conn.execute('SELECT COUNT(*) FROM customer_segments' + where, params).fetchone()[0]
+        yield '{"page": %d, "limit": %d, "total": %d, "has_more": %s, "rows": [' % (
+            page, limit, total, 'true' if page * limit < total else 'false')
+        sql, params = page_query(filters, sort, order)
+        cursor = conn.execute(sql, params + [limit, (page - 1) * limit])
+        first = True
+        while True:
+            rows = cursor.fetchmany(FETCH_SIZE)
+            if not rows:
+                break
+            chunk = ','.join(json.dumps(dict(zip(FIELD_NAMES, row))) for row in rows)
+            yield chunk if first else ',' + chunk
+            first = False
+        yield ']}'
+    finally:
+        conn.close()
@@ -0,0 +1,217 @@
+"""Query-level SQLite instrumentation.
+
+With DB_INSTRUMENTATION=1, connections from app.get_db_connection count and time
+every statement per request. Slow statements (over SLOW_QUERY_MS) are written to
+the slow-query log with their EXPLAIN QUERY PLAN. Each distinct statement's plan
+is checked once for full table scans, and a request that repeats the same
+statement N_PLUS_ONE_THRESHOLD times or more is flagged as a likely N+1 pattern.
+
+Index coverage of the hot queries can be checked offline:
+
+    python db_instrumentation.py --check users.db
+"""
+import json
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+
+import customer_segments
+import profiling
+
+DB_INSTRUMENTATION = os.environ.get('DB_INSTRUMENTATION', '0').lower() in ('1', 'true', 'yes')
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 50))
+SLOW_QUERY_LOG = os.environ.get('SLOW_QUERY_LOG', 'slow_queries.log')
+N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', 5))
+
+# Keyed lookups on the request path; each must be served by an index
+HOT_QUERIES = [
+    ('login', 'SELECT id, username, role, password_hash, segment FROM dressly_users '
+              'WHERE username = ? AND role = ?', ('u', 'user')),
+    ('register duplicate check', 'SELECT id FROM dressly_users WHERE username = ? OR email = ?', ('u', 'e')),
+    ('track event product lookup', 'SELECT id FROM products WHERE name = ?', ('n',)),
+    ('recommendation history', 'SELECT DISTINCT product_id FROM user_events '
+                               'WHERE user_id = ? AND product_id IS NOT NULL', (1,)),
+    ('user preferences', 'SELECT favorite_color, preferred_style, budget FROM user_preferences '
+                         'WHERE user_id = ?', (1,)),
+    ('open cart', 'SELECT id FROM carts WHERE user_id = ? AND is_ordered = 0', (1,)),
+    ('cart items', 'SELECT ci.product_id, ci.quantity, p.name, p.price, p.image_url '
+                   'FROM cart_items ci JOIN products p ON p.id = ci.product_id '
+                   'WHERE ci.cart_id = ? ORDER BY ci.id', (1,)),
+    ('cart line by position', 'SELECT product_id FROM cart_items WHERE cart_id = ? '
+                              'ORDER BY id LIMIT 1 OFFSET ?', (1, 0)),
+    ('cart product lookup', 'SELECT id, name FROM products WHERE id = ?', (1,)),
+    # Built by customer_segments itself, so the check covers the statement actually sent
+    ('customer segments page', customer_segments.page_query({'cluster': 1})[0], (1, 100, 0)),
+]
+
+logger = logging.getLogger('dressly.db')
+
+_state = threading.local()
+_plans = {}            # normalized sql -> list of plan detail strings
+_plans_lock = threading.Lock()
+_log_lock = threading.Lock()
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_SPACES = re.compile(r'\s+')
+
+
+def normalize(sql):
+    """Collapse whitespace and literals so repeated statements share one key."""
+    return _SPACES.sub(' ', _LITERALS.sub('?', sql)).strip()
+
+
+def full_scans(plan):
+    """Tables the plan reads without an index ('SCAN t' rather than 'SEARCH t USING ...')."""
+    scans = []
+    for detail in plan:
+        if detail.startswith('SCAN ') and 'INDEX' not in detail:
+            scans.append(detail[5:].split(' ')[0])
+    return scans
+
+
+def explain(conn, sql, params=()):
+    cursor = sqlite3.Cursor(conn)
+    try:
+        return [row[3] for row in cursor.execute('EXPLAIN QUERY PLAN ' + sql, params).fetchall()]
+    finally:
+        cursor.close()
+
+
+def write_log(entry):
+    entry['ts'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+    line = json.dumps(entry, default=str)
+    with _log_lock:
+        with open(SLOW_QUERY_LOG, 'a') as f:
+            f.write(line + '\n')
+    logger.warning(line)
+
+
+# --- Connection classes ---
+class InstrumentedCursor(profiling.TimedCursor):
+    def execute(self, sql, params=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, params)
+        finally:
+            _record(self.connection, sql, params, time.perf_counter() - start)
+
+    def executemany(self, sql, seq_of_params):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_params)
+        finally:
+            _record(self.connection, sql, None, time.perf_counter() - start)
+
+
+class InstrumentedConnection(profiling.TimedConnection):
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+
+def connection_factory():
+    """Connection class for sqlite3.connect()."""
+    return InstrumentedConnection if DB_INSTRUMENTATION else profiling.connection_factory()
+
+
+def is_query(key):
+    """True for a normalized statement that reads rows (SELECT, or a WITH ... SELECT CTE)."""
+    return key.split(' ', 1)[0].upper() in ('SELECT', 'WITH')
+
+
+def _record(conn, sql, params, elapsed):
+    key = normalize(sql)
+    stats = getattr(_state, 'stats', None)
+    if stats is not None:
+        stats['queries'] += 1
+        stats['seconds'] += elapsed
+        stats['statements'][key] = stats['statements'].get(key, 0) + 1
+
+    is_select = is_query(key)
+    if is_select and key not in _plans:
+        try:
+            plan = explain(conn, sql, params or ())
+        except sqlite3.Error:
+            plan = []
+        with _plans_lock:
+            _plans[key] = plan
+        scans = full_scans(plan)
+        if scans:
+            write_log({'kind': 'full_scan', 'sql': key, 'tables': scans, 'plan': plan,
+                       'route': getattr(_state, 'route', None)})
+
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        plan = _plans.get(key)
+        if plan is None and is_select:
+            try:
+                plan = explain(conn, sql, params or ())
+            except sqlite3.Error:
+                plan = []
+        write_log({'kind': 'slow', 'sql': key, 'ms': round(elapsed * 1000, 2), 'plan': plan,
+                   'route': getattr(_state, 'route', None)})
+
+
+# --- Per-request accounting ---
+def begin_request(route=None):
+    _state.stats = {'queries': 0, 'seconds': 0.0, 'statements': {}}
+    _state.route = route
+
+
+def end_request():
+    """Finish the request's accounting; logs N+1 patterns and returns (query count, seconds)."""
+    stats = getattr(_state, 'stats', None)
+    _state.stats = None
+    if stats is None:
+        return 0, 0.0
+    for sql, count in stats['statements'].items():
+        if count >= N_PLUS_ONE_THRESHOLD and is_query(sql):
+            write_log({'kind': 'n_plus_one', 'sql': sql, 'count': count, 'route': getattr(_state, 'route', None)})
+    return stats['queries'], stats['seconds']
+
+
+def install(app):
+    """Hook per-request query accounting into a Flask app when DB_INSTRUMENTATION is set."""
+    if not DB_INSTRUMENTATION:
+        return app
+    from flask import request
+
+    @app.before_request
+    def _db_begin():
+        begin_request(request.url_rule.rule if request.url_rule else request.path)
+
+    @app.after_request
+    def _db_end(response):
+        count, seconds = end_request()
+        response.headers['X-DB-Queries'] = str(count)
+        response.headers['X-DB-Time-Ms'] = '%.2f' % (seconds * 1000)
+        return response
+
+    return app
+
+
+# --- Offline index check ---
+def check_hot_queries(db_path):
+    """EXPLAIN every HOT_QUERIES entry; returns a list of (name, plan, scanned tables)."""
+    conn = sqlite3.connect(db_path)
+    try:
+        return [(name, plan, full_scans(plan)) for name, sql, params in HOT_QUERIES
+                for plan in [explain(conn, sql, params)]]
+    finally:
+        conn.close()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3 or sys.argv[1] != '--check':
+        print('usage: python db_instrumentation.py --check users.db')
+        sys.exit(2)
+    failures = 0
+    for name, plan, scans in check_hot_queries(sys.argv[2]):
+        status = 'FULL SCAN of %s' % ', '.join(scans) if scans else 'indexed'
+        failures += bool(scans)
+        print('%-28s %s' % (name, status))
+        for detail in plan:
+            print('    ' + detail)
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,400 @@
+"""Background jobs: segmentation retraining, analytics rollups and recommendation
+candidate rebuilds, run on cron-like schedules off the request path.
+
+Run as a sidecar next to gunicorn:
+
+    python jobs.py run                 # scheduler loop
+    python jobs.py run-once <job>      # one job now (still single-flight)
+    python jobs.py history
+
+or in-process with JOB_SCHEDULER=1, where every gunicorn worker starts a scheduler
+thread. Either way a job runs at most once per schedule slot: runs take a lease row
+in job_locks (users.db) and record the slot they ran for, so the other workers
+skip it. Every run is recorded in job_runs and shown at /admin/jobs.
+
+Jobs write their artifacts to a temporary file and os.replace() it into place, so
+serving workers only ever open a complete old or complete new file.
+"""
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+
+from constants import EVENT_WEIGHTS
+
+DB_PATH = 'users.db'
+JOB_SCHEDULER = os.environ.get('JOB_SCHEDULER', '0').lower() in ('1', 'true', 'yes')
+HISTORY_LIMIT = 50
+HISTORY_MAX = 500  # largest page /admin/jobs returns
+
+ROLLUP_PATH = 'analytics_rollup.json'
+CANDIDATES_PATH = 'recommendation_candidates.json'
+CANDIDATES_PER_SEGMENT = 20
+
+
+# --- Cron schedules ---
+_FIELD_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 6))
+
+
+def _parse_field(text, lo, hi):
+    values = set()
+    for item in text.split(','):
+        item, _, step = item.partition('/')
+        step = int(step) if step else 1
+        if item == '*':
+            start, end = lo, hi
+        elif '-' in item:
+            start, end = (int(v) for v in item.split('-', 1))
+        else:
+            start = end = int(item)
+            if step > 1:
+                end = hi
+        if not (lo <= start <= end <= hi) or step < 1:
+            raise ValueError('cron field %r out of range %d-%d' % (text, lo, hi))
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+class CronSchedule:
+    """Five-field cron expression (minute hour day month weekday, Sunday = 0).
+    Supports *, lists, ranges and steps; all fields must match."""
+
+    def __init__(self, expr):
+        parts = expr.split()
+        if len(parts) != 5:
+            raise ValueError('cron expression needs 5 fields: %r' % expr)
+        self.expr = expr
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            _parse_field(part, lo, hi) for part, (lo, hi) in zip(parts, _FIELD_RANGES))
+
+    def matches(self, dt):
+        return (dt.minute in self.minutes and dt.hour in self.hours and dt.day in self.days
+                and dt.month in self.months and (dt.weekday() + 1) % 7 in self.weekdays)
+
+    def next_after(self, dt):
+        dt = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        for _ in range(366 * 24 * 60):
+            if self.matches(dt):
+                return dt
+            dt += timedelta(minutes=1)
+        return None
+
+
+class Job:
+    def __init__(self, name, schedule, func, lease_seconds=600):
+        self.name = name
+        self.schedule = CronSchedule(schedule)
+        self.func = func
+        self.lease_seconds = lease_seconds
+
+
+# --- Artifacts ---
+def write_json_atomic(path, data):
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=2, default=str)
+    os.replace(tmp_path, path)
+
+
+_artifacts = {}  # path -> (mtime, data)
+
+
+def load_artifact(path):
+    """Parsed JSON artifact, cached until the file is replaced. None if it hasn't been built."""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    cached = _artifacts.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path) as f:
+            cached = _artifacts[path] = (mtime, json.load(f))
+    return cached[1]
+
+
+# --- Jobs ---
+def retrain_segments():
+    import model
+    return model.retrain()
+
+
+def _top_product(conn, event_type):
+    return conn.execute('''SELECT p.name AS title, COUNT(*) AS n FROM user_events e
+                           JOIN products p ON p.id = e.product_id
+                           WHERE e.event_type = ? GROUP BY e.product_id ORDER BY n DESC LIMIT 1''',
+                        (event_type,)).fetchone()
+
+
+def product_metrics(conn):
+    """Headline product metrics for the admin dashboard."""
+    viewed = _top_product(conn, 'view')
+    added = _top_product(conn, 'add_to_cart')
+    converting = conn.execute('''SELECT p.name AS title,
+                                        SUM(e.event_type = 'purchase') * 1.0 / SUM(e.event_type = 'view') AS rate
+                                 FROM user_events e JOIN products p ON p.id = e.product_id
+                                 WHERE e.event_type IN ('view', 'purchase')
+                                 GROUP BY e.product_id HAVING SUM(e.event_type = 'view') > 0
+                                 ORDER BY rate DESC LIMIT 1''').fetchone()
+    return {
+        'most_viewed_product': {'title': viewed[0], 'views': viewed[1]} if viewed else None,
+        'most_added_product': {'title': added[0], 'add_to_cart': added[1]} if added else None,
+        'highest_conversion_product': ({'title': converting[0], 'conversion_rate': converting[1]}
+                                       if converting else None),
+    }
+
+
+def analytics_rollup():
+    conn = _connect()
+    try:
+        rollup = product_metrics(conn)
+        rollup['events_by_type'] = dict(conn.execute(
+            'SELECT event_type, COUNT(*) FROM user_events GROUP BY event_type').fetchall())
+    finally:
+        conn.close()
+    rollup['generated_at'] = datetime.now().isoformat(timespec='seconds')
+    write_json_atomic(ROLLUP_PATH, rollup)
+    return {'events': sum(rollup['events_by_type'].values())}
+
+
+def recommendation_candidates():
+    """Most engaged-with products overall and per customer segment."""
+    score = ' + '.join("SUM(e.event_type = '%s') * %d" % item for item in EVENT_WEIGHTS.items())
+    conn = _connect()
+    try:
+        rows = conn.execute('''SELECT u.segment, e.product_id, p.name, p.price, p.image_url, %s AS score
+                               FROM user_events e
+                               JOIN products p ON p.id = e.product_id
+                               LEFT JOIN dressly_users u ON u.id = e.user_id
+                               GROUP BY u.segment, e.product_id''' % score).fetchall()
+    finally:
+        conn.close()
+    by_segment = {}
+    overall = {}
+    for segment, product_id, name, price, image_url, value in rows:
+        product = {'id': product_id, 'name': name, 'price': price, 'image_url': image_url}
+        by_segment.setdefault('all' if segment is None else str(segment), []).append((value, product))
+        total = overall.setdefault(product_id, [0, product])
+        total[0] += value
+    candidates = {
+        segment: [p for _, p in sorted(items, key=lambda item: -item[0])[:CANDIDATES_PER_SEGMENT]]
+        for segment, items in by_segment.items()
+    }
+    candidates['all'] = [p for _, p in sorted(overall.values(), key=lambda item: -item[0])[:CANDIDATES_PER_SEGMENT]]
+    write_json_atomic(CANDIDATES_PATH, {'generated_at': datetime.now().isoformat(timespec='seconds'),
+                                        'segments': candidates})
+    return {'segments': len(candidates), 'products': len(overall)}
+
+
+JOBS = {job.name: job for job in [
+    Job('retrain_segments', '0 3 * * *', retrain_segments, lease_seconds=3600),
+    Job('analytics_rollup', '*/15 * * * *', analytics_rollup),
+    Job('recommendation_candidates', '*/30 * * * *', recommendation_candidates),
+]}
+
+
+# --- Locking and history ---
+_schema_ready = set()  # database paths whose job tables exist
+_schema_lock = threading.Lock()
+
+
+def _create_tables(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS job_locks (
+        name TEXT PRIMARY KEY,
+        owner TEXT,
+        expires_at REAL NOT NULL DEFAULT 0,
+        last_slot TEXT
+    )''')
+    conn.execute('''CREATE TABLE IF NOT EXISTS job_runs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        job TEXT NOT NULL,
+        slot TEXT,
+        trigger TEXT,
+        owner TEXT,
+        status TEXT NOT NULL,
+        started_at DATETIME,
+        finished_at DATETIME,
+        duration_ms REAL,
+        detail TEXT
+    )''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_job_runs_job ON job_runs (job, id)')
+    conn.commit()
+
+
+def _connect():
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    if DB_PATH not in _schema_ready:
+        with _schema_lock:
+            if DB_PATH not in _schema_ready:
+                _create_tables(conn)
+                _schema_ready.add(DB_PATH)
+    return conn
+
+
+def _owner():
+    return '%s:%d:%d' % (socket.gethostname(), os.getpid(), threading.get_ident())
+
+
+def _acquire(conn, job, owner, slot):
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        row = conn.execute('SELECT owner, expires_at, last_slot FROM job_locks WHERE name = ?',
+                           (job.name,)).fetchone()
+        now = time.time()
+        if row is not None and ((row[0] and row[1] > now) or (slot is not None and row[2] == slot)):
+            conn.rollback()
+            return False
+        conn.execute('''INSERT INTO job_locks (name, owner, expires_at, last_slot) VALUES (?, ?, ?, ?)
+                        ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at,
+                                                        last_slot = COALESCE(excluded.last_slot, last_slot)''',
+                     (job.name, owner, now + job.lease_seconds, slot))
+        conn.commit()
+        return True
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def _release(conn, job, owner):
+    conn.execute('UPDATE job_locks SET owner = NULL, expires_at = 0 WHERE name = ? AND owner = ?',
+                 (job.name, owner))
+    conn.commit()
+
+
+def run_job(name, slot=None, trigger='schedule'):
+    """Run a job unless another worker holds its lease (or already ran this slot).
+    Returns the run's status, or None if it was skipped."""
+    job = JOBS[name]
+    owner = _owner()
+    conn = _connect()
+    try:
+        if not _acquire(conn, job, owner, slot):
+            return None
+        run_id = conn.execute('''INSERT INTO job_runs (job, slot, trigger, owner, status, started_at)
+                                 VALUES (?, ?, ?, ?, 'running', ?)''',
+                              (name, slot, trigger, owner, datetime.now().isoformat(timespec='seconds'))).lastrowid
+        conn.commit()
+        start = time.perf_counter()
+        try:
+            status, detail = 'ok', job.func()
+        except Exception:
+            status, detail = 'failed', traceback.format_exc(limit=8)
+        conn.execute('UPDATE job_runs SET status = ?, finished_at = ?, duration_ms = ?, detail = ? WHERE id = ?',
+                     (status, datetime.now().isoformat(timespec='seconds'), (time.perf_counter() - start) * 1000,
+                      json.dumps(detail, default=str), run_id))
+        conn.commit()
+        _release(conn, job, owner)
+        return status
+    finally:
+        conn.close()
+
+
+def trigger(name):
+    """Start a job in a background thread now (admin 'run now')."""
+    thread = threading.Thread(target=run_job, args=(name, None, 'manual'), name='job-' + name, daemon=True)
+    thread.start()
+    return thread
+
+
+def history(limit=HISTORY_LIMIT, job=None):
+    conn = _connect()
+    conn.row_factory = sqlite3.Row
+    try:
+        if job:
+            rows = conn.execute('SELECT * FROM job_runs WHERE job = ? ORDER BY id DESC LIMIT ?', (job, limit))
+        else:
+            rows = conn.execute('SELECT * FROM job_runs ORDER BY id DESC LIMIT ?', (limit,))
+        return [dict(row) for row in rows]
+    finally:
+        conn.close()
+
+
+def status():
+    """Schedule, lease holder and next run time of every job."""
+    conn = _connect()
+    try:
+        locks = {row[0]: row[1:] for row in conn.execute('SELECT name, owner, expires_at FROM job_locks')}
+    finally:
+        conn.close()
+    now = datetime.now()
+    result = []
+    for job in JOBS.values():
+        owner, expires_at = locks.get(job.name, (None, 0))
+        next_run = job.schedule.next_after(now)
+        result.append({'name': job.name, 'schedule': job.schedule.expr,
+                       'running': bool(owner and expires_at > time.time()), 'owner': owner,
+                       'next_run': next_run.isoformat(timespec='minutes') if next_run else None})
+    return result
+
+
+# --- Scheduler ---
+class Scheduler:
+    def __init__(self, jobs=None):
+        self.jobs = jobs or JOBS
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._loop, name='job-scheduler', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def tick(self, now):
+        """Start every job due in the minute `now`; returns the started threads."""
+        slot = now.strftime('%Y-%m-%dT%H:%M')
+        threads = []
+        for job in self.jobs.values():
+            if job.schedule.matches(now):
+                thread = threading.Thread(target=run_job, args=(job.name, slot), name='job-' + job.name,
+                                          daemon=True)
+                thread.start()
+                threads.append(thread)
+        return threads
+
+    def _loop(self):
+        last = None
+        while not self._stop.is_set():
+            now = datetime.now().replace(second=0, microsecond=0)
+            if now != last:
+                self.tick(now)
+                last = now
+            self._stop.wait(60.5 - datetime.now().second)
+
+    def join(self):
+        while self._thread.is_alive():
+            self._thread.join(1)
+
+
+_scheduler = {}
+
+
+def install(app):
+    """Start an in-process scheduler thread when JOB_SCHEDULER is set; otherwise do nothing."""
+    if JOB_SCHEDULER and 'instance' not in _scheduler:
+        _scheduler['instance'] = Scheduler().start()
+    return app
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'run'
+    if command == 'run':
+        print('Scheduling', ', '.join('%s (%s)' % (j.name, j.schedule.expr) for j in JOBS.values()))
+        Scheduler().start().join()
+    elif command == 'run-once' and len(sys.argv) == 3 and sys.argv[2] in JOBS:
+        result = run_job(sys.argv[2], trigger='manual')
+        print(sys.argv[2], result or 'skipped: another run holds the lease')
+        sys.exit(0 if result in ('ok', None) else 1)
+    elif command == 'history':
+        for run in reversed(history()):
+            print('%-6s %-26s %-8s %-19s %8.0fms %s' % (run['id'], run['job'], run['status'], run['started_at'],
+                                                         run['duration_ms'] or 0, run['detail'] or ''))
+    else:
+        print('usage: python jobs.py [run | run-once <%s> | history]' % '|'.join(JOBS))
+        sys.exit(2)
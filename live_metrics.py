@@ -0,0 +1,187 @@
+"""Live activity feed for the admin dashboard (/admin/stream, Server-Sent Events).
+
+One broadcaster thread per worker reads the user_events rows added since the last
+id it has seen (a primary-key range scan) and keeps running totals in memory: by
+event type, per customer segment and per product. Each poll's increment is sent
+as a `delta` event to every connected admin. Reading the table instead of hooking
+record_event() means events written by other gunicorn workers are included, and
+record_event(), add_to_cart and checkout call notify() so this worker's own events
+go out without waiting for the next poll. The thread only runs while at least one admin is connected.
+
+A stream starts with a `snapshot` of the totals, then sends deltas. A client that
+falls behind is dropped; EventSource reconnects and gets a fresh snapshot.
+"""
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+DB_PATH = 'users.db'
+POLL_SECONDS = float(os.environ.get('STREAM_POLL_SECONDS', 2))
+KEEPALIVE_SECONDS = 15
+# Streams are closed after this long so they don't pin a worker thread forever; the browser reconnects
+STREAM_MAX_SECONDS = int(os.environ.get('STREAM_MAX_SECONDS', 300))
+RETRY_MS = 3000
+SUBSCRIBER_QUEUE_SIZE = 100
+POLL_BATCH = 10000
+
+
+def _segment_key(segment):
+    return 'unknown' if segment is None else str(segment)
+
+
+def _bump(counters, key, event_type, n=1):
+    by_type = counters.setdefault(key, {})
+    by_type[event_type] = by_type.get(event_type, 0) + n
+
+
+class Broadcaster:
+    def __init__(self, db_path=DB_PATH, poll_seconds=POLL_SECONDS):
+        self.db_path = db_path
+        self.poll_seconds = poll_seconds
+        self.subscribers = set()
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+        self.last_id = None
+        self.events = {}
+        self.segments = {}
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=5)
+
+    def _load_totals(self):
+        """Seed the running totals (once per process; later restarts catch up from last_id)."""
+        conn = self._connect()
+        try:
+            last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM user_events').fetchone()[0]
+            rows = conn.execute('''SELECT u.segment, e.event_type, COUNT(*) FROM user_events e
+                                   LEFT JOIN dressly_users u ON u.id = e.user_id
+                                   WHERE e.id <= ? GROUP BY u.segment, e.event_type''', (last_id,)).fetchall()
+        finally:
+            conn.close()
+        for segment, event_type, count in rows:
+            self.events[event_type] = self.events.get(event_type, 0) + count
+            _bump(self.segments, _segment_key(segment), event_type, count)
+        self.last_id = last_id
+
+    def snapshot(self):
+        return {'events': dict(self.events), 'segments': {k: dict(v) for k, v in self.segments.items()},
+                'last_id': self.last_id, 'at': datetime.now().isoformat(timespec='seconds')}
+
+    # --- Subscribers ---
+    def subscribe(self):
+        """Register a listener; returns (queue, snapshot of the totals it will receive deltas against)."""
+        q = queue.Queue(SUBSCRIBER_QUEUE_SIZE)
+        with self.lock:
+            if self.last_id is None:
+                self._load_totals()
+            self.subscribers.add(q)
+            snapshot = self.snapshot()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name='live-metrics', daemon=True)
+                self.thread.start()
+        return q, snapshot
+
+    def unsubscribe(self, q):
+        with self.lock:
+            self.subscribers.discard(q)
+
+    def is_subscribed(self, q):
+        with self.lock:
+            return q in self.subscribers
+
+    def notify(self):
+        """Wake the broadcaster now instead of at the next poll."""
+        self.wake.set()
+
+    def _publish(self, event, data):
+        for q in list(self.subscribers):
+            try:
+                q.put_nowait((event, data))
+            except queue.Full:
+                # Too far behind: drop it; its stream ends and the browser reconnects with a snapshot
+                self.subscribers.discard(q)
+
+    # --- Polling ---
+    def poll(self, conn):
+        """Fold events newer than last_id into the totals and publish them as one delta."""
+        with self.lock:
+            rows = conn.execute('''SELECT e.id, e.event_type, e.product_title, u.segment FROM user_events e
+                                   LEFT JOIN dressly_users u ON u.id = e.user_id
+                                   WHERE e.id > ? ORDER BY e.id LIMIT ?''', (self.last_id, POLL_BATCH)).fetchall()
+            if not rows:
+                return None
+            delta = {'events': {}, 'segments': {}, 'products': {}}
+            for event_id, event_type, title, segment in rows:
+                delta['events'][event_type] = delta['events'].get(event_type, 0) + 1
+                _bump(delta['segments'], _segment_key(segment), event_type)
+                if title:
+                    _bump(delta['products'], title, event_type)
+            for event_type, n in delta['events'].items():
+                self.events[event_type] = self.events.get(event_type, 0) + n
+            for segment, by_type in delta['segments'].items():
+                for event_type, n in by_type.items():
+                    _bump(self.segments, segment, event_type, n)
+            self.last_id = rows[-1][0]
+            delta['last_id'] = self.last_id
+            delta['at'] = datetime.now().isoformat(timespec='seconds')
+            self._publish('delta', delta)
+            return delta
+
+    def _run(self):
+        conn = None
+        while True:
+            with self.lock:
+                if not self.subscribers:
+                    self.thread = None
+                    break
+            self.wake.clear()
+            try:
+                if conn is None:
+                    conn = self._connect()
+                while self.poll(conn) is not None and len(self.subscribers):
+                    pass
+            except sqlite3.Error as e:
+                print('live metrics: poll failed: %s' % e, file=sys.stderr)
+                if conn is not None:
+                    conn.close()
+                conn = None
+            self.wake.wait(self.poll_seconds)
+        if conn is not None:
+            conn.close()
+
+
+broadcaster = Broadcaster()
+
+
+def notify():
+    broadcaster.notify()
+
+
+def _format(event, data):
+    return 'event: %s\ndata: %s\n\n' % (event, json.dumps(data, separators=(',', ':')))
+
+
+def stream(source=None):
+    """Generator of SSE frames for one client: a snapshot, then deltas and keep-alive comments."""
+    source = source or broadcaster
+    q, snapshot = source.subscribe()
+    deadline = time.monotonic() + STREAM_MAX_SECONDS
+    try:
+        yield 'retry: %d\n' % RETRY_MS + _format('snapshot', snapshot)
+        while time.monotonic() < deadline:
+            try:
+                event, data = q.get(timeout=KEEPALIVE_SECONDS)
+            except queue.Empty:
+                if not source.is_subscribed(q):
+                    return
+                yield ': keepalive\n\n'
+                continue
+            yield _format(event, data)
+    finally:
+        source.unsubscribe(q)
@@ -66,6 +66,7 @@ def create_tables():
         FOREIGN KEY (cart_id) REFERENCES carts(id),
         FOREIGN KEY (product_id) REFERENCES products(id)
     )''')
+    cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_cart_items_cart_product ON cart_items (cart_id, product_id)')
     
     conn.commit()
     cursor.close()
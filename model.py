@@ -1,36 +1,213 @@
+import json
+import os
+import sqlite3
+
 import pandas as pd
 from sklearn.preprocessing import StandardScaler
 from sklearn.cluster import KMeans
 import joblib
+import customer_segments
+import model_registry
+import parallel_kmeans
+from segment_predictor import SegmentPredictor, check_parity, export_predictor
+from segment_summary import build_summary, write_summary
 
-# 1. Load the data
-data = pd.read_csv('data.csv')
+# Customer segmentation training. Run directly (python model.py) or through the
+# retrain_segments job in jobs.py.
+
+DATA_CSV = 'data.csv'
+KMEANS_MODEL_PATH = 'kmeans_model.pkl'
+SCALER_PATH = 'scaler.pkl'
+CLUSTERED_CUSTOMERS_CSV = 'clustered_customers.csv'
+DB_PATH = 'users.db'
+# Stored segment ids that promote() translates to the new model's numbering
+SEGMENT_COLUMNS = (('dressly_users', 'segment'), ('ads', 'target_segment'))
 
-# 2. Preprocess the data
 # Example: Assume columns like 'Age', 'Annual Income', 'Spending Score'
 # Modify these columns as per your actual data.csv
-features = ['Age', 'Annual Income (k$)', 'Spending Score (1-100)']
-X = data[features]
+FEATURES = ['Age', 'Annual Income (k$)', 'Spending Score (1-100)']
+N_CLUSTERS = 4  # You can choose the number of clusters
+# From this many customers, fit with the shared-memory parallel engine when more than one
+# worker is configured; below it the worker start-up and per-iteration IPC cost more than
+# they save (see parallel_kmeans.py)
+PARALLEL_KMEANS_MIN_ROWS = int(os.environ.get('PARALLEL_KMEANS_MIN_ROWS', 200000))
+# 'promote' serves a new model immediately; 'shadow' registers it as the candidate only
+MODEL_ROLLOUT = os.environ.get('MODEL_ROLLOUT', 'promote')
+
+
+# 1. Load the data
+def load_data(path=DATA_CSV):
+    return pd.read_csv(path)
+
+
+# 2./3. Preprocess and apply KMeans clustering
+def feature_matrix(data, features=FEATURES):
+    X = data[features]
+    # Handle missing values if any
+    return X.fillna(X.mean())
+
+
+def train(data, features=FEATURES, n_clusters=N_CLUSTERS):
+    """Fit scaler + KMeans; returns (data with a Cluster column, scaler, kmeans)."""
+    X = feature_matrix(data, features)
+    scaler = StandardScaler()
+    X_scaled = scaler.fit_transform(X)
+
+    if len(X_scaled) >= PARALLEL_KMEANS_MIN_ROWS and parallel_kmeans.KMEANS_WORKERS > 1:
+        kmeans = parallel_kmeans.fit(X_scaled, n_clusters, random_state=42)
+        labels = kmeans.labels_
+    else:
+        kmeans = KMeans(n_clusters=n_clusters, random_state=42)
+        labels = kmeans.fit_predict(X_scaled)
+    data = data.copy()
+    # Add cluster labels to the original data (for admin analysis)
+    data['Cluster'] = labels
+    return data, scaler, kmeans
+
+
+# 4. Register the model and scaler as a new immutable version
+def publish_model(data, scaler, kmeans, features=FEATURES, metadata=None):
+    predictor = SegmentPredictor.from_sklearn(scaler, kmeans)
+    # The app serves the exported predictor, not sklearn: refuse to publish if they disagree
+    check_parity(predictor, scaler, kmeans, data[features])
+
+    def write_predictor(path):
+        with open(path, 'w') as f:
+            json.dump(predictor.to_dict(), f, indent=2)
+
+    return model_registry.publish({
+        'kmeans_model.pkl': lambda p: joblib.dump(kmeans, p),
+        'scaler.pkl': lambda p: joblib.dump(scaler, p),
+        'segment_predictor.json': write_predictor,
+    }, metadata=dict(metadata or {}, customers=len(data), clusters=kmeans.n_clusters,
+                     inertia=float(kmeans.inertia_)))
+
+
+# 5. Save the top-level artifacts and clustered data for the Flask app
+def stage_artifacts(data, scaler, kmeans):
+    """Write the top-level artifacts to temporary files; returns [(tmp_path, path)] for
+    publish_artifacts(). Nothing is left behind if a write fails."""
+    staged = []
+    try:
+        for path, save in ((KMEANS_MODEL_PATH, lambda p: joblib.dump(kmeans, p)),
+                           (SCALER_PATH, lambda p: joblib.dump(scaler, p)),
+                           (CLUSTERED_CUSTOMERS_CSV, lambda p: data.to_csv(p, index=False))):
+            tmp_path = '%s.%d.tmp' % (path, os.getpid())
+            staged.append((tmp_path, path))
+            save(tmp_path)
+    except Exception:
+        discard_artifacts(staged)
+        raise
+    return staged
+
+
+def discard_artifacts(staged):
+    for tmp_path, _ in staged:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def publish_artifacts(staged, data, scaler, kmeans, features=FEATURES):
+    """os.replace() the staged files into place, so a serving worker never opens a half-written
+    pickle or CSV, then rebuild everything derived from them."""
+    for tmp_path, path in staged:
+        os.replace(tmp_path, path)
+
+    # Reload the admin customer_segments table here rather than on the request path
+    customer_segments.sync_database(path=CLUSTERED_CUSTOMERS_CSV)
+    # Plain-float copy of the scaler+centroids for scikit-learn-free serving
+    export_predictor(KMEANS_MODEL_PATH, SCALER_PATH)
+    # Per-segment profile summary and CustomerID index for the admin dashboard
+    summary, ids_by_cluster = build_summary(data, features, scaler, kmeans)
+    write_summary(summary, ids_by_cluster)
+
+
+def save_artifacts(data, scaler, kmeans, features=FEATURES):
+    publish_artifacts(stage_artifacts(data, scaler, kmeans), data, scaler, kmeans, features)
+
+
+# 6. Make a registered version live
+def remap_segments(conn, mapping):
+    """Rewrite the stored segment ids through {old id: new id} (inside the caller's transaction)."""
+    if not mapping or all(old == new for old, new in mapping.items()):
+        return
+    tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    case = 'CASE %%s %s ELSE %%s END' % ' '.join('WHEN %d THEN %d' % (int(old), int(new))
+                                                   for old, new in mapping.items())
+    for table, column in SEGMENT_COLUMNS:
+        if table in tables:
+            conn.execute('UPDATE %s SET %s = %s WHERE %s IS NOT NULL' % (table, column, case % (column, column),
+                                                                      column))
+
+
+def _go_live(version, data, scaler, kmeans, db_path=DB_PATH):
+    # Refuses (LabelMismatchError) before anything is written if stored ids cannot be translated
+    mapping = model_registry.segment_mapping(version)
+    staged = stage_artifacts(data, scaler, kmeans)
+    previous = model_registry.current_version()
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        # app.register() predicts and stores a segment under this same write lock, so every
+        # stored id is either renumbered here or predicted after CURRENT has moved
+        conn.execute('BEGIN IMMEDIATE')
+        remap_segments(conn, mapping)
+        model_registry.promote(version)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        discard_artifacts(staged)
+        if previous and model_registry.current_version() != previous:
+            model_registry.promote(previous)  # the commit failed after the pointer moved
+        raise
+    finally:
+        conn.close()
+    # Only now that CURRENT and the stored ids have moved do the top-level files follow
+    publish_artifacts(staged, data, scaler, kmeans)
+    return mapping
+
 
-# Handle missing values if any
-X = X.fillna(X.mean())
+def promote(version, data_path=DATA_CSV):
+    """Serve a registered version: relabel the customers with it, rewrite the top-level
+    artifacts, admin table and segment summary from it, translate the stored segment ids
+    (users, ads) to its numbering and move CURRENT. Returns the {old: new} id mapping."""
+    model_registry.verify(version)
+    scaler = joblib.load(model_registry.artifact_path(SCALER_PATH, version))
+    kmeans = joblib.load(model_registry.artifact_path(KMEANS_MODEL_PATH, version))
+    data = load_data(data_path)
+    data['Cluster'] = kmeans.predict(scaler.transform(feature_matrix(data)))
+    return _go_live(version, data, scaler, kmeans)
 
-# Scale features
-scaler = StandardScaler()
-X_scaled = scaler.fit_transform(X)
 
-# 3. Apply KMeans clustering
-kmeans = KMeans(n_clusters=4, random_state=42)  # You can choose the number of clusters
-clusters = kmeans.fit_predict(X_scaled)
+def _trained_on(version):
+    """sha256 of the data file a registered version was trained on (None if unknown)."""
+    if version is None:
+        return None
+    try:
+        return model_registry.manifest(version)['metadata'].get('data_sha256')
+    except (OSError, ValueError):
+        return None
 
-# Add cluster labels to the original data (optional, for admin analysis)
-data['Cluster'] = clusters
 
-# 4. Save the model and scaler for use in Flask app
-joblib.dump(kmeans, 'kmeans_model.pkl')
-joblib.dump(scaler, 'scaler.pkl')
+def retrain(data_path=DATA_CSV, rollout=MODEL_ROLLOUT, force=False):
+    """Train on data_path and register the result. Unless `force`, nothing is trained when
+    the data is byte-identical to what the current (or candidate) version was trained on."""
+    data_sha256 = model_registry.file_sha256(data_path)
+    for version in (model_registry.current_version(), model_registry.candidate_version()):
+        if not force and _trained_on(version) == data_sha256:
+            return {'skipped': 'data unchanged', 'version': version, 'rollout': rollout}
+    data, scaler, kmeans = train(load_data(data_path))
+    version = publish_model(data, scaler, kmeans, metadata={'data_sha256': data_sha256})
+    if rollout == 'shadow':
+        # Live traffic keeps the current model; the candidate is only scored alongside it
+        model_registry.set_candidate(version)
+    else:
+        _go_live(version, data, scaler, kmeans)
+    return {'customers': len(data), 'clusters': kmeans.n_clusters, 'version': version, 'rollout': rollout,
+            'pruned': model_registry.prune()}
 
-# 5. (Optional) Save clustered data for admin dashboard
-data.to_csv('clustered_customers.csv', index=False)
 
-print("Model trained and saved. Number of clusters:", kmeans.n_clusters)
\ No newline at end of file
+if __name__ == '__main__':
+    # A manual run always trains; the nightly job skips unchanged data
+    result = retrain(force=True)
+    print("Model trained and saved. Number of clusters:", result['clusters'])
+    print("Registered version %s (%s)" % (result['version'], result['rollout']))
@@ -0,0 +1,325 @@
+"""Versioned registry for the segmentation model.
+
+    models/
+      20261019-031502-3fa9c1d2/      one immutable directory per trained version
+        kmeans_model.pkl
+        scaler.pkl
+        segment_predictor.json
+        manifest.json                sha256 of every file, training metadata
+      CURRENT                        version served to live requests
+      CANDIDATE                      optional version scored in shadow mode
+
+A version directory is assembled under a temporary name and renamed into place,
+and the pointer files are swapped with os.replace(), so readers never see a
+partial version. Workers check the CURRENT pointer on use and load the new
+version's predictor (after verifying its checksums) without a restart.
+
+With a CANDIDATE set, SHADOW_SAMPLE_RATE of live segment assignments are also
+scored by the candidate; agreement rate (after matching the candidate's clusters
+to the live ones by centroid) and latency difference are reported by
+shadow_stats() (per worker) and /admin/models.
+
+    python model_registry.py list
+    python model_registry.py promote <version>
+    python model_registry.py candidate <version>|none
+    python model_registry.py prune [keep]
+"""
+import hashlib
+import itertools
+import json
+import os
+import random
+import shutil
+import sys
+import threading
+import time
+from datetime import datetime
+
+from segment_predictor import SegmentPredictor, load_predictor
+
+REGISTRY_DIR = os.environ.get('MODEL_REGISTRY_DIR', 'models')
+SHADOW_SAMPLE_RATE = float(os.environ.get('SHADOW_SAMPLE_RATE', 0.1))
+# prune() keeps this many newest versions (plus CURRENT and CANDIDATE) for rollback
+KEEP_VERSIONS = int(os.environ.get('MODEL_KEEP_VERSIONS', 5))
+PREDICTOR_FILE = 'segment_predictor.json'
+MANIFEST_FILE = 'manifest.json'
+
+
+class ChecksumError(Exception):
+    pass
+
+
+class LabelMismatchError(Exception):
+    pass
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _write_pointer(name, version):
+    path = os.path.join(REGISTRY_DIR, name)
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        f.write(version + '\n')
+    os.replace(tmp_path, path)
+
+
+def _read_pointer(name):
+    try:
+        with open(os.path.join(REGISTRY_DIR, name)) as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+# --- Publishing ---
+def publish(writers, metadata=None):
+    """Store a new immutable version. `writers` maps file name -> function(path) that writes it.
+    Returns the version id; nothing is served until promote() or set_candidate()."""
+    os.makedirs(REGISTRY_DIR, exist_ok=True)
+    staging = os.path.join(REGISTRY_DIR, '.staging-%d-%d' % (os.getpid(), threading.get_ident()))
+    os.makedirs(staging)
+    try:
+        for name, write in writers.items():
+            write(os.path.join(staging, name))
+        checksums = {name: file_sha256(os.path.join(staging, name)) for name in sorted(writers)}
+        digest = hashlib.sha256(json.dumps(checksums, sort_keys=True).encode()).hexdigest()[:8]
+        version = '%s-%s' % (datetime.now().strftime('%Y%m%d-%H%M%S'), digest)
+        manifest = {'version': version, 'created_at': datetime.now().isoformat(timespec='seconds'),
+                    'files': checksums, 'metadata': metadata or {}}
+        with open(os.path.join(staging, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=2, default=str)
+        for name in os.listdir(staging):
+            os.chmod(os.path.join(staging, name), 0o444)
+        target = os.path.join(REGISTRY_DIR, version)
+        if os.path.isdir(target):
+            # Same content published within the same second: that version already exists
+            shutil.rmtree(staging, ignore_errors=True)
+            return version
+        os.rename(staging, target)
+        return version
+    except Exception:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+
+def manifest(version):
+    with open(os.path.join(REGISTRY_DIR, version, MANIFEST_FILE)) as f:
+        return json.load(f)
+
+
+def verify(version):
+    """Raise ChecksumError unless every file of the version matches its manifest."""
+    for name, expected in manifest(version)['files'].items():
+        if file_sha256(os.path.join(REGISTRY_DIR, version, name)) != expected:
+            raise ChecksumError('%s/%s does not match its manifest checksum' % (version, name))
+
+
+def versions():
+    try:
+        names = os.listdir(REGISTRY_DIR)
+    except OSError:
+        return []
+    return sorted(n for n in names if os.path.isfile(os.path.join(REGISTRY_DIR, n, MANIFEST_FILE)))
+
+
+def promote(version):
+    """Point CURRENT at `version`; workers pick it up on their next use. This only moves the
+    pointer: model.promote() also rewrites the derived artifacts and stored segment ids."""
+    verify(version)
+    _write_pointer('CURRENT', version)
+    if _read_pointer('CANDIDATE') == version:
+        clear_candidate()
+
+
+def set_candidate(version):
+    verify(version)
+    _write_pointer('CANDIDATE', version)
+
+
+def clear_candidate():
+    try:
+        os.remove(os.path.join(REGISTRY_DIR, 'CANDIDATE'))
+    except OSError:
+        pass
+
+
+def current_version():
+    return _read_pointer('CURRENT')
+
+
+def candidate_version():
+    return _read_pointer('CANDIDATE')
+
+
+def prune(keep=KEEP_VERSIONS):
+    """Delete all but the newest `keep` versions; CURRENT and CANDIDATE are always kept.
+    Returns the deleted version ids."""
+    all_versions = versions()
+    kept = set(all_versions[-keep:] if keep > 0 else ()) | {current_version(), candidate_version()}
+    removed = [v for v in all_versions if v not in kept]
+    for version in removed:
+        shutil.rmtree(os.path.join(REGISTRY_DIR, version), ignore_errors=True)
+    return removed
+
+
+def artifact_path(name, version=None):
+    """Path of an artifact of the current (or given) version; the legacy top-level file if none."""
+    version = version or current_version()
+    if version is None:
+        return name
+    return os.path.join(REGISTRY_DIR, version, name)
+
+
+def _load_version_predictor(version):
+    with open(os.path.join(REGISTRY_DIR, version, PREDICTOR_FILE)) as f:
+        return SegmentPredictor.from_dict(json.load(f))
+
+
+def segment_mapping(version, from_version=None):
+    """{segment id under from_version (default CURRENT): segment id under version}, pairing
+    clusters by nearest centroid; None if there is nothing to translate. Raises
+    LabelMismatchError unless the clusters pair up one-to-one."""
+    from_version = from_version or current_version()
+    if from_version is None or from_version == version:
+        return None
+    new, old = _load_version_predictor(version), _load_version_predictor(from_version)
+    mapping = align_labels(new, old)
+    if new.n_clusters != old.n_clusters or sorted(mapping) != list(range(new.n_clusters)):
+        raise LabelMismatchError('%s (%d clusters) does not pair up one-to-one with %s (%d clusters): %s' % (
+            version, new.n_clusters, from_version, old.n_clusters, mapping))
+    return dict(enumerate(mapping))
+
+
+# --- Hot-swapping loaders ---
+_loaded = {}  # pointer name -> (version, predictor)
+_failed = {}  # pointer name -> version that failed to load
+_load_lock = threading.Lock()
+
+
+def _predictor(pointer):
+    version = _read_pointer(pointer)
+    loaded = _loaded.get(pointer)
+    if version is None:
+        return None, None
+    if (loaded is None or loaded[0] != version) and _failed.get(pointer) != version:
+        with _load_lock:
+            loaded = _loaded.get(pointer)
+            if loaded is None or loaded[0] != version:
+                try:
+                    verify(version)
+                    with open(os.path.join(REGISTRY_DIR, version, PREDICTOR_FILE)) as f:
+                        loaded = (version, SegmentPredictor.from_dict(json.load(f)))
+                except (OSError, ValueError, ChecksumError) as e:
+                    # Keep serving the previously loaded version
+                    _failed[pointer] = version
+                    print('model registry: not loading %s %s: %s' % (pointer, version, e), file=sys.stderr)
+                    if loaded is None:
+                        return None, None
+                    return loaded[1], loaded[0]
+                _loaded[pointer] = loaded
+    if loaded is None:
+        return None, None
+    return loaded[1], loaded[0]
+
+
+def current_predictor():
+    """Predictor of the CURRENT version, falling back to the top-level segment_predictor.json."""
+    predictor, _ = _predictor('CURRENT')
+    return predictor if predictor is not None else load_predictor()
+
+
+# --- Shadow scoring ---
+_shadow = {'requests': 0, 'agree': 0, 'primary_seconds': 0.0, 'candidate_seconds': 0.0, 'candidate': None,
+           'mapping': None}
+_shadow_lock = threading.Lock()
+
+
+def align_labels(reference, candidate):
+    """Map each candidate cluster to the reference cluster with the nearest centroid.
+    K-means numbers clusters arbitrarily, so labels are compared through this mapping."""
+    def dist(a, b):
+        return sum(((x - y) / s) ** 2 for x, y, s in zip(a, b, reference.scale))
+    ref_centres = reference._raw_centroids
+    cand_centres = candidate._raw_centroids
+    if len(ref_centres) == len(cand_centres) <= 8:
+        # Exhaustive: the permutation with the smallest total centroid distance
+        best = min(itertools.permutations(range(len(ref_centres))),
+                   key=lambda perm: sum(dist(cand_centres[i], ref_centres[j]) for i, j in enumerate(perm)))
+        return list(best)
+    return [min(range(len(ref_centres)), key=lambda j: dist(c, ref_centres[j])) for c in cand_centres]
+
+
+def predict_profile(profile):
+    """Segment for a profile from the live model; a sample is also scored by the CANDIDATE."""
+    predictor = current_predictor()
+    if predictor is None:
+        return None
+    start = time.perf_counter()
+    segment = predictor.predict_profile(profile)
+    primary_seconds = time.perf_counter() - start
+    if SHADOW_SAMPLE_RATE and random.random() < SHADOW_SAMPLE_RATE:
+        candidate, version = _predictor('CANDIDATE')
+        if candidate is not None:
+            start = time.perf_counter()
+            shadow_segment = candidate.predict_profile(profile)
+            candidate_seconds = time.perf_counter() - start
+            with _shadow_lock:
+                if _shadow['candidate'] != (version, current_version()):
+                    _shadow.update(requests=0, agree=0, primary_seconds=0.0, candidate_seconds=0.0,
+                                   candidate=(version, current_version()),
+                                   mapping=align_labels(predictor, candidate))
+                _shadow['requests'] += 1
+                _shadow['agree'] += _shadow['mapping'][shadow_segment] == segment
+                _shadow['primary_seconds'] += primary_seconds
+                _shadow['candidate_seconds'] += candidate_seconds
+    return segment
+
+
+def shadow_stats():
+    """Agreement rate and mean latency difference of the candidate over the sampled requests (this worker)."""
+    with _shadow_lock:
+        s = dict(_shadow)
+    n = s['requests']
+    return {
+        'current': current_version(),
+        'candidate': _read_pointer('CANDIDATE'),
+        'scored_candidate': s['candidate'][0] if s['candidate'] else None,
+        'label_mapping': s['mapping'],
+        'requests': n,
+        'agreement_rate': s['agree'] / n if n else None,
+        'primary_ms': s['primary_seconds'] * 1000 / n if n else None,
+        'candidate_ms': s['candidate_seconds'] * 1000 / n if n else None,
+        'latency_diff_ms': (s['candidate_seconds'] - s['primary_seconds']) * 1000 / n if n else None,
+        'sample_rate': SHADOW_SAMPLE_RATE,
+    }
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'list'
+    if command == 'list':
+        current, candidate = current_version(), _read_pointer('CANDIDATE')
+        for version in versions():
+            tag = ' (current)' if version == current else ' (candidate)' if version == candidate else ''
+            print(version + tag, json.dumps(manifest(version)['metadata']))
+    elif command == 'promote' and len(sys.argv) == 3:
+        import model
+        model.promote(sys.argv[2])
+        print('current ->', sys.argv[2])
+    elif command == 'candidate' and len(sys.argv) == 3:
+        if sys.argv[2] == 'none':
+            clear_candidate()
+        else:
+            set_candidate(sys.argv[2])
+        print('candidate ->', sys.argv[2])
+    elif command == 'prune' and len(sys.argv) <= 3:
+        for version in prune(int(sys.argv[2]) if len(sys.argv) == 3 else KEEP_VERSIONS):
+            print('removed', version)
+    else:
+        print('usage: python model_registry.py [list | promote <version> | candidate <version>|none | prune [keep]]')
+        sys.exit(2)
@@ -0,0 +1,79 @@
+"""Fragment cache for the static marketing pages.
+
+/about, /contact, /service and /cart render the same HTML for every visitor except
+for the session-aware part of the navbar (templates/_session_nav.html). Each page
+is rendered once per process with a placeholder where that fragment goes, and
+requests splice in the current session's fragment: anonymous visitors get a
+cached copy, signed-in users one tiny template render.
+
+Responses carry an ETag built from the page body and the fragment, plus a
+Last-Modified taken from the newest template or asset manifest at startup, and
+matching conditional requests get an empty 304.
+"""
+import hashlib
+import os
+from datetime import datetime, timezone
+
+from flask import current_app, make_response, render_template, request, session
+
+import static_assets
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
+NAV_TEMPLATE = '_session_nav.html'
+NAV_PLACEHOLDER = '<!--session-nav-->'
+
+_pages = {}  # template name -> (html before nav, html after nav, body digest)
+_shared = {}  # anonymous nav fragment, deploy timestamp
+
+
+def deployed_at():
+    """Newest mtime of the templates and asset manifest, i.e. when this build's pages last changed."""
+    if 'deployed_at' not in _shared:
+        paths = [os.path.join(TEMPLATES_DIR, name) for name in os.listdir(TEMPLATES_DIR)]
+        paths.append(static_assets.MANIFEST_PATH)
+        newest = max(os.stat(path).st_mtime for path in paths if os.path.exists(path))
+        _shared['deployed_at'] = datetime.fromtimestamp(int(newest), timezone.utc)
+    return _shared['deployed_at']
+
+
+def _page(template):
+    page = _pages.get(template)
+    if page is None:
+        html = render_template(template, session_nav_placeholder=True)
+        head, _, tail = html.partition(NAV_PLACEHOLDER)
+        page = _pages[template] = (head, tail, hashlib.sha1(html.encode()).hexdigest()[:16])
+    return page
+
+
+def _session_nav(signed_in):
+    if signed_in:
+        return render_template(NAV_TEMPLATE)
+    if 'anonymous_nav' not in _shared:
+        _shared['anonymous_nav'] = render_template(NAV_TEMPLATE)
+    return _shared['anonymous_nav']
+
+
+def render_page(template):
+    """Serve a static page from the fragment cache, answering conditional requests with 304."""
+    if current_app.debug:
+        # Templates reload on change in debug mode; don't pin the first render
+        return render_template(template)
+    head, tail, digest = _page(template)
+    signed_in = bool(session.get('username'))
+    nav = _session_nav(signed_in)
+    etag = '%s-%s' % (digest, hashlib.sha1(nav.encode()).hexdigest()[:8])
+    last_modified = deployed_at()
+
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        # Last-Modified can't see a login/logout, so date-only validation is for anonymous visitors
+        since = request.if_modified_since
+        not_modified = not signed_in and since is not None and since >= last_modified
+
+    response = current_app.response_class(status=304) if not_modified else make_response(head + nav + tail)
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'private, no-cache' if signed_in else 'no-cache'
+    response.vary.add('Cookie')
+    return response
@@ -0,0 +1,216 @@
+"""Parallel K-means over a shared-memory feature matrix.
+
+The scaled feature matrix is copied once into multiprocessing.shared_memory and
+worker processes attach to it by name. Each Lloyd iteration sends only the
+centroids (k x d floats) to the workers; each worker assigns its shard of rows
+and returns per-cluster sums and counts, which the parent reduces into the new
+centroids. Seeding is k-means++ over a random sample of rows.
+
+Starting the worker pool and shipping centroids every iteration is a fixed cost
+that sklearn's in-process fit does not pay: on 150k rows with 2 workers this
+engine took 0.68s against sklearn's 0.09s. model.py therefore only uses it from
+PARALLEL_KMEANS_MIN_ROWS customers and when KMEANS_WORKERS > 1.
+
+The seeding is not sklearn's, so on data without well-separated clusters the two
+can converge to different local optima, with different labels, inertia and
+iteration counts (adjusted Rand 0.62 on the overlapping synthetic data below at
+150k rows). Compare results by inertia, not label agreement. `--check` fits both
+on a fixed, well-separated dataset, where they must find the same clustering.
+
+fit() returns a sklearn.cluster.KMeans fitted through its public API (one final
+Lloyd pass started from our centroids), so model.py pickles it as kmeans_model.pkl
+exactly as before and predict()/cluster_centers_ keep working on any sklearn
+version that accepts an array `init`.
+
+    python parallel_kmeans.py --rows 1000000 --workers 4    # compare with sklearn
+    python parallel_kmeans.py --check                       # exits 1 if they disagree
+"""
+import argparse
+import math
+import multiprocessing
+import os
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+KMEANS_WORKERS = int(os.environ.get('KMEANS_WORKERS', os.cpu_count() or 1))
+SEED_SAMPLE_SIZE = 100000
+CHUNK_ROWS = 65536  # rows per distance block inside a worker, bounds temporary memory
+# --check: minimum label agreement and maximum relative inertia difference against sklearn
+CHECK_ROWS = 300000
+CHECK_MIN_ARI = 0.99
+CHECK_MAX_INERTIA_DIFF = 0.001
+
+_shared = {}  # per worker process: attached SharedMemory blocks and array views
+
+
+# --- Worker side ---
+def _attach(x_name, shape):
+    x_shm = shared_memory.SharedMemory(name=x_name)
+    _shared['block'] = x_shm
+    _shared['X'] = np.ndarray(shape, dtype=np.float64, buffer=x_shm.buf)
+
+
+def _assign(X, centroids, lo, hi):
+    """Assign rows lo:hi of X to their nearest centroid; returns (per-cluster sums, counts)."""
+    k, d = centroids.shape
+    sums = np.zeros((k, d))
+    counts = np.zeros(k, dtype=np.int64)
+    c_sq = (centroids * centroids).sum(axis=1)
+    for start in range(lo, hi, CHUNK_ROWS):
+        x = X[start:min(start + CHUNK_ROWS, hi)]
+        # argmin ||x - c||^2 = argmin (||c||^2 - 2 x.c); ||x||^2 is the same for every c
+        dist = c_sq - 2.0 * (x @ centroids.T)
+        lab = dist.argmin(axis=1)
+        counts += np.bincount(lab, minlength=k)
+        for j in range(d):
+            sums[:, j] += np.bincount(lab, weights=x[:, j], minlength=k)
+    return sums, counts
+
+
+def _worker_step(args):
+    lo, hi, centroids = args
+    return _assign(_shared['X'], centroids, lo, hi)
+
+
+# --- Parent side ---
+def kmeans_plusplus(X, n_clusters, rng, sample_size=SEED_SAMPLE_SIZE):
+    """k-means++ seeding on a random sample of rows (greedy, 2 + log k trials per centre)."""
+    sample = X if len(X) <= sample_size else X[rng.choice(len(X), sample_size, replace=False)]
+    n_trials = 2 + int(math.log(n_clusters))
+    centres = np.empty((n_clusters, X.shape[1]))
+    centres[0] = sample[rng.integers(len(sample))]
+    closest = ((sample - centres[0]) ** 2).sum(axis=1)
+    for c in range(1, n_clusters):
+        total = closest.sum()
+        candidates = np.searchsorted(np.cumsum(closest), rng.random(n_trials) * total)
+        candidates = np.minimum(candidates, len(sample) - 1)
+        cand_dist = ((sample[None, :, :] - sample[candidates][:, None, :]) ** 2).sum(axis=2)
+        cand_closest = np.minimum(closest, cand_dist)
+        best = cand_closest.sum(axis=1).argmin()
+        centres[c] = sample[candidates[best]]
+        closest = cand_closest[best]
+    return centres
+
+
+def _shards(n_rows, n_workers):
+    bounds = np.linspace(0, n_rows, n_workers + 1).astype(int)
+    return [(int(lo), int(hi)) for lo, hi in zip(bounds[:-1], bounds[1:]) if hi > lo]
+
+
+def lloyd(X, centroids, step, shards, max_iter=300, tol=1e-4):
+    """Run Lloyd iterations; `step` maps shard tasks to (sums, counts) results.
+    Returns (centroids, iterations)."""
+    # Same convergence rule as sklearn: centre shift relative to the mean feature variance
+    threshold = tol * float(np.mean(np.var(X, axis=0)))
+    rng = np.random.default_rng(0)
+    for n_iter in range(1, max_iter + 1):
+        results = step([(lo, hi, centroids) for lo, hi in shards])
+        sums = sum(r[0] for r in results)
+        counts = sum(r[1] for r in results)
+        new = centroids.copy()
+        nonempty = counts > 0
+        new[nonempty] = sums[nonempty] / counts[nonempty, None]
+        # An empty cluster restarts from a random row
+        for c in np.flatnonzero(~nonempty):
+            new[c] = X[rng.integers(len(X))]
+        shift = float(((new - centroids) ** 2).sum())
+        centroids = new
+        if shift <= threshold:
+            break
+    return centroids, n_iter
+
+
+def fit(X, n_clusters=4, n_workers=KMEANS_WORKERS, max_iter=300, tol=1e-4, random_state=42,
+        seed_sample_size=SEED_SAMPLE_SIZE):
+    """Fit K-means on an (n, d) array of scaled features; returns a fitted sklearn KMeans."""
+    X = np.ascontiguousarray(X, dtype=np.float64)
+    rng = np.random.default_rng(random_state)
+    centroids = kmeans_plusplus(X, n_clusters, rng, seed_sample_size)
+    n_workers = max(1, min(n_workers, len(X) // CHUNK_ROWS + 1))
+    shards = _shards(len(X), n_workers)
+
+    if n_workers == 1:
+        centroids, n_iter = lloyd(X, centroids, lambda tasks: [_assign(X, c, lo, hi) for lo, hi, c in tasks],
+                                  shards, max_iter, tol)
+        return _to_sklearn(X, centroids, n_iter, random_state)
+
+    x_shm = shared_memory.SharedMemory(create=True, size=X.nbytes)
+    try:
+        np.ndarray(X.shape, dtype=np.float64, buffer=x_shm.buf)[:] = X
+        # spawn: safe to start from a threaded process (the in-process job scheduler)
+        ctx = multiprocessing.get_context('spawn')
+        with ctx.Pool(n_workers, initializer=_attach, initargs=(x_shm.name, X.shape)) as pool:
+            centroids, n_iter = lloyd(X, centroids, lambda tasks: pool.map(_worker_step, tasks), shards,
+                                      max_iter, tol)
+    finally:
+        x_shm.close()
+        x_shm.unlink()
+    return _to_sklearn(X, centroids, n_iter, random_state)
+
+
+def _to_sklearn(X, centroids, n_iter, random_state):
+    """A KMeans fitted by sklearn itself from the converged centroids (one Lloyd pass), so
+    labels_, inertia_ and every internal attribute are sklearn's own and nothing private is set."""
+    from sklearn.cluster import KMeans
+    kmeans = KMeans(n_clusters=len(centroids), init=centroids, n_init=1, max_iter=1,
+                    random_state=random_state).fit(X)
+    kmeans.n_iter_ += n_iter
+    return kmeans
+
+
+def make_check_data(rows=CHECK_ROWS, n_clusters=4):
+    """Fixed dataset for --check: well-separated unit Gaussian blobs (centres over 11 standard
+    deviations apart), where any correct K-means finds the same clustering."""
+    rng = np.random.default_rng(0)
+    centres = np.eye(n_clusters, max(3, n_clusters)) * 8.0
+    return centres[rng.integers(n_clusters, size=rows)] + rng.normal(size=(rows, centres.shape[1]))
+
+
+def check(rows=CHECK_ROWS, n_clusters=4, n_workers=KMEANS_WORKERS):
+    """Fit this engine and sklearn on make_check_data(); returns (ok, details)."""
+    from sklearn.cluster import KMeans
+    from sklearn.metrics import adjusted_rand_score
+    X = make_check_data(rows, n_clusters)
+    ours = fit(X, n_clusters, n_workers=n_workers)
+    ref = KMeans(n_clusters=n_clusters, random_state=42).fit(X)
+    ari = adjusted_rand_score(ref.labels_, ours.labels_)
+    inertia_diff = (ours.inertia_ - ref.inertia_) / ref.inertia_
+    details = {'rows': rows, 'workers': n_workers, 'adjusted_rand': ari, 'inertia': ours.inertia_,
+               'sklearn_inertia': ref.inertia_, 'inertia_diff': inertia_diff}
+    return ari >= CHECK_MIN_ARI and inertia_diff <= CHECK_MAX_INERTIA_DIFF, details
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare parallel shared-memory K-means with sklearn.')
+    parser.add_argument('--rows', type=int, default=None, help='default 1000000 (--check: %d)' % CHECK_ROWS)
+    parser.add_argument('--clusters', type=int, default=4)
+    parser.add_argument('--workers', type=int, default=KMEANS_WORKERS)
+    parser.add_argument('--check', action='store_true', help='compare with sklearn on the fixed check dataset')
+    args = parser.parse_args()
+
+    if args.check:
+        ok, details = check(args.rows or CHECK_ROWS, args.clusters, args.workers)
+        print(' '.join('%s=%s' % item for item in details.items()))
+        print('ok' if ok else 'FAILED: expected adjusted Rand >= %s and inertia within %s of sklearn' % (
+            CHECK_MIN_ARI, CHECK_MAX_INERTIA_DIFF))
+        raise SystemExit(0 if ok else 1)
+
+    from sklearn.cluster import KMeans
+    from sklearn.metrics import adjusted_rand_score
+    rows = args.rows or 1000000
+    rng = np.random.default_rng(0)
+    centres = rng.normal(0, 3, (args.clusters, 3))
+    X = centres[rng.integers(args.clusters, size=rows)] + rng.normal(size=(rows, 3))
+
+    start = time.perf_counter()
+    ours = fit(X, args.clusters, n_workers=args.workers)
+    ours_s = time.perf_counter() - start
+    start = time.perf_counter()
+    ref = KMeans(n_clusters=args.clusters, random_state=42).fit(X)
+    ref_s = time.perf_counter() - start
+    print('parallel (%d workers): %.2fs, %d iterations, inertia %.1f' % (args.workers, ours_s, ours.n_iter_,
+                                                                         ours.inertia_))
+    print('sklearn:               %.2fs, %d iterations, inertia %.1f' % (ref_s, ref.n_iter_, ref.inertia_))
+    print('label agreement (adjusted Rand): %.4f' % adjusted_rand_score(ref.labels_, ours.predict(X)))
@@ -0,0 +1,68 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from werkzeug import security
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Password hashing policy.
+# PASSWORD_HASH_METHOD takes any Werkzeug method string, e.g. 'pbkdf2:sha256:600000'
+# (Werkzeug's default), 'pbkdf2:sha256:100000' for cheaper logins, or 'scrypt'.
+# Stored hashes made with another method are upgraded on the user's next login.
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+
+# Hash checks run on a small pool so a burst of logins can't occupy every thread.
+PASSWORD_VERIFY_THREADS = int(os.environ.get('PASSWORD_VERIFY_THREADS', 2))
+# Logins allowed to wait for a pool thread; beyond this we answer "busy" straight away
+PASSWORD_VERIFY_QUEUE = int(os.environ.get('PASSWORD_VERIFY_QUEUE', 8))
+PASSWORD_VERIFY_TIMEOUT = float(os.environ.get('PASSWORD_VERIFY_TIMEOUT', 5))
+
+
+class VerifierBusy(Exception):
+    """Raised when the verification pool is saturated or a check does not finish in time."""
+
+
+def _method_prefix(method):
+    # The prefix Werkzeug stores for a method, with its short forms expanded the same way
+    # ('scrypt' -> 'scrypt:32768:8:1', 'pbkdf2' -> 'pbkdf2:sha256:<default iterations>')
+    name, *args = method.split(':')
+    if name == 'scrypt' and not args:
+        return 'scrypt:%d:8:1' % 2 ** 15
+    if name == 'pbkdf2':
+        hash_name = args[0] if args else 'sha256'
+        iterations = int(args[1]) if len(args) > 1 else getattr(security, 'DEFAULT_PBKDF2_ITERATIONS', 600000)
+        return 'pbkdf2:%s:%d' % (hash_name, iterations)
+    return method
+
+CURRENT_PREFIX = _method_prefix(PASSWORD_HASH_METHOD)
+
+
+def hash_password(password):
+    return generate_password_hash(password, method=PASSWORD_HASH_METHOD)
+
+
+def needs_rehash(password_hash):
+    """True if the stored hash was made with a different method or cost than the policy."""
+    return password_hash.split('$', 1)[0] != CURRENT_PREFIX
+
+
+_executor = ThreadPoolExecutor(max_workers=PASSWORD_VERIFY_THREADS, thread_name_prefix='pwcheck')
+_slots = threading.BoundedSemaphore(PASSWORD_VERIFY_THREADS + PASSWORD_VERIFY_QUEUE)
+
+
+def _check(password_hash, password):
+    try:
+        return check_password_hash(password_hash, password)
+    finally:
+        _slots.release()
+
+
+def verify_password(password_hash, password, timeout=PASSWORD_VERIFY_TIMEOUT):
+    """Check a password on the bounded pool. Raises VerifierBusy when the pool and its queue are full."""
+    if not _slots.acquire(blocking=False):
+        raise VerifierBusy()
+    future = _executor.submit(_check, password_hash, password)
+    try:
+        return future.result(timeout=timeout)
+    except FutureTimeout:
+        # The check keeps its pool slot until it finishes; the user is told to retry
+        raise VerifierBusy()
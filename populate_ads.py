@@ -27,11 +27,10 @@ ads_data = [
     (5, 'Workwear Edit', 'Upgrade your work wardrobe with our new arrivals.', 'static/pinkwork.jpg', None, date.today(), date.today() + timedelta(days=25), 1),
 ]
 
-for ad in ads_data:
-    cursor.execute('''
-        INSERT INTO ads (product_id, title, description, image, target_segment, start_date, end_date, is_active)
-        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-    ''', ad)
+cursor.executemany('''
+    INSERT INTO ads (product_id, title, description, image, target_segment, start_date, end_date, is_active)
+    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+''', ads_data)
 
 conn.commit()
 cursor.close()
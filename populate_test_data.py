@@ -53,27 +53,31 @@ def populate_orders():
     cursor.execute('SELECT id, price FROM products')
     products = cursor.fetchall()
     
+    # Explicit ids let the order items be batched without a lastrowid round trip per order
+    cursor.execute('SELECT COALESCE(MAX(id), 0) FROM orders')
+    order_id = cursor.fetchone()[0]
+    orders = []
+    order_items = []
+    
     for user_id in user_ids:
         # Create 1-3 orders for each user
         for _ in range(random.randint(1, 3)):
+            order_id += 1
             order_date = datetime.now() - timedelta(days=random.randint(1, 30))
             # Select 1-3 products for each order
             order_products = random.sample(products, random.randint(1, 3))
             total_amount = sum(product[1] for product in order_products)
-            
-            cursor.execute('''
-                INSERT INTO orders (user_id, total_amount, shipping_address, status, created_at)
-                VALUES (%s, %s, %s, %s, %s)
-            ''', (user_id, total_amount, '123 Main St, City, Country', 'Delivered', order_date))
-            
-            order_id = cursor.lastrowid
-            
-            # Add order items
-            for product in order_products:
-                cursor.execute('''
-                    INSERT INTO order_items (order_id, product_id, quantity, price)
-                    VALUES (%s, %s, %s, %s)
-                ''', (order_id, product[0], 1, product[1]))
+            orders.append((order_id, user_id, total_amount, '123 Main St, City, Country', 'Delivered', order_date))
+            order_items.extend((order_id, product[0], 1, product[1]) for product in order_products)
+    
+    cursor.executemany('''
+        INSERT INTO orders (id, user_id, total_amount, shipping_address, status, created_at)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    ''', orders)
+    cursor.executemany('''
+        INSERT INTO order_items (order_id, product_id, quantity, price)
+        VALUES (%s, %s, %s, %s)
+    ''', order_items)
     
     conn.commit()
     cursor.close()
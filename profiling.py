@@ -0,0 +1,237 @@
+import cProfile
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+from contextlib import nullcontext
+
+from flask import Response, request, before_render_template, template_rendered
+from werkzeug.wsgi import ClosingIterator
+
+# Opt-in request profiling.
+# With PROFILING_ENABLED=1 every request's wall time is recorded per route and split
+# into SQLite, template rendering and recommender time; histograms are served in
+# Prometheus text format at /metrics. A sample of requests runs under cProfile and
+# the profile is kept when the request is slower than PROFILE_SLOW_MS.
+# When disabled, install() leaves the app untouched and timed() is a shared no-op.
+
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '0').lower() in ('1', 'true', 'yes')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0.05))
+PROFILE_SLOW_MS = float(os.environ.get('PROFILE_SLOW_MS', 500))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_state = threading.local()
+_NULL = nullcontext()
+
+
+class Histogram:
+    __slots__ = ('counts', 'total', 'count')
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.total += value
+        self.count += 1
+
+
+_histograms = {}  # (metric, labels tuple) -> Histogram
+_hist_lock = threading.Lock()
+
+
+def _observe(metric, labels, value):
+    key = (metric, labels)
+    with _hist_lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = Histogram()
+        hist.observe(value)
+
+
+# --- Component timers ---
+class _Timer:
+    __slots__ = ('components', 'name', 'start')
+
+    def __init__(self, components, name):
+        self.components = components
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.components[self.name] = self.components.get(self.name, 0.0) + time.perf_counter() - self.start
+        return False
+
+
+def timed(component):
+    """Context manager adding elapsed time to `component` for the current request (no-op otherwise)."""
+    components = getattr(_state, 'components', None)
+    if components is None:
+        return _NULL
+    return _Timer(components, component)
+
+
+def add_time(component, seconds):
+    components = getattr(_state, 'components', None)
+    if components is not None:
+        components[component] = components.get(component, 0.0) + seconds
+
+
+class TimedCursor(sqlite3.Cursor):
+    def execute(self, *args):
+        with timed('sqlite'):
+            return super().execute(*args)
+
+    def executemany(self, *args):
+        with timed('sqlite'):
+            return super().executemany(*args)
+
+    def fetchone(self):
+        with timed('sqlite'):
+            return super().fetchone()
+
+    def fetchall(self):
+        with timed('sqlite'):
+            return super().fetchall()
+
+
+class TimedConnection(sqlite3.Connection):
+    """sqlite3 connection whose statements count towards the request's 'sqlite' time."""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, *args):
+        return self.cursor().execute(*args)
+
+    def executemany(self, *args):
+        return self.cursor().executemany(*args)
+
+    def commit(self):
+        with timed('sqlite'):
+            return super().commit()
+
+
+def connection_factory():
+    """Connection class for sqlite3.connect(): timed when profiling is on, plain otherwise."""
+    return TimedConnection if PROFILING_ENABLED else sqlite3.Connection
+
+
+# --- Middleware ---
+class ProfilingMiddleware:
+    def __init__(self, wsgi_app, sample_rate=PROFILE_SAMPLE_RATE, slow_ms=PROFILE_SLOW_MS,
+                 profile_dir=PROFILE_DIR):
+        self.wsgi_app = wsgi_app
+        self.sample_rate = sample_rate
+        self.slow_seconds = slow_ms / 1000.0
+        self.profile_dir = profile_dir
+
+    def __call__(self, environ, start_response):
+        components = {}
+        _state.components = components
+        profiler = None
+        if self.sample_rate and random.random() < self.sample_rate:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except RuntimeError:
+                # Another profiler is already active on this thread
+                profiler = None
+        start = time.perf_counter()
+
+        def finish():
+            elapsed = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+            _state.components = None
+            route = environ.get('profiling.route') or 'unmatched'
+            _observe('dressly_request_duration_seconds', (('route', route),), elapsed)
+            for name, seconds in components.items():
+                _observe('dressly_request_component_seconds', (('route', route), ('component', name)), seconds)
+            if profiler is not None and elapsed >= self.slow_seconds:
+                self._dump(profiler, route, elapsed)
+
+        try:
+            app_iter = self.wsgi_app(environ, start_response)
+        except Exception:
+            finish()
+            raise
+        return ClosingIterator(app_iter, [finish])
+
+    def _dump(self, profiler, route, elapsed):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+        path = os.path.join(self.profile_dir, '%s-%s-%dms.prof' % (time.strftime('%Y%m%d-%H%M%S'), slug,
+                                                                    elapsed * 1000))
+        profiler.dump_stats(path)
+
+
+# --- Flask hooks ---
+def _tag_route():
+    request.environ['profiling.route'] = request.url_rule.rule if request.url_rule else 'unmatched'
+
+
+def _template_started(sender, template, context, **extra):
+    if getattr(_state, 'components', None) is not None:
+        _state.template_start = time.perf_counter()
+
+
+def _template_finished(sender, template, context, **extra):
+    start = getattr(_state, 'template_start', None)
+    if start is not None:
+        add_time('template', time.perf_counter() - start)
+        _state.template_start = None
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def render_metrics():
+    """All histograms in Prometheus text exposition format (per worker process)."""
+    with _hist_lock:
+        items = sorted(_histograms.items())
+        snapshot = [(metric, labels, list(h.counts), h.total, h.count) for (metric, labels), h in items]
+    lines = []
+    seen = set()
+    for metric, labels, counts, total, count in snapshot:
+        if metric not in seen:
+            seen.add(metric)
+            lines.append('# TYPE %s histogram' % metric)
+        label_text = ','.join('%s="%s"' % (k, _escape(v)) for k, v in labels)
+        cumulative = 0
+        for bound, bucket_count in zip(BUCKETS, counts):
+            cumulative += bucket_count
+            lines.append('%s_bucket{%s,le="%s"} %d' % (metric, label_text, bound, cumulative))
+        lines.append('%s_bucket{%s,le="+Inf"} %d' % (metric, label_text, count))
+        lines.append('%s_sum{%s} %.6f' % (metric, label_text, total))
+        lines.append('%s_count{%s} %d' % (metric, label_text, count))
+    return '\n'.join(lines) + '\n'
+
+
+def metrics():
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+
+def install(app):
+    """Wrap the Flask app when PROFILING_ENABLED is set; otherwise do nothing."""
+    if not PROFILING_ENABLED:
+        return app
+    app.wsgi_app = ProfilingMiddleware(app.wsgi_app)
+    app.before_request(_tag_route)
+    before_render_template.connect(_template_started, app)
+    template_rendered.connect(_template_finished, app)
+    app.add_url_rule('/metrics', 'metrics', metrics)
+    return app
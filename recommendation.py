@@ -1,7 +1,11 @@
+import os
+
 import pandas as pd
 import numpy as np
 import joblib
 from sklearn.metrics.pairwise import cosine_similarity
+import model_registry
+import schema
 
 # Load product data (dresses)
 PRODUCTS_CSV = 'data.csv'  # Should contain all dresses with features: id, title, category, color, style, price, image, etc.
@@ -9,37 +13,58 @@ PRODUCTS_CSV = 'data.csv'  # Should contain all dresses with features: id, title
 # Load clustered customer segments if available
 CLUSTERED_CUSTOMERS_CSV = 'clustered_customers.csv'  # Should contain user_id, cluster, and possibly preferences
 
+# Columns recommend_for_user needs from PRODUCTS_CSV
+PRODUCT_COLUMNS = ('id', 'category', 'color', 'price')
+
 # Load KMeans model and scaler for customer segmentation
 KMEANS_MODEL_PATH = 'kmeans_model.pkl'
 SCALER_PATH = 'scaler.pkl'
 
 # --- Data Loading ---
+# Compact, validated dtypes (category/int32/float32); see schema.py
 def load_products():
-    return pd.read_csv(PRODUCTS_CSV)
+    return schema.read_csv(PRODUCTS_CSV, 'products')
 
 def load_clustered_customers():
+    """None until model.py has written the file; a file that fails its schema raises SchemaError."""
     try:
-        return pd.read_csv(CLUSTERED_CUSTOMERS_CSV)
-    except Exception:
+        return schema.read_csv(CLUSTERED_CUSTOMERS_CSV, 'customers')
+    except FileNotFoundError:
         return None
 
+_catalog_check = {'mtime': None, 'ok': False}
+
+def has_product_catalog(path=PRODUCTS_CSV):
+    """Whether PRODUCTS_CSV is a product catalog (PRODUCT_COLUMNS present), checked once per file change.
+    In a checkout where data.csv holds only the customer data, recommend_for_user cannot run."""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return False
+    if _catalog_check['mtime'] != mtime:
+        columns = set(pd.read_csv(path, nrows=0).columns)
+        _catalog_check.update(mtime=mtime, ok=all(c in columns for c in PRODUCT_COLUMNS))
+    return _catalog_check['ok']
+
 def load_kmeans_and_scaler():
     try:
-        kmeans = joblib.load(KMEANS_MODEL_PATH)
-        scaler = joblib.load(SCALER_PATH)
+        # Current registry version when there is one, else the top-level files
+        kmeans = joblib.load(model_registry.artifact_path(KMEANS_MODEL_PATH))
+        scaler = joblib.load(model_registry.artifact_path(SCALER_PATH))
         return kmeans, scaler
     except Exception:
         return None, None
 
 # --- Recommendation Logic ---
-def recommend_for_user(user_id=None, user_profile=None, history=None, quiz_answers=None, top_n=6):
+def recommend_for_user(user_id=None, user_profile=None, history=None, quiz_answers=None, top_n=6, segment=None):
     """
     Recommend dresses for a user based on their segment, history, and preferences.
-    - user_id: ID of the user (to look up cluster/segment)
+    - user_id: CustomerID in clustered_customers.csv (to look up cluster/segment)
     - user_profile: dict with user features (age, income, etc.)
-    - history: list of product IDs the user has viewed/purchased
+    - history: list or array of product IDs the user has viewed/purchased (e.g. UserHistory.get(user_id))
     - quiz_answers: dict with quiz answers (favorite color, style, budget)
     - top_n: number of recommendations to return
+    - segment: the user's cluster when the caller already knows it (e.g. dressly_users.segment)
     Returns: List of product dicts
     """
     products = load_products()
@@ -48,10 +73,15 @@ def recommend_for_user(user_id=None, user_profile=None, history=None, quiz_answe
 
     # 1. Segment the user (cluster)
     user_cluster = None
-    if user_id and clustered is not None:
-        row = clustered[clustered['id'] == user_id]
+    if segment is not None:
+        user_cluster = int(segment)
+    elif user_id and clustered is not None:
+        row = clustered[clustered['CustomerID'] == user_id]
         if not row.empty:
             user_cluster = int(row.iloc[0]['Cluster'])
+    elif user_profile and model_registry.current_predictor() is not None:
+        # Exported scaler+centroids: same assignment as kmeans.predict without sklearn overhead
+        user_cluster = model_registry.current_predictor().predict_profile(user_profile)
     elif user_profile and scaler is not None and kmeans is not None:
         # Predict cluster from profile
         features = np.array([[user_profile.get('Age', 30),
@@ -79,7 +109,8 @@ def recommend_for_user(user_id=None, user_profile=None, history=None, quiz_answe
         filtered = filtered[filtered['Cluster'] == user_cluster]
 
     # 4. If user has history, use content-based similarity
-    if history:
+    # (history may be a list or a UserHistory row, i.e. a NumPy array)
+    if history is not None and len(history):
         # Get features for history items
         history_items = filtered[filtered['id'].isin(history)]
         if not history_items.empty:
@@ -91,7 +122,8 @@ def recommend_for_user(user_id=None, user_profile=None, history=None, quiz_answe
                 price_norm = (df['price'] - df['price'].min()) / (df['price'].max() - df['price'].min() + 1e-6)
                 return pd.concat([color_dummies, cat_dummies, price_norm.rename('price_norm')], axis=1)
             prod_features = get_features(filtered)
-            hist_features = get_features(history_items)
+            # Take history rows from the same encoding so both matrices share columns
+            hist_features = prod_features[filtered['id'].isin(history).to_numpy()]
             sim = cosine_similarity(prod_features, hist_features)
             sim_scores = sim.mean(axis=1)
             filtered = filtered.copy()
@@ -0,0 +1,293 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import model_registry
+
+# Per-user cache of recommendation lists.
+# Entries are keyed by (user_id, model_version) and dropped as soon as the user
+# posts a tracking event or changes their quiz preferences. Each invalidation is
+# also recorded (a per-user generation in SQLite; in-process, a sequence number for
+# the most recently invalidated users); a list computed before it is not stored, so
+# a request that read the old history cannot cache a stale list for the whole TTL.
+
+CACHE_MAX_ENTRIES = int(os.environ.get('RECOMMENDATION_CACHE_SIZE', 1024))
+CACHE_TTL_SECONDS = float(os.environ.get('RECOMMENDATION_CACHE_TTL', 900))
+# Point this at a SQLite file to share cached lists between gunicorn workers. The
+# default in-process cache is per worker: an invalidation only reaches the worker
+# that handled the event, and the others can serve the user's old list for up to
+# CACHE_TTL_SECONDS. Set it whenever gunicorn runs more than one worker.
+CACHE_SHARED_DB = os.environ.get('RECOMMENDATION_CACHE_DB')
+# A hit refreshes an entry's LRU timestamp only if it is older than this, so hits
+# are (mostly) reads instead of one write transaction each
+CACHE_TOUCH_SECONDS = 60
+
+# The saved segmentation model; re-training rewrites these files
+MODEL_FILES = ('kmeans_model.pkl', 'scaler.pkl')
+
+
+def current_model_version():
+    """Version tag of the saved model: the registry's current version, else derived from
+    the artifact files' mtime and size."""
+    version = model_registry.current_version()
+    if version is not None:
+        return version
+    parts = []
+    for path in MODEL_FILES:
+        try:
+            st = os.stat(path)
+            parts.append('%d-%d' % (st.st_mtime_ns, st.st_size))
+        except OSError:
+            parts.append('none')
+    return ':'.join(parts)
+
+
+# --- Backends ---
+class LocalBackend:
+    """In-process LRU with per-entry expiry. Only visible to the current worker."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # (user_id, version) -> (expires_at, value)
+        self._by_user = {}             # user_id -> set of keys
+        # Invalidation sequence numbers: the latest per user, for the max_entries most recently
+        # invalidated users; _forgotten is the newest number dropped from that window
+        self._sequence = 0
+        self._invalidated = OrderedDict()  # user_id -> sequence number of its last invalidation
+        self._forgotten = 0
+        self._lock = threading.Lock()
+
+    def generation(self, user_id):
+        with self._lock:
+            return self._sequence
+
+    def _is_stale(self, user_id, generation):
+        # Unknown once the user may have been invalidated and forgotten since `generation`
+        return generation < self._forgotten or self._invalidated.get(user_id, 0) > generation
+
+    def get(self, key, now):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None, False
+            expires_at, value = entry
+            if expires_at <= now:
+                self._drop(key)
+                return None, True
+            self._entries.move_to_end(key)
+            return value, False
+
+    def set(self, key, value, expires_at, generation=None):
+        """Store an entry; returns the number evicted, or None if the user's generation
+        is no longer `generation`."""
+        evicted = 0
+        with self._lock:
+            if generation is not None and self._is_stale(key[0], generation):
+                return None
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self._entries[key] = (expires_at, value)
+            self._by_user.setdefault(key[0], set()).add(key)
+            while len(self._entries) > self.max_entries:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                evicted += 1
+        return evicted
+
+    def delete_user(self, user_id):
+        with self._lock:
+            self._sequence += 1
+            self._invalidated[user_id] = self._sequence
+            self._invalidated.move_to_end(user_id)
+            while len(self._invalidated) > self.max_entries:
+                self._forgotten = self._invalidated.popitem(last=False)[1]
+            keys = self._by_user.pop(user_id, ())
+            for key in keys:
+                self._entries.pop(key, None)
+            return len(keys)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._by_user.clear()
+
+    def size(self):
+        return len(self._entries)
+
+    def _drop(self, key):
+        self._entries.pop(key, None)
+        keys = self._by_user.get(key[0])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[key[0]]
+
+
+class SQLiteBackend:
+    """Cache table in a SQLite file shared by every worker on the host."""
+
+    def __init__(self, path, max_entries):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('''CREATE TABLE IF NOT EXISTS recommendation_cache (
+            user_id INTEGER NOT NULL,
+            model_version TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            expires_at REAL NOT NULL,
+            last_used REAL NOT NULL,
+            PRIMARY KEY (user_id, model_version)
+        )''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_recommendation_cache_last_used '
+                     'ON recommendation_cache (last_used)')
+        conn.execute('''CREATE TABLE IF NOT EXISTS recommendation_cache_generations (
+            user_id INTEGER PRIMARY KEY,
+            generation INTEGER NOT NULL
+        )''')
+        conn.commit()
+
+    def _connect(self):
+        """This thread's connection (opened on first use; WAL mode is set once, in __init__)."""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(self.path, timeout=5)
+        return conn
+
+    @staticmethod
+    def _generation(conn, user_id):
+        row = conn.execute('SELECT generation FROM recommendation_cache_generations WHERE user_id = ?',
+                           (user_id,)).fetchone()
+        return row[0] if row else 0
+
+    def generation(self, user_id):
+        return self._generation(self._connect(), user_id)
+
+    def get(self, key, now):
+        conn = self._connect()
+        row = conn.execute('SELECT payload, expires_at, last_used FROM recommendation_cache '
+                           'WHERE user_id = ? AND model_version = ?', key).fetchone()
+        if row is None:
+            return None, False
+        if row[1] <= now:
+            conn.execute('DELETE FROM recommendation_cache WHERE user_id = ? AND model_version = ?', key)
+            conn.commit()
+            return None, True
+        if now - row[2] > CACHE_TOUCH_SECONDS:
+            conn.execute('UPDATE recommendation_cache SET last_used = ? '
+                         'WHERE user_id = ? AND model_version = ?', (now,) + tuple(key))
+            conn.commit()
+        return json.loads(row[0]), False
+
+    def set(self, key, value, expires_at, generation=None):
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            if generation is not None and self._generation(conn, key[0]) != generation:
+                conn.rollback()
+                return None
+            conn.execute('INSERT OR REPLACE INTO recommendation_cache '
+                         '(user_id, model_version, payload, expires_at, last_used) VALUES (?, ?, ?, ?, ?)',
+                         tuple(key) + (json.dumps(value, default=str), expires_at, time.time()))
+            count = conn.execute('SELECT COUNT(*) FROM recommendation_cache').fetchone()[0]
+            evicted = max(0, count - self.max_entries)
+            if evicted:
+                conn.execute('DELETE FROM recommendation_cache WHERE rowid IN ('
+                             'SELECT rowid FROM recommendation_cache ORDER BY last_used LIMIT ?)', (evicted,))
+            conn.commit()
+            return evicted
+        except Exception:
+            conn.rollback()
+            raise
+
+    def delete_user(self, user_id):
+        conn = self._connect()
+        try:
+            conn.execute('INSERT INTO recommendation_cache_generations (user_id, generation) VALUES (?, 1) '
+                         'ON CONFLICT (user_id) DO UPDATE SET generation = generation + 1', (user_id,))
+            cur = conn.execute('DELETE FROM recommendation_cache WHERE user_id = ?', (user_id,))
+            conn.commit()
+            return cur.rowcount
+        except Exception:
+            conn.rollback()
+            raise
+
+    def clear(self):
+        conn = self._connect()
+        conn.execute('DELETE FROM recommendation_cache')
+        conn.commit()
+
+    def size(self):
+        return self._connect().execute('SELECT COUNT(*) FROM recommendation_cache').fetchone()[0]
+
+
+# --- Cache ---
+class RecommendationCache:
+    def __init__(self, backend, ttl=CACHE_TTL_SECONDS, version_func=current_model_version):
+        self.backend = backend
+        self.ttl = ttl
+        self.version_func = version_func
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'invalidations': 0,
+                       'invalidated_entries': 0, 'stale_discards': 0}
+
+    def get_or_compute(self, user_id, compute):
+        """Return the cached list for user_id, calling compute() and storing its result on a miss."""
+        key = (user_id, self.version_func())
+        value, expired = self.backend.get(key, time.time())
+        if value is not None:
+            self._count('hits')
+            return value
+        self._count('misses')
+        if expired:
+            self._count('expired')
+        generation = self.backend.generation(user_id)
+        value = compute()
+        evicted = self.backend.set(key, value, time.time() + self.ttl, generation)
+        if evicted is None:
+            # Invalidated while computing: serve this list once but don't cache it
+            self._count('stale_discards')
+        elif evicted:
+            self._count('evictions', evicted)
+        return value
+
+    def invalidate_user(self, user_id):
+        """Drop every cached list for a user (called on new events and preference updates)."""
+        if user_id is None:
+            return
+        self._count('invalidations')
+        dropped = self.backend.delete_user(user_id)
+        if dropped:
+            self._count('invalidated_entries', dropped)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = stats['hits'] / lookups if lookups else 0.0
+        stats['size'] = self.backend.size()
+        stats['max_entries'] = self.backend.max_entries
+        stats['backend'] = 'sqlite' if isinstance(self.backend, SQLiteBackend) else 'local'
+        return stats
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+
+
+def create_cache():
+    if CACHE_SHARED_DB:
+        backend = SQLiteBackend(CACHE_SHARED_DB, CACHE_MAX_ENTRIES)
+    else:
+        backend = LocalBackend(CACHE_MAX_ENTRIES)
+    return RecommendationCache(backend)
+
+
+recommendation_cache = create_cache()
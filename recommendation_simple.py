@@ -1,31 +1,254 @@
-import csv
+import heapq
+import os
 import random
+import sqlite3
+import sys
+import threading
+import time
+from array import array
 
-# Simple recommendation system without ML dependencies
-def load_products_simple():
-    """Load products from CSV without pandas"""
-    products = []
+from constants import EVENT_WEIGHTS
+
+# Recommendation engine without ML dependencies (no pandas / NumPy / scikit-learn),
+# for lightweight workers and as the last fallback in app.compute_recommendations.
+#
+# The catalog is kept in one ProductTable per process: parallel typed arrays for
+# ids and prices and interned strings for categories, refreshed only when the
+# products table changes (triggers bump catalog_version on every product insert,
+# update or delete, so edits to names, images or categories count). Trending
+# scores are weighted event counts over the last TRENDING_DAYS, recomputed at most
+# every TRENDING_TTL seconds, and the top N are taken with a heap instead of a
+# full sort. A few slots per response are filled by reservoir sampling from the
+# rest of the catalog so new products get exposure.
+
+DB_PATH = 'users.db'
+CATALOG_TTL = int(os.environ.get('SIMPLE_CATALOG_TTL', 60))
+TRENDING_TTL = int(os.environ.get('SIMPLE_TRENDING_TTL', 300))
+TRENDING_DAYS = int(os.environ.get('SIMPLE_TRENDING_DAYS', 7))
+EXPLORATION_SLOTS = int(os.environ.get('SIMPLE_EXPLORATION_SLOTS', 1))
+# Trending score multiplier for products in categories the user has interacted with
+CATEGORY_BOOST = 2.0
+
+# Served when there is no products table to read
+FALLBACK_PRODUCTS = [
+    (1, 'Summer Dress', 29.99, None, 'dress'),
+    (2, 'Evening Gown', 89.99, None, 'formal'),
+    (3, 'Casual Top', 19.99, None, 'casual'),
+]
+
+
+class ProductTable:
+    """Column-oriented catalog: row i is (ids[i], names[i], prices[i], images[i], categories[i])."""
+    __slots__ = ('ids', 'names', 'prices', 'images', 'categories', 'row_of', 'signature')
+
+    def __init__(self, rows, signature=None):
+        self.ids = array('q')
+        self.prices = array('d')
+        self.names = []
+        self.images = []
+        self.categories = []
+        for product_id, name, price, image_url, category in rows:
+            self.ids.append(int(product_id))
+            self.names.append(name)
+            self.prices.append(float(price or 0))
+            self.images.append(image_url)
+            self.categories.append(sys.intern(category or 'dress'))
+        self.row_of = {product_id: i for i, product_id in enumerate(self.ids)}
+        self.signature = signature
+
+    def __len__(self):
+        return len(self.ids)
+
+    def product(self, i):
+        return {'id': self.ids[i], 'name': self.names[i], 'price': self.prices[i],
+                'image_url': self.images[i], 'category': self.categories[i]}
+
+
+CATALOG_TRIGGER_EVENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+def create_catalog_version(cursor):
+    """catalog_version table and the products triggers that bump it (called from app.init_db)."""
+    cursor.execute('''CREATE TABLE IF NOT EXISTS catalog_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    )''')
+    cursor.execute('INSERT OR IGNORE INTO catalog_version (id, version) VALUES (1, 0)')
+    _create_catalog_triggers(cursor)
+
+
+def _create_catalog_triggers(cursor):
+    for event in CATALOG_TRIGGER_EVENTS:
+        cursor.execute('''CREATE TRIGGER IF NOT EXISTS products_version_%s AFTER %s ON products
+                          BEGIN UPDATE catalog_version SET version = version + 1 WHERE id = 1; END'''
+                       % (event.lower(), event))
+
+
+def suspend_catalog_triggers(conn):
+    """For bulk product writes: drop the per-row version triggers inside the caller's open
+    transaction. Returns whether there were any; pass that to resume_catalog_triggers()
+    before committing, so the whole load bumps the version once."""
+    names = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name IN (%s)" % ', '.join('?' * 3),
+        ['products_version_%s' % event.lower() for event in CATALOG_TRIGGER_EVENTS])]
+    for name in names:
+        conn.execute('DROP TRIGGER %s' % name)
+    return bool(names)
+
+
+def resume_catalog_triggers(conn, suspended):
+    if suspended:
+        _create_catalog_triggers(conn)
+        conn.execute('UPDATE catalog_version SET version = version + 1 WHERE id = 1')
+
+
+# --- Per-process caches ---
+_state = {'catalog': None, 'catalog_checked': 0.0, 'scores': None, 'scores_for': None, 'scores_at': 0.0}
+_lock = threading.Lock()
+_scores_lock = threading.Lock()  # one trending recomputation at a time; others wait for its result
+
+
+def _connect():
+    conn = sqlite3.connect(DB_PATH, timeout=5)
+    conn.execute('PRAGMA query_only = 1')
+    return conn
+
+
+def get_catalog():
+    """The cached ProductTable; the products table is re-checked at most every CATALOG_TTL seconds."""
+    now = time.monotonic()
+    catalog = _state['catalog']
+    if catalog is not None and now - _state['catalog_checked'] < CATALOG_TTL:
+        return catalog
+    with _lock:
+        if _state['catalog'] is not None and now - _state['catalog_checked'] < CATALOG_TTL:
+            return _state['catalog']
+        try:
+            conn = _connect()
+            try:
+                signature = tuple(conn.execute('SELECT COUNT(*), MAX(id), TOTAL(price) FROM products').fetchone())
+                try:
+                    signature += tuple(conn.execute('SELECT version FROM catalog_version').fetchone() or ())
+                except sqlite3.OperationalError:
+                    pass  # database not migrated by app.init_db yet: the aggregates alone
+                if catalog is None or catalog.signature != signature:
+                    rows = conn.execute('SELECT id, name, price, image_url, category FROM products ORDER BY id')
+                    catalog = ProductTable(rows, signature)
+            finally:
+                conn.close()
+        except sqlite3.Error:
+            if catalog is None:
+                catalog = ProductTable(FALLBACK_PRODUCTS)
+        _state['catalog'] = catalog
+        _state['catalog_checked'] = now
+        return catalog
+
+
+def trending_scores(catalog):
+    """Weighted recent event count per catalog row (an array aligned with catalog.ids)."""
+    scores = _fresh_scores(catalog, time.monotonic())
+    if scores is not None:
+        return scores
+    with _scores_lock:
+        now = time.monotonic()
+        scores = _fresh_scores(catalog, now)
+        if scores is None:
+            scores = _compute_scores(catalog)
+            _state['scores'], _state['scores_for'], _state['scores_at'] = scores, catalog, now
+        return scores
+
+
+def _fresh_scores(catalog, now):
+    # Scores are row-aligned with the catalog they were computed for
+    if _state['scores_for'] is catalog and now - _state['scores_at'] < TRENDING_TTL:
+        return _state['scores']
+    return None
+
+
+def _compute_scores(catalog):
+    scores = array('d', bytes(8 * len(catalog)))
+    try:
+        conn = _connect()
+        try:
+            rows = conn.execute('''SELECT product_id, event_type, COUNT(*) FROM user_events
+                                   WHERE product_id IS NOT NULL AND created_at >= datetime('now', ?)
+                                   GROUP BY product_id, event_type''', ('-%d days' % TRENDING_DAYS,))
+            for product_id, event_type, count in rows:
+                i = catalog.row_of.get(product_id)
+                if i is not None:
+                    scores[i] += count * EVENT_WEIGHTS.get(event_type, 0)
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        pass
+    return scores
+
+
+def user_history(user_id):
     try:
-        with open('data.csv', 'r') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                products.append(row)
-    except FileNotFoundError:
-        # Return dummy data if CSV not found
-        products = [
-            {'id': '1', 'name': 'Summer Dress', 'category': 'dress', 'price': '29.99'},
-            {'id': '2', 'name': 'Evening Gown', 'category': 'formal', 'price': '89.99'},
-            {'id': '3', 'name': 'Casual Top', 'category': 'casual', 'price': '19.99'},
-        ]
-    return products
-
-def get_recommendations_simple(user_id=None, limit=6):
-    """Simple recommendation without ML"""
-    products = load_products_simple()
-    # Return random products for now
-    return random.sample(products, min(limit, len(products)))
+        conn = _connect()
+        try:
+            rows = conn.execute('''SELECT DISTINCT product_id FROM user_events
+                                   WHERE user_id = ? AND product_id IS NOT NULL''', (user_id,))
+            return [row[0] for row in rows]
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return []
+
+
+def reservoir_sample(iterable, k, rng=random):
+    """k items chosen uniformly from an iterable of unknown length in one pass (Algorithm R)."""
+    sample = []
+    for n, item in enumerate(iterable):
+        if n < k:
+            sample.append(item)
+        else:
+            j = rng.randrange(n + 1)
+            if j < k:
+                sample[j] = item
+    return sample
+
+
+def _top_rows(catalog, limit, exclude=(), boost=None):
+    scores = trending_scores(catalog)
+    if boost:
+        def key(i):
+            return scores[i] * (CATEGORY_BOOST if catalog.categories[i] in boost else 1.0)
+    else:
+        key = scores.__getitem__
+    # Unscored products are left to exploration
+    return heapq.nlargest(limit, (i for i in range(len(catalog)) if scores[i] > 0 and i not in exclude), key=key)
+
+
+def load_products_simple():
+    """All products as dicts (from the cached catalog)."""
+    catalog = get_catalog()
+    return [catalog.product(i) for i in range(len(catalog))]
+
+
+def get_recommendations_simple(user_id=None, limit=6, history=None):
+    """Trending products, favouring the user's categories and skipping what they have seen,
+    plus EXPLORATION_SLOTS random picks from the rest of the catalog."""
+    catalog = get_catalog()
+    if history is None and user_id is not None:
+        history = user_history(user_id)
+    seen = {catalog.row_of[p] for p in history or () if p in catalog.row_of}
+    boost = {catalog.categories[i] for i in seen}
+    explore = min(EXPLORATION_SLOTS, limit)
+    rows = _top_rows(catalog, limit - explore, seen, boost)
+    chosen = seen.union(rows)
+    rows += reservoir_sample((i for i in range(len(catalog)) if i not in chosen), limit - len(rows))
+    if len(rows) < limit:
+        # Small catalog: fall back to products the user has already seen
+        rows += [i for i in seen if i not in rows][:limit - len(rows)]
+    return [catalog.product(i) for i in rows]
+
 
 def get_trending_products_simple(limit=6):
-    """Get trending products without ML"""
-    products = load_products_simple()
-    return products[:limit]
\ No newline at end of file
+    """Top products by weighted recent events, padded with a random sample if there are too few."""
+    catalog = get_catalog()
+    rows = _top_rows(catalog, limit)
+    chosen = set(rows)
+    rows += reservoir_sample((i for i in range(len(catalog)) if i not in chosen), limit - len(rows))
+    return [catalog.product(i) for i in rows]
@@ -0,0 +1,146 @@
+"""Compact dtypes for the customer, product, user and event frames.
+
+pandas' defaults store string columns as Python objects, integers as int64 and
+floats as float64. The loaders in analytics.py and recommendation.py read through
+read_csv() here instead, which converts each known column of the dataset:
+
+    low-cardinality strings (Gender, event_type, color, category, ...)  category
+    ids                                                                  int32
+    small bounded integers (Age, Spending Score, Cluster, rating)        int8 / int16
+    prices, durations, scores                                            float32
+
+An integer column with missing values gets the nullable pandas type (Int32, Int8),
+which groupby/isin/dropna/to_numpy handle like the NumPy one. A missing required
+column, a non-numeric value or a value that does not fit its type raises
+SchemaError when the file is loaded, instead of turning into a wrong result later.
+Columns a schema does not know keep pandas' default dtype.
+
+    python schema.py            # memory per frame with default vs compact dtypes
+"""
+import numpy as np
+import pandas as pd
+
+CUSTOMERS = {
+    'CustomerID': 'int32',
+    'Gender': 'category',
+    'Age': 'int8',
+    'Annual Income (k$)': 'int16',
+    'Spending Score (1-100)': 'int8',
+    'Cluster': 'int8',
+}
+PRODUCTS = {
+    'id': 'int32',
+    'category': 'category',
+    'color': 'category',
+    'style': 'category',
+    'price': 'float32',
+    'rating': 'float32',
+    'popularity': 'float32',
+    'Cluster': 'int8',
+}
+USERS = {
+    'id': 'int32',
+    'role': 'category',
+    'cluster': 'int8',
+}
+EVENTS = {
+    'user_id': 'int32',
+    'product_id': 'int32',
+    'event_type': 'category',
+    'timestamp': 'datetime64[ns]',
+    'duration': 'float32',
+    'rating': 'int8',
+}
+
+# dataset -> (column dtypes, required columns)
+DATASETS = {
+    'customers': (CUSTOMERS, ('CustomerID',)),
+    'products': (PRODUCTS, ()),
+    'users': (USERS, ('id',)),
+    'events': (EVENTS, ('user_id', 'product_id', 'event_type')),
+}
+
+_loaded = {}  # dataset -> memory_usage() of the most recently loaded frame
+
+
+class SchemaError(ValueError):
+    pass
+
+
+def _cast(series, dtype, column):
+    if dtype == 'category':
+        return series.astype('category')
+    if dtype.startswith('datetime'):
+        try:
+            return pd.to_datetime(series).astype(dtype)
+        except (ValueError, TypeError) as e:
+            raise SchemaError('%s: %s' % (column, e))
+    values = pd.to_numeric(series, errors='coerce')
+    bad = values.isna() & series.notna()
+    if bad.any():
+        raise SchemaError('%s: non-numeric value %r' % (column, series[bad].iloc[0]))
+    if dtype.startswith('float'):
+        return values.astype(dtype)
+    present = values.dropna()
+    info = np.iinfo(dtype)
+    if len(present):
+        if present.min() < info.min or present.max() > info.max:
+            raise SchemaError('%s: values outside the %s range [%d, %d]' % (column, dtype, info.min, info.max))
+        if (present != present.round()).any():
+            raise SchemaError('%s: non-integer values for %s' % (column, dtype))
+    if len(present) < len(values):
+        return values.astype(dtype.capitalize())  # nullable Int8/Int16/Int32
+    return values.astype(dtype)
+
+
+def compact(df, dataset):
+    """Validate a frame against a dataset schema and return it with compact dtypes."""
+    columns, required = DATASETS[dataset]
+    missing = [c for c in required if c not in df.columns]
+    if missing:
+        raise SchemaError('%s: missing required column(s) %s' % (dataset, ', '.join(missing)))
+    df = df.copy()
+    for column, dtype in columns.items():
+        if column in df.columns:
+            df[column] = _cast(df[column], dtype, '%s.%s' % (dataset, column))
+    return df
+
+
+def empty(dataset, columns):
+    """A typed empty frame (for loaders whose source file does not exist yet)."""
+    return compact(pd.DataFrame(columns=columns), dataset)
+
+
+def read_csv(path, dataset):
+    df = compact(pd.read_csv(path), dataset)
+    _loaded[dataset] = memory_usage(df)
+    return df
+
+
+# --- Memory reporting ---
+def memory_usage(df):
+    """Rows and bytes per column (deep, so object strings are counted)."""
+    per_column = df.memory_usage(deep=True, index=False)
+    return {'rows': len(df), 'bytes': int(per_column.sum()),
+            'columns': {column: int(n) for column, n in per_column.items()}}
+
+
+def memory_report():
+    """memory_usage() of the last frame loaded for each dataset in this process."""
+    return dict(_loaded)
+
+
+if __name__ == '__main__':
+    files = {'customers': 'clustered_customers.csv', 'products': 'data.csv', 'users': 'users.csv',
+             'events': 'user_events.csv'}
+    for dataset, path in files.items():
+        try:
+            raw = pd.read_csv(path)
+        except OSError:
+            continue
+        before = memory_usage(raw)['bytes']
+        after = memory_usage(compact(raw, dataset))
+        print('%-10s %-24s %9d rows %12d -> %10d bytes (x%.1f)' % (
+            dataset, path, after['rows'], before, after['bytes'], before / max(after['bytes'], 1)))
+        for column, n in after['columns'].items():
+            print('    %-28s %10d' % (column, n))
@@ -0,0 +1,160 @@
+import json
+import math
+import os
+import sys
+
+# Lightweight cluster assignment for the saved segmentation model.
+# The StandardScaler means/scales and the KMeans centroids are exported once to a
+# plain JSON file, so serving code can assign a segment without importing
+# scikit-learn (and, for single rows, without NumPy either).
+
+KMEANS_MODEL_PATH = 'kmeans_model.pkl'
+SCALER_PATH = 'scaler.pkl'
+PREDICTOR_PATH = 'segment_predictor.json'
+
+FEATURES = ['Age', 'Annual Income (k$)', 'Spending Score (1-100)']
+# Used for profile fields a user did not fill in (same defaults as recommendation.py)
+FEATURE_DEFAULTS = {'Age': 30, 'Annual Income (k$)': 50, 'Spending Score (1-100)': 50}
+# Rows compared by the parity check run at retrain time (the single-row path is pure Python)
+PARITY_SAMPLE_ROWS = 50000
+
+
+class SegmentPredictor:
+    def __init__(self, mean, scale, centroids, features=FEATURES):
+        self.features = list(features)
+        self.mean = [float(v) for v in mean]
+        self.scale = [float(v) for v in scale]
+        self.centroids = [[float(v) for v in row] for row in centroids]
+        # Centroids mapped back to raw feature units, so one row needs no scaling at all:
+        # distance in scaled space = sum(((x - c_raw) / scale) ** 2)
+        self._raw_centroids = [[c * s + m for c, s, m in zip(row, self.scale, self.mean)]
+                               for row in self.centroids]
+        self._inv_scale_sq = [1.0 / (s * s) for s in self.scale]
+
+    @property
+    def n_clusters(self):
+        return len(self.centroids)
+
+    def predict_one(self, values):
+        """Cluster for one row of raw feature values (list in FEATURES order). Pure Python.
+        Raises ValueError for NaN or infinite values, which would otherwise all land in cluster 0."""
+        if not all(math.isfinite(x) for x in values):
+            raise ValueError('non-finite feature value in %r' % (list(values),))
+        best, best_dist = 0, None
+        for cluster, centre in enumerate(self._raw_centroids):
+            dist = 0.0
+            for x, c, w in zip(values, centre, self._inv_scale_sq):
+                d = x - c
+                dist += d * d * w
+            if best_dist is None or dist < best_dist:
+                best, best_dist = cluster, dist
+        return best
+
+    def predict_profile(self, profile):
+        """Cluster for a dict of user features; missing or blank fields use FEATURE_DEFAULTS."""
+        values = []
+        for name in self.features:
+            value = profile.get(name)
+            values.append(float(value) if value not in (None, '') else float(FEATURE_DEFAULTS[name]))
+        return self.predict_one(values)
+
+    def predict(self, X):
+        """Vectorized clusters for an (n, n_features) array of raw values."""
+        import numpy as np
+        X = np.asarray(X, dtype=np.float64)
+        finite = np.isfinite(X).all(axis=1)
+        if not finite.all():
+            raise ValueError('non-finite feature values in rows %s' % np.flatnonzero(~finite)[:10].tolist())
+        scaled = (X - np.asarray(self.mean)) / np.asarray(self.scale)
+        centroids = np.asarray(self.centroids)
+        # ||x - c||^2 = ||x||^2 - 2 x.c + ||c||^2 ; ||x||^2 is constant per row
+        dist = (centroids * centroids).sum(axis=1) - 2.0 * scaled @ centroids.T
+        return dist.argmin(axis=1)
+
+    def to_dict(self):
+        return {'features': self.features, 'mean': self.mean, 'scale': self.scale,
+                'centroids': self.centroids}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['mean'], data['scale'], data['centroids'], data.get('features', FEATURES))
+
+    @classmethod
+    def from_sklearn(cls, scaler, kmeans):
+        features = getattr(scaler, 'feature_names_in_', FEATURES)
+        return cls(scaler.mean_, scaler.scale_, kmeans.cluster_centers_, [str(f) for f in features])
+
+
+def export_predictor(kmeans_path=KMEANS_MODEL_PATH, scaler_path=SCALER_PATH, out_path=PREDICTOR_PATH):
+    """Write the plain-float predictor file from the saved scikit-learn artifacts."""
+    import joblib
+    predictor = SegmentPredictor.from_sklearn(joblib.load(scaler_path), joblib.load(kmeans_path))
+    tmp_path = out_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(predictor.to_dict(), f, indent=2)
+    os.replace(tmp_path, out_path)
+    return predictor
+
+
+_cached = {'mtime': None, 'predictor': None}
+
+def load_predictor(path=PREDICTOR_PATH):
+    """Cached predictor, reloaded when the file changes. Returns None if it has not been exported."""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    if _cached['mtime'] != mtime:
+        with open(path) as f:
+            _cached['predictor'] = SegmentPredictor.from_dict(json.load(f))
+        _cached['mtime'] = mtime
+    return _cached['predictor']
+
+
+class ParityError(Exception):
+    pass
+
+
+def parity(predictor, scaler, kmeans, X):
+    """Compare the predictor with scaler.transform + kmeans.predict on a feature DataFrame.
+    Returns the row count and mismatches for both the vectorized and single-row paths."""
+    X = X[predictor.features]
+    X = X.fillna(X.mean())
+    expected = kmeans.predict(scaler.transform(X))
+    vectorized = predictor.predict(X.to_numpy())
+    single = [predictor.predict_one(row) for row in X.to_numpy().tolist()]
+    return {
+        'rows': len(X),
+        'vectorized_mismatches': int((vectorized != expected).sum()),
+        'single_row_mismatches': int(sum(a != b for a, b in zip(single, expected))),
+    }
+
+
+def check_parity(predictor, scaler, kmeans, X):
+    """parity(), raising ParityError on any mismatch. model.py runs this on every retrain
+    before the new version is published."""
+    if len(X) > PARITY_SAMPLE_ROWS:
+        X = X.sample(PARITY_SAMPLE_ROWS, random_state=0)
+    result = parity(predictor, scaler, kmeans, X)
+    if result['vectorized_mismatches'] or result['single_row_mismatches']:
+        raise ParityError('exported predictor disagrees with scikit-learn: %s' % result)
+    return result
+
+
+def verify_parity(data_csv='data.csv', kmeans_path=KMEANS_MODEL_PATH, scaler_path=SCALER_PATH,
+                  predictor_path=PREDICTOR_PATH):
+    """parity() for the saved artifacts on data_csv (python segment_predictor.py --check)."""
+    import joblib
+    import pandas as pd
+    with open(predictor_path) as f:
+        predictor = SegmentPredictor.from_dict(json.load(f))
+    return parity(predictor, joblib.load(scaler_path), joblib.load(kmeans_path), pd.read_csv(data_csv))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--check':
+        result = verify_parity()
+        print(result)
+        sys.exit(1 if result['vectorized_mismatches'] or result['single_row_mismatches'] else 0)
+    predictor = export_predictor()
+    print('Exported', PREDICTOR_PATH, 'with', predictor.n_clusters, 'clusters')
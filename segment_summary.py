@@ -0,0 +1,170 @@
+import hashlib
+import json
+import os
+import sys
+from array import array
+
+# Per-segment profile summaries, computed once at training time by model.py.
+# segment_summary.json holds, for each cluster, the customer count, feature means
+# and quantiles, gender split and centroid in original units: everything the
+# admin dashboard shows about a segment, in one small file.
+# Drill-down uses segment_index.<digest>.bin, the CustomerIDs grouped by cluster
+# (uint32, sorted within each cluster); the summary records each cluster's offset,
+# so a page of a cluster's customers is one seek + read rather than a table scan.
+# Both files are build output (not committed): model.py writes them on retrain, and
+# ensure_summary() rebuilds them from the saved model at deploy or app startup.
+
+SUMMARY_PATH = 'segment_summary.json'
+INDEX_PREFIX = 'segment_index'
+QUANTILES = (0.0, 0.25, 0.5, 0.75, 1.0)
+ID_TYPECODE = 'I'  # uint32; stored little-endian
+
+
+def _round(value, digits=3):
+    return round(float(value), digits)
+
+
+def build_summary(data, features, scaler, kmeans, cluster_column='Cluster'):
+    """Summary dict and per-cluster CustomerID lists for a clustered DataFrame."""
+    centroids = scaler.inverse_transform(kmeans.cluster_centers_)
+    total = len(data)
+    clusters = []
+    ids_by_cluster = []
+    offset = 0
+    for cluster in range(kmeans.n_clusters):
+        members = data[data[cluster_column] == cluster]
+        ids = sorted(int(i) for i in members['CustomerID']) if 'CustomerID' in members else []
+        quantiles = members[features].quantile(list(QUANTILES)) if len(members) else None
+        gender = members['Gender'].value_counts() if 'Gender' in members else {}
+        clusters.append({
+            'cluster': cluster,
+            'count': len(members),
+            'share': _round(len(members) / total, 4) if total else 0.0,
+            'means': {f: _round(members[f].mean()) if len(members) else None for f in features},
+            'quantiles': {f: {'p%d' % (q * 100): _round(quantiles.loc[q, f]) for q in QUANTILES}
+                          if quantiles is not None else {} for f in features},
+            'gender': {str(k): int(v) for k, v in dict(gender).items()},
+            'centroid': {f: _round(v) for f, v in zip(features, centroids[cluster])},
+            'index_offset': offset,
+            'index_count': len(ids),
+        })
+        ids_by_cluster.append(ids)
+        offset += len(ids)
+    summary = {'features': list(features), 'n_customers': total, 'n_clusters': kmeans.n_clusters,
+               'clusters': clusters}
+    return summary, ids_by_cluster
+
+
+def write_summary(summary, ids_by_cluster, summary_path=SUMMARY_PATH):
+    """Write the CustomerID index under a content-addressed name, then swap in the summary that points at it."""
+    ids = array(ID_TYPECODE, (i for group in ids_by_cluster for i in group))
+    if sys.byteorder == 'big':
+        ids.byteswap()
+    payload = ids.tobytes()
+    directory = os.path.dirname(os.path.abspath(summary_path))
+    index_name = '%s.%s.bin' % (INDEX_PREFIX, hashlib.sha1(payload).hexdigest()[:12])
+    index_path = os.path.join(directory, index_name)
+    tmp_path = '%s.%d.tmp' % (index_path, os.getpid())
+    with open(tmp_path, 'wb') as f:
+        f.write(payload)
+    os.replace(tmp_path, index_path)
+
+    previous = _index_file(summary_path)
+    summary = dict(summary, index_file=index_name)
+    tmp_path = '%s.%d.tmp' % (summary_path, os.getpid())
+    with open(tmp_path, 'w') as f:
+        json.dump(summary, f, indent=2)
+    os.replace(tmp_path, summary_path)
+
+    # The index the previous summary pointed at stays until the next publish, for requests
+    # that loaded that summary just before the swap; anything older is removed
+    for name in os.listdir(directory):
+        if (name.startswith(INDEX_PREFIX + '.') and name.endswith('.bin')
+                and name not in (index_name, previous)):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+    return summary
+
+
+def _index_file(summary_path):
+    try:
+        with open(summary_path) as f:
+            return json.load(f).get('index_file')
+    except (OSError, ValueError):
+        return None
+
+
+_cached = {'mtime': None, 'summary': None}
+
+def load_summary(path=SUMMARY_PATH):
+    """Cached summary, reloaded when the file changes. Returns None until model.py has written one."""
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    if _cached['mtime'] != mtime:
+        with open(path) as f:
+            _cached['summary'] = json.load(f)
+        _cached['mtime'] = mtime
+    return _cached['summary']
+
+
+def cluster_customer_ids(cluster, offset=0, limit=100, path=SUMMARY_PATH, _retry=True):
+    """(CustomerIDs, total) for one page of a cluster, read from the index file; None if unknown."""
+    summary = load_summary(path)
+    if summary is None or not 0 <= cluster < len(summary['clusters']):
+        return None
+    entry = summary['clusters'][cluster]
+    start = entry['index_offset'] + max(offset, 0)
+    count = max(min(limit, entry['index_count'] - max(offset, 0)), 0)
+    ids = array(ID_TYPECODE)
+    if count:
+        index_path = os.path.join(os.path.dirname(os.path.abspath(path)), summary['index_file'])
+        try:
+            with open(index_path, 'rb') as f:
+                f.seek(start * ids.itemsize)
+                ids.frombytes(f.read(count * ids.itemsize))
+        except FileNotFoundError:
+            if not _retry:
+                raise
+            # Cached summary outlived two publishes: re-read the current one
+            _cached['mtime'] = None
+            return cluster_customer_ids(cluster, offset, limit, path, _retry=False)
+        if sys.byteorder == 'big':
+            ids.byteswap()
+    return ids.tolist(), entry['index_count']
+
+
+def export_summary(data_csv='clustered_customers.csv', kmeans_path='kmeans_model.pkl', scaler_path='scaler.pkl'):
+    """Rebuild the summary from the saved model and clustered CSV (what model.py does after training)."""
+    import joblib
+    import pandas as pd
+    kmeans, scaler = joblib.load(kmeans_path), joblib.load(scaler_path)
+    features = [str(f) for f in getattr(scaler, 'feature_names_in_', ['Age', 'Annual Income (k$)',
+                                                                       'Spending Score (1-100)'])]
+    summary, ids = build_summary(pd.read_csv(data_csv), features, scaler, kmeans)
+    return write_summary(summary, ids)
+
+
+def ensure_summary(path=SUMMARY_PATH):
+    """Build the summary and index from the saved model if either is missing (deploy / app startup).
+    Returns the summary, or None where it can't be built (e.g. a worker without pandas/scikit-learn)."""
+    try:
+        summary = load_summary(path)
+    except ValueError:
+        summary = None
+    if summary is not None and os.path.exists(os.path.join(os.path.dirname(os.path.abspath(path)),
+                                                            summary.get('index_file', ''))):
+        return summary
+    try:
+        return export_summary()
+    except (ImportError, OSError, ValueError) as e:
+        print('segment summary: not built: %s' % e, file=sys.stderr)
+        return None
+
+
+if __name__ == '__main__':
+    summary = export_summary()
+    print('Wrote', SUMMARY_PATH, 'for', summary['n_customers'], 'customers in', summary['n_clusters'], 'clusters')
@@ -0,0 +1,173 @@
+"""Static asset pipeline.
+
+`python static_assets.py` builds static/dist/: every file under static/ is copied
+under a content-hashed name, text assets get .gz (and .br when the brotli module
+is installed) siblings, and images get resized JPEG and WebP variants (needs
+Pillow). static/dist/manifest.json maps original names to the built files.
+
+At runtime app.py serves hashed files with a one-year immutable Cache-Control,
+picks a precompressed sibling the client accepts, and templates use asset_url()
+and asset_srcset() to reference them. Without a manifest everything falls back
+to the plain /static/<name> URLs.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+import sys
+
+from flask import request, send_from_directory, url_for
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_PATH = os.path.join(DIST_DIR, 'manifest.json')
+
+# Product cards render images 170px wide; these cover 1x-3x screens
+IMAGE_WIDTHS = (180, 360, 540)
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+COMPRESSIBLE_EXTENSIONS = ('.js', '.css', '.svg', '.html', '.json', '.txt')
+IMMUTABLE_MAX_AGE = 31536000
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# --- Build ---
+def _hashed_name(rel_path, digest, suffix=''):
+    stem, ext = os.path.splitext(rel_path)
+    return '%s.%s%s%s' % (stem, digest[:10], suffix, ext)
+
+
+def _write(out_rel, data):
+    path = os.path.join(DIST_DIR, out_rel)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return out_rel.replace(os.sep, '/')
+
+
+def _precompress(out_rel, data):
+    _write(out_rel + '.gz', gzip.compress(data, 9))
+    if brotli is not None:
+        _write(out_rel + '.br', brotli.compress(data, quality=11))
+
+
+def _image_variants(src_path, rel_path, digest):
+    try:
+        from PIL import Image
+    except ImportError:
+        return {}
+    variants = {'jpeg': [], 'webp': []}
+    stem = os.path.splitext(rel_path)[0]
+    with Image.open(src_path) as img:
+        img = img.convert('RGB')
+        for width in IMAGE_WIDTHS:
+            if width >= img.width:
+                width = img.width
+            height = max(1, round(img.height * width / img.width))
+            resized = img.resize((width, height), Image.LANCZOS)
+            for fmt, ext, options in (('jpeg', '.jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+                                      ('webp', '.webp', {'quality': 80, 'method': 6})):
+                out_rel = '%s.%s.%dw%s' % (stem, digest[:10], width, ext)
+                path = os.path.join(DIST_DIR, out_rel)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                resized.save(path, fmt.upper(), **options)
+                variants[fmt].append([width, out_rel.replace(os.sep, '/')])
+            if width == img.width:
+                break
+    return variants
+
+
+def build():
+    """Rebuild static/dist and its manifest from the files under static/."""
+    if os.path.isdir(DIST_DIR):
+        shutil.rmtree(DIST_DIR)
+    os.makedirs(DIST_DIR)
+    manifest = {}
+    for dirpath, dirnames, filenames in os.walk(STATIC_DIR):
+        if os.path.abspath(dirpath).startswith(os.path.abspath(DIST_DIR)):
+            continue
+        for filename in sorted(filenames):
+            src_path = os.path.join(dirpath, filename)
+            rel_path = os.path.relpath(src_path, STATIC_DIR)
+            with open(src_path, 'rb') as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()
+            out_rel = _write(_hashed_name(rel_path, digest), data)
+            entry = {'file': out_rel, 'bytes': len(data)}
+            ext = os.path.splitext(filename)[1].lower()
+            if ext in COMPRESSIBLE_EXTENSIONS:
+                _precompress(out_rel, data)
+            if ext in IMAGE_EXTENSIONS:
+                variants = _image_variants(src_path, rel_path, digest)
+                if variants:
+                    entry['variants'] = variants
+            manifest[rel_path.replace(os.sep, '/')] = entry
+    with open(MANIFEST_PATH, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+# --- Runtime ---
+_manifest = {'mtime': None, 'entries': {}}
+
+
+def load_manifest():
+    try:
+        mtime = os.stat(MANIFEST_PATH).st_mtime_ns
+    except OSError:
+        return {}
+    if _manifest['mtime'] != mtime:
+        with open(MANIFEST_PATH) as f:
+            _manifest['entries'] = json.load(f)
+        _manifest['mtime'] = mtime
+    return _manifest['entries']
+
+
+def asset_url(filename):
+    """URL of the fingerprinted build of a static file, or its plain /static URL."""
+    entry = load_manifest().get(filename)
+    return url_for('static', filename='dist/' + entry['file'] if entry else filename)
+
+
+def asset_srcset(filename, fmt='jpeg'):
+    """srcset attribute value listing the resized variants of an image ('' if none were built)."""
+    entry = load_manifest().get(filename)
+    if not entry or fmt not in entry.get('variants', {}):
+        return ''
+    return ', '.join('%s %dw' % (url_for('static', filename='dist/' + path), width)
+                     for width, path in entry['variants'][fmt])
+
+
+def serve_asset(filename):
+    """Send a static file; fingerprinted builds are cached for a year and served precompressed."""
+    if not filename.startswith('dist/'):
+        return send_from_directory(STATIC_DIR, filename)
+    accepted = request.headers.get('Accept-Encoding', '')
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if encoding in accepted and os.path.isfile(os.path.join(STATIC_DIR, filename + suffix)):
+            response = send_from_directory(STATIC_DIR, filename + suffix, max_age=IMMUTABLE_MAX_AGE,
+                                           mimetype=_guess_type(filename))
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(STATIC_DIR, filename, max_age=IMMUTABLE_MAX_AGE)
+    response.headers['Cache-Control'] = 'public, max-age=%d, immutable' % IMMUTABLE_MAX_AGE
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+
+def _guess_type(filename):
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+if __name__ == '__main__':
+    manifest = build()
+    original = sum(entry['bytes'] for entry in manifest.values())
+    print('Built %d assets into %s (%.1f MB source)' % (len(manifest), DIST_DIR, original / 1e6))
+    if brotli is None:
+        print('brotli not installed: only .gz precompressed files were written', file=sys.stderr)
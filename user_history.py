@@ -0,0 +1,108 @@
+import numpy as np
+
+# Compact per-user interaction history in CSR layout.
+# All product ids live in one `items` array, grouped by user and in event order
+# within each user; `indptr[r]:indptr[r + 1]` is row r's slice and `user_ids[r]`
+# its user. A million interactions take ~4 MB of int32 instead of a million Python
+# ints spread over per-user lists, and a user's history is a zero-copy array view
+# that can be passed straight to recommendation.recommend_for_user(history=...).
+
+
+class UserHistory:
+    __slots__ = ('user_ids', 'indptr', 'items', '_row_of')
+
+    def __init__(self, user_ids, indptr, items):
+        self.user_ids = np.asarray(user_ids, dtype=np.int64)
+        self.indptr = np.asarray(indptr, dtype=np.int64)
+        self.items = np.asarray(items)
+        self._row_of = None
+        if len(self.user_ids) and self.user_ids[0] >= 0 and self.user_ids[-1] < 4 * len(self.user_ids) + 1024:
+            # Dense ids: direct user id -> row table for O(1) lookups
+            self._row_of = np.full(int(self.user_ids[-1]) + 1, -1, dtype=np.int64)
+            self._row_of[self.user_ids] = np.arange(len(self.user_ids))
+
+    @classmethod
+    def from_arrays(cls, user_ids, product_ids):
+        """Build from parallel arrays of events, which must already be in time order."""
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        product_ids = np.asarray(product_ids)
+        order = np.argsort(user_ids, kind='stable')  # stable: keeps time order within a user
+        users, counts = np.unique(user_ids[order], return_counts=True)
+        indptr = np.zeros(len(users) + 1, dtype=np.int64)
+        np.cumsum(counts, out=indptr[1:])
+        items = product_ids[order]
+        if len(items) and items.max() <= np.iinfo(np.int32).max and items.min() >= np.iinfo(np.int32).min:
+            items = items.astype(np.int32)
+        return cls(users, indptr, items)
+
+    @classmethod
+    def from_events(cls, events, time_column='timestamp'):
+        """Build from an events DataFrame with user_id and product_id columns."""
+        events = events.dropna(subset=['user_id', 'product_id'])
+        if time_column in events.columns:
+            events = events.sort_values(time_column, kind='stable')
+        return cls.from_arrays(events['user_id'].to_numpy(dtype=np.int64),
+                               events['product_id'].to_numpy(dtype=np.int64))
+
+    def __len__(self):
+        return len(self.user_ids)
+
+    @property
+    def nbytes(self):
+        return self.user_ids.nbytes + self.indptr.nbytes + self.items.nbytes
+
+    def row(self, user_id):
+        """Row index of a user, or -1 if they have no history."""
+        user_id = int(user_id)
+        if self._row_of is not None:
+            return int(self._row_of[user_id]) if 0 <= user_id < len(self._row_of) else -1
+        r = int(np.searchsorted(self.user_ids, user_id))
+        return r if r < len(self.user_ids) and self.user_ids[r] == user_id else -1
+
+    def get(self, user_id):
+        """The user's product ids in event order (a view into `items`; empty if unknown)."""
+        r = self.row(user_id)
+        if r < 0:
+            return self.items[:0]
+        return self.items[self.indptr[r]:self.indptr[r + 1]]
+
+    def rows_for(self, user_ids):
+        """Vectorized row lookup for an array of user ids (-1 where unknown)."""
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        if not len(self.user_ids):
+            return np.full(len(user_ids), -1, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.user_ids, user_ids), len(self.user_ids) - 1)
+        return np.where(self.user_ids[rows] == user_ids, rows, -1)
+
+    def counts(self, user_ids=None):
+        """History length per row, or per given user id (0 where unknown)."""
+        lengths = np.diff(self.indptr)
+        if user_ids is None:
+            return lengths
+        rows = self.rows_for(user_ids)
+        if not len(lengths):
+            return np.zeros(len(rows), dtype=np.int64)
+        return np.where(rows >= 0, lengths[rows], 0)
+
+    def last_n(self, n):
+        """A new UserHistory holding each user's last n items, built without a Python loop."""
+        starts = np.maximum(self.indptr[1:] - n, self.indptr[:-1])
+        lengths = self.indptr[1:] - starts
+        indptr = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=indptr[1:])
+        # Output position k of a row maps to starts[row] + (k - indptr[row])
+        gather = np.arange(indptr[-1]) + np.repeat(starts - indptr[:-1], lengths)
+        return UserHistory(self.user_ids, indptr, self.items[gather])
+
+    def last(self, user_ids):
+        """Most recent item per given user id (-1 where the user has no history)."""
+        rows = self.rows_for(user_ids)
+        if not len(self.items):
+            return np.full(len(rows), -1, dtype=np.int64)
+        return np.where(rows >= 0, self.items[self.indptr[rows + 1] - 1], -1)
+
+    def lists(self, user_ids):
+        """Per given user id, the history as a plain list of ints ([] where unknown).
+        For callers that expect the old list-per-user columns; prefer get() elsewhere."""
+        rows = self.rows_for(user_ids)
+        return [self.items[self.indptr[r]:self.indptr[r + 1]].tolist() if r >= 0 else [] for r in rows]